@@ -0,0 +1,115 @@
+"""
+Benchmark of the NTU RGB+D skeleton file parser against the previous line by
+line parser, checking that both produce bit-identical keypoints.
+
+    python benchmarks/nturgbd_parser.py [skeleton files...]
+
+Without files a synthetic two person sequence of typical length is used.
+"""
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from datasetloader import NTURGBD  # noqa: E402
+
+
+def reference_load_keypointfile(filename):
+    """
+    The previous parser, converting every joint line separately. Returns
+    keypoints3D, keypoints2D and keypoints_depth.
+    """
+    with open(filename, "r") as skel_file:
+        data = skel_file.readlines()
+    num_frames = int(data[0][:-1])
+    num_persons = 0
+    data_index = 1
+    for frame_id in range(num_frames):
+        person_count = int(data[data_index][:-1])
+        num_persons = max(num_persons, person_count)
+        data_index += 1
+        for person_id in range(person_count):
+            data_index += 2 + int(data[data_index + 1][:-1])
+    persons3d = np.zeros((num_persons, num_frames, 25, 3))
+    persons2d = np.zeros((num_persons, num_frames, 25, 2))
+    persons_depth = np.zeros((num_persons, num_frames, 25, 2))
+    data_index = 0
+    for frame_id in range(num_frames):
+        data_index += 1
+        person_count = int(data[data_index][:-1])
+        for person_id in range(person_count):
+            data_index += 2
+            num_joints = int(data[data_index][:-1])
+            for joint_id in range(num_joints):
+                data_index += 1
+                jointinfo = data[data_index][:-1].split(' ')
+                jointinfo = np.array(list(map(float, jointinfo)))
+                persons3d[person_id][frame_id, joint_id] = jointinfo[:3]
+                persons2d[person_id][frame_id, joint_id] = jointinfo[5:7]
+                persons_depth[person_id][frame_id, joint_id] = jointinfo[3:5]
+    return [persons3d, persons2d, persons_depth]
+
+
+def write_synthetic_file(filename, num_frames=100, num_persons=2, seed=0):
+    """
+    Write a skeleton file with random values in the number format of the
+    dataset files.
+    """
+    rng = np.random.default_rng(seed)
+    lines = [str(num_frames)]
+    for frame_id in range(num_frames):
+        lines.append(str(num_persons))
+        for person_id in range(num_persons):
+            lines.append(
+                str(72057594037931101 + person_id) +
+                " 0 1 1 1 1 0 0.1293597 -0.2117316 2")
+            lines.append("25")
+            joints = rng.normal(size=(25, 11)) * 100
+            for joint in joints:
+                lines.append(" ".join("%.7g" % val for val in joint) + " 2")
+    with open(filename, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _time(function, filenames, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for filename in filenames:
+            function(filename)
+        times.append(time.perf_counter() - start)
+    return min(times) / len(filenames)
+
+
+def main(filenames, repeat=5):
+    # only the parser is benchmarked, no dataset needs to be present
+    parser = NTURGBD.__new__(NTURGBD)
+    parser._selected_cols = ["keypoints3D", "keypoints2D", "keypoints_depth"]
+    parser._num_actors = None
+    for filename in filenames:
+        # without cols the parser returns the same list as the reference
+        for reference, keypoints in zip(reference_load_keypointfile(filename),
+                                        parser.load_keypointfile(filename)):
+            if (reference.shape != keypoints.shape
+                    or reference.dtype != keypoints.dtype
+                    or reference.tobytes() != keypoints.tobytes()):
+                raise Exception("Parsers differ on " + filename)
+    reference_time = _time(reference_load_keypointfile, filenames, repeat)
+    parser_time = _time(parser.load_keypointfile, filenames, repeat)
+    print("files: " + str(len(filenames)))
+    print("reference parser: %.2f ms per file" % (reference_time * 1000))
+    print("bulk parser: %.2f ms per file" % (parser_time * 1000))
+    print("speedup: %.1fx" % (reference_time / parser_time))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(sys.argv[1:])
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, "S001C001P001R001A050.skeleton")
+            write_synthetic_file(filename)
+            main([filename])
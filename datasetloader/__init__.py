@@ -11,3 +11,6 @@ from .mpi3dhp import MPI3DHP
 from .nturgbd import NTURGBD
 from .skeletics152 import Skeletics152
 from .berkeleymhad import BerkeleyMHAD
+from .mixeddataset import MixedDataset
+from .hdf5 import HDF5Dataset
+from .chunkstore import ChunkStoreDataset
@@ -0,0 +1,45 @@
+"""
+asyncio support: loading samples in an executor from async code.
+"""
+import asyncio
+from collections import deque
+
+
+async def amap(func, items, executor=None, max_concurrency=4):
+    """
+    Apply func to all items in an executor, yielding results in order.
+
+    An async generator: at most max_concurrency items are being processed at
+    any time and no new items are submitted while the consumer doesn't ask
+    for the next result (back-pressure). Items not started yet are cancelled
+    when the consumer stops early or is cancelled.
+
+    Parameters
+    ----------
+    func : callable
+        Blocking function to be applied to every item.
+    items : iterable
+        Items to be processed.
+    executor : concurrent.futures.Executor, optional (default is None)
+        Executor to run func in. Defaults to the default executor of the
+        event loop.
+    max_concurrency : int, optional (default is 4)
+        Maximum number of items submitted to the executor at any time.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1!")
+    # get_running_loop would need Python 3.7, inside a coroutine this returns
+    # the running loop as well
+    loop = asyncio.get_event_loop()
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(loop.run_in_executor(executor, func, item))
+            if len(pending) >= max_concurrency:
+                yield await pending.popleft()
+        while len(pending) > 0:
+            yield await pending.popleft()
+    finally:
+        # Only reached with pending items if the consumer stopped early
+        for future in pending:
+            future.cancel()
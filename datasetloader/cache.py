@@ -0,0 +1,112 @@
+import os
+import json
+import inspect
+import hashlib
+
+# Constructor arguments which only affect an individual loader object but not
+# the samples of the dataset. These are not part of the cache key.
+_INSTANCE_ARGS = ("split", "no_lazy_loading", "cache_dir", "keep_invalid",
+                  "progress")
+
+
+def cache_key(dataset_loader):
+    """
+    Key identifying a dataset on disk together with the constructor options
+    determining its samples.
+
+    Parameters
+    ----------
+    dataset_loader : DatasetLoader
+        The dataset loader object to compute the key for.
+    """
+    kwargs = _constructor_args(dataset_loader)
+    if "data_path" in kwargs:
+        kwargs["data_path"] = os.path.abspath(kwargs["data_path"])
+    for arg in _INSTANCE_ARGS:
+        kwargs.pop(arg, None)
+    description = json.dumps([type(dataset_loader).__name__, kwargs],
+                             sort_keys=True,
+                             default=str)
+    return hashlib.sha1(description.encode("utf-8")).hexdigest()[:16]
+
+
+def _constructor_args(dataset_loader):
+    """
+    All named constructor arguments of the given loader, with defaults
+    filled in for those not passed, so that equivalent constructions (e.g.
+    positional or keyword arguments, explicit defaults) give the same key.
+
+    Arguments are bound to the constructors along the method resolution
+    order, each passing its remaining keyword arguments on to the next one.
+    Keyword arguments none of the constructors names are dropped.
+    """
+    args, kwargs = dataset_loader._init_args
+    remaining = dict(kwargs)
+    values = {}
+    for cls in type(dataset_loader).__mro__:
+        if cls is object or "__init__" not in vars(cls):
+            continue
+        signature = inspect.signature(cls.__init__)
+        named = [
+            param.name for param in list(signature.parameters.values())[1:]
+            if param.kind in (param.POSITIONAL_OR_KEYWORD, param.KEYWORD_ONLY)
+        ]
+        # positional arguments belong to the constructor of the class itself
+        bound = signature.bind_partial(
+            None, *args, **{
+                name: val
+                for name, val in remaining.items() if name in named
+            })
+        bound.apply_defaults()
+        for name in named:
+            if name in bound.arguments and name not in values:
+                values[name] = bound.arguments[name]
+            remaining.pop(name, None)
+        args = ()
+    return values
+
+
+def cache_path(dataset_loader, filename):
+    """
+    Full path of a file in the cache folder of the given dataset loader.
+
+    Returns None if the loader has no cache_dir set. Creates the folder if
+    necessary.
+
+    Parameters
+    ----------
+    dataset_loader : DatasetLoader
+        The dataset loader object the cached file belongs to.
+    filename : string
+        Name of the file within the cache folder of the loader.
+    """
+    if dataset_loader._cache_dir is None:
+        return None
+    folder = os.path.join(
+        dataset_loader._cache_dir,
+        type(dataset_loader).__name__ + "_" + cache_key(dataset_loader))
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, filename)
+
+
+def remove_cached(dataset_loader, prefix):
+    """
+    Delete the files in the cache folder of the given dataset loader whose
+    name starts with prefix, e.g. after the data on disk changed.
+    """
+    filename = cache_path(dataset_loader, prefix)
+    if filename is None:
+        return
+    folder = os.path.dirname(filename)
+    for cached_file in os.listdir(folder):
+        if cached_file.startswith(prefix):
+            os.remove(os.path.join(folder, cached_file))
+
+
+def hash_args(*args):
+    """
+    Short hash of the given (json serialisable) arguments, used to name
+    cache files.
+    """
+    description = json.dumps(args, sort_keys=True, default=str)
+    return hashlib.sha1(description.encode("utf-8")).hexdigest()[:12]
@@ -1,9 +1,20 @@
 import os
+import threading
+
 import numpy as np
 from scipy.io import loadmat
 
+from .cache import cache_path
 from .datasetloader import DatasetLoader
 
+# Skeleton fields of the data files providing the keypoint columns
+SKELETON_FIELDS = {
+    "keypoints2D": "PixelPosition",
+    "keypoints3D": "WorldPosition"
+}
+# Columns extracted from the data files
+DATAFILE_COLS = ("keypoints2D", "keypoints3D", "actions")
+
 
 class ChaLearn2013(DatasetLoader):
     """
@@ -24,10 +35,22 @@ class ChaLearn2013(DatasetLoader):
         "buonissimo", "messidaccordo", "sonostufo"
     ]
 
+    # lookup of action ids by gesture name
+    _action_ids = {action: i for i, action in enumerate(actions)}
+
     splits = ["default"]
+    _file_cols = {
+        "keypoints2D": "data-filename",
+        "keypoints3D": "data-filename",
+        "actions": "data-filename"
+    }
 
     def __init__(self, data_path, **kwargs):
         """
+        If a cache_dir is given the columns extracted from the data file of
+        each sample are stored there on first access, later accesses read
+        them from the cache instead of parsing the data file again.
+
         Parameters
         ----------
         data_path : string
@@ -67,7 +90,7 @@ class ChaLearn2013(DatasetLoader):
         # with the different datasets having diferent properties its worthwhile
         # having a var to keep track of the length
         self._length = 0
-        #self._load_data_subset(data_path, "train")
+        self._load_data_subset(data_path, "train")
         self._load_data_subset(data_path, "valid")
         super().__init__(**kwargs)
 
@@ -83,7 +106,7 @@ class ChaLearn2013(DatasetLoader):
             subset_long = subset
 
         subset_dir = os.path.join(data_path, subset_long + "data")
-        for sample in os.listdir(subset_dir):
+        for sample in sorted(os.listdir(subset_dir)):
             # Skip hidden files such as .DS_Store on mac
             if sample.startswith("."):
                 continue
@@ -94,8 +117,7 @@ class ChaLearn2013(DatasetLoader):
             # Validation sequences from 629 to 639" contain too many samples
             # without skeleton information, please do not use them if your
             # proposed method is based on the skeleton information.
-            if (sample_id in (223, 225, 228)
-                    or sample_id in (i for i in range(629, 640))):
+            if sample_id in (223, 225, 228) or 629 <= sample_id < 640:
                 continue
 
             self._data["video-filename"].append(
@@ -117,31 +139,60 @@ class ChaLearn2013(DatasetLoader):
         Load the complex data of the dataset.
 
         Loads all that is currently selected of 2D and 3D skeletons and gesture
-        data with timestamps.
+        data with timestamps. If a cache_dir is set these are read from the
+        cache of the sample, which is written on its first access.
 
         Parameters
         ----------
         filename : string
             Filename of the file containing the data.
         """
-        data = {col: [] for col in self._selected_cols}
+        cols = [col for col in DATAFILE_COLS if col in self._selected_cols]
+        cache_filename = cache_path(
+            self,
+            "sample_" + os.path.basename(os.path.dirname(filename)) + ".npz")
+        if cache_filename is None:
+            return self._extract_datafile(filename, cols)
+        mtime = os.stat(filename).st_mtime_ns
+        if os.path.exists(cache_filename):
+            with np.load(cache_filename) as cached:
+                # skip the cache if the data file was modified since
+                if cached["mtime"] == mtime:
+                    return {col: cached[col] for col in cols}
+        data = self._extract_datafile(filename, DATAFILE_COLS)
+        tmp_filename = (cache_filename + ".tmp" + str(os.getpid()) + "_" +
+                        str(threading.get_ident()))
+        with open(tmp_filename, "wb") as f:
+            np.savez(f, mtime=mtime, **data)
+        os.replace(tmp_filename, cache_filename)
+        return {col: data[col] for col in cols}
+
+    def _extract_datafile(self, filename, cols):
+        """
+        Extract the given columns from a data file, copying the per frame
+        arrays of each field into one array in a single pass.
+        """
+        data = {}
         sample_data = loadmat(filename)
         sample_data = sample_data["Video"][0, 0]
-        for frame in range(sample_data["NumFrames"][0, 0]):
-            frame_data = sample_data["Frames"][0, frame]["Skeleton"][0, 0]
-            # # the first few frames can be just zeros, skip
-            # if isinstance(frame_data["JointType"][0, 0][0], str):
-            if "keypoints2D" in self._selected_cols:
-                data["keypoints2D"] += [frame_data["PixelPosition"]]
-            if "keypoints3D" in self._selected_cols:
-                data["keypoints3D"] += [frame_data["WorldPosition"]]
-        if "actions" in self._selected_cols:
-            for gesture in sample_data["Labels"][0]:
-                data["actions"] += [
-                    (ChaLearn2013.actions.index(gesture["Name"][0]),
-                     gesture["Begin"][0, 0], gesture["End"][0, 0])
-                ]
-        return {col: np.array(val) for col, val in data.items()}
+        num_frames = sample_data["NumFrames"][0, 0]
+        # loadmat returns every frame's skeleton as a separate object array,
+        # so the fields can't be sliced out of the frames in bulk
+        skeletons = [
+            skeleton[0, 0]
+            for skeleton in sample_data["Frames"][0, :num_frames]["Skeleton"]
+        ]
+        for col, field in SKELETON_FIELDS.items():
+            if col in cols:
+                data[col] = np.array(
+                    [skeleton[field] for skeleton in skeletons])
+        if "actions" in cols:
+            data["actions"] = np.array([
+                (ChaLearn2013._action_ids[gesture["Name"][0]],
+                 gesture["Begin"][0, 0], gesture["End"][0, 0])
+                for gesture in sample_data["Labels"][0]
+            ])
+        return data
 
     def __getitem__(self, index):
         """
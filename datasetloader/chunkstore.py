@@ -0,0 +1,503 @@
+"""
+Chunk compressed storage for datasets of long sequences.
+
+Sequences are split into chunks of a fixed number of frames (the first axis
+of the data) which are compressed independently, so reading a clip only
+decompresses the chunks it overlaps. Before compression each chunk is passed
+through a delta filter along time (on the integer representation of the
+values, so the filter is lossless) and a byte shuffle, which lets the
+standard library codecs compress smooth motion data well.
+
+Store layout (a folder):
+    meta.json: format, version, dataset (class name of the source), length,
+        columns, codec, chunk_frames, landmarks/actions (if the source has
+        them), splits and per column the kind ('scalar', 'string' or 'array')
+        and for array columns the dtype of the stored values and the encoding
+        and dtype of the decoded values
+    index.npz: source_indices and per column ('<col>/<name>'):
+        scalar and string columns: 'data' with one value per sample
+        array columns: 'shapes' (shape of each sample, -1 for missing data),
+            'chunks' (samples + 1 offsets into the chunk list),
+            'chunk_offsets' (chunks + 1 byte offsets into the data file) and
+            for int16 encoded columns 'quant_scale' and 'quant_offset'
+    <col>.bin: the compressed chunks of each array column
+"""
+import os
+import json
+import lzma
+import zlib
+
+import numpy as np
+
+from .datasetloader import DatasetLoader
+from .encoding import ENCODINGS, decode, ColumnEncoder
+from .export import check_cols, select_samples
+from .prefetch import prefetch_map
+
+FORMAT_NAME = "datasetloader-chunkstore"
+FORMAT_VERSION = 1
+META_FILENAME = "meta.json"
+INDEX_FILENAME = "index.npz"
+DEFAULT_LEVEL = 6
+CODECS = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma":
+    (lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+
+
+def export_chunkstore(dataset_loader,
+                      path,
+                      cols=None,
+                      splits=None,
+                      chunk_frames=64,
+                      codec="zlib",
+                      level=None,
+                      encodings=None,
+                      num_workers=0):
+    """
+    Write the selected columns and samples of a dataset into a chunk store.
+
+    Samples are loaded, compressed and written one at a time. Array columns
+    must have the frames as their first axis.
+
+    Returns a dict with the encoding, the maximum and mean absolute error and
+    the theoretical error bound of each column stored with a lossy encoding.
+
+    Parameters
+    ----------
+    dataset_loader : DatasetLoader
+        The dataset to be exported.
+    path : string
+        Folder to write the store to (created if necessary, existing store
+        files are overwritten).
+    cols : list of strings, optional (default is None)
+        Columns to be exported. Defaults to the currently selected columns.
+    splits : list of (split_name, subset) tuples, optional (default is None)
+        If given only export the samples of these subsets, otherwise export
+        all samples.
+    chunk_frames : int, optional (default is 64)
+        Number of frames per compressed chunk.
+    codec : string, optional (default is "zlib")
+        Compression codec, one of CODECS.
+    level : int, optional (default is None)
+        Compression level of the codec, defaults to DEFAULT_LEVEL.
+    encodings : dict, optional (default is None)
+        Lossy encodings ('float16' or 'int16', see the encoding module) of
+        floating point array columns, by column name.
+    num_workers : int, optional (default is 0)
+        Number of worker threads loading and compressing samples ahead of
+        time.
+    """
+    cols = check_cols(dataset_loader, cols)
+    if codec not in CODECS:
+        raise KeyError("Unknown codec '" + str(codec) + "'!")
+    if encodings is None:
+        encodings = {}
+    for col, encoding in encodings.items():
+        if col not in cols:
+            raise KeyError("Encoding given for column '" + col +
+                           "' which is not exported.")
+        if encoding not in ENCODINGS:
+            raise KeyError("Unknown encoding '" + str(encoding) + "'!")
+    indices, split_indices = select_samples(dataset_loader, splits)
+    os.makedirs(path, exist_ok=True)
+
+    writers = {
+        col:
+        _ColumnWriter(path, col, len(indices), chunk_frames, codec, level,
+                      encodings.get(col))
+        for col in cols
+    }
+
+    loader = dataset_loader._with_cols(cols)
+
+    def load(index):
+        # compress in the worker threads, zlib and lzma release the GIL
+        sample = loader[index]
+        return {col: writers[col].prepare(sample[col]) for col in cols}
+
+    try:
+        for i, sample in enumerate(prefetch_map(load, indices, num_workers)):
+            for col in cols:
+                writers[col].write(i, sample[col])
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    meta = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "dataset": type(dataset_loader).__name__,
+        "length": len(indices),
+        "columns": cols,
+        "codec": codec,
+        "chunk_frames": chunk_frames,
+        "splits": {},
+        "column_info": {
+            col: writer.info()
+            for col, writer in writers.items()
+        },
+    }
+    for attr in ("landmarks", "actions"):
+        if hasattr(dataset_loader, attr):
+            meta[attr] = list(getattr(dataset_loader, attr))
+    for (split_name, subset), subset_indices in split_indices.items():
+        meta["splits"].setdefault(split_name, {})[subset] = subset_indices
+    index_arrays = {"source_indices": np.array(indices, dtype=np.int64)}
+    for col, writer in writers.items():
+        for name, array in writer.index_arrays().items():
+            index_arrays[col + "/" + name] = array
+    np.savez(os.path.join(path, INDEX_FILENAME), **index_arrays)
+    # the meta data is written last, marking the store as complete
+    tmp_filename = os.path.join(path, META_FILENAME + ".tmp")
+    with open(tmp_filename, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_filename, os.path.join(path, META_FILENAME))
+    return {
+        col: writer.error_report()
+        for col, writer in writers.items() if writer.encoding is not None
+    }
+
+
+def _int_dtype(dtype):
+    """
+    Integer type of the same size, used to apply the delta filter losslessly.
+    """
+    return np.dtype("i" + str(dtype.itemsize))
+
+
+def _filter_chunk(chunk):
+    """
+    Delta filter along time followed by a byte shuffle.
+    """
+    values = np.ascontiguousarray(chunk).view(_int_dtype(chunk.dtype))
+    delta = values.copy()
+    # integer arithmetic wraps around, so this is exactly invertible
+    delta[1:] -= values[:-1]
+    return delta.view(np.uint8).reshape(-1, chunk.dtype.itemsize).T.tobytes()
+
+
+def _unfilter_chunk(data, dtype, frame_shape):
+    """
+    Inverse of _filter_chunk.
+    """
+    shuffled = np.frombuffer(data, dtype=np.uint8)
+    delta = shuffled.reshape(dtype.itemsize,
+                             -1).T.copy().view(_int_dtype(dtype))
+    delta = delta.reshape((-1, ) + tuple(frame_shape))
+    return np.cumsum(delta, axis=0, dtype=delta.dtype).view(dtype)
+
+
+class _ColumnWriter:
+    """
+    Compresses the values of one column and appends them to its data file.
+
+    The storage layout is determined from the first (non-missing) value.
+    """
+    def __init__(self, path, col, length, chunk_frames, codec, level,
+                 encoding):
+        self._path = path
+        self._col = col
+        self._length = length
+        self._chunk_frames = chunk_frames
+        self._compress = CODECS[codec][0]
+        self._level = DEFAULT_LEVEL if level is None else level
+        self.encoding = encoding
+        if encoding is not None:
+            self._encoder = ColumnEncoder(encoding)
+        self._kind = None
+        self._pending = []
+        self._file = None
+
+    def prepare(self, value):
+        """
+        Encode and compress a value, done in the worker threads.
+
+        Leaves the writer untouched. Returns a tuple of the value (or its
+        shape for array data), its stored dtype and the list of compressed
+        chunks, plus the scale, offset, decoded dtype and errors of encoded
+        data, which are recorded by write.
+        """
+        if value is None or isinstance(value,
+                                       (str, bytes)) or np.ndim(value) == 0:
+            return (value, None, None, None)
+        value = np.asarray(value)
+        if value.dtype == object or value.dtype.kind in ("U", "S"):
+            raise Exception("Column '" + self._col + "' contains data which "
+                            "can't be stored in a chunk store.")
+        encoding = None
+        if self.encoding is not None:
+            if value.dtype.kind != "f":
+                raise Exception("Column '" + self._col + "' can't be "
+                                "encoded, encodings only apply to floating "
+                                "point data.")
+            encoded, scale, offset, errors = self._encoder.encode(value)
+            encoding = (scale, offset, value.dtype, errors)
+            stored = encoded.reshape(value.shape)
+        else:
+            stored = value
+        chunks = [
+            self._compress(
+                _filter_chunk(stored[start:start + self._chunk_frames]),
+                self._level)
+            for start in range(0, stored.shape[0], self._chunk_frames)
+        ]
+        return (value.shape, stored.dtype, chunks, encoding)
+
+    def write(self, index, prepared):
+        value, dtype, chunks, encoding = prepared
+        if self._kind is None:
+            if value is None:
+                # layout is still unknown, keep until there is data
+                self._pending.append(index)
+                return
+            self._setup(value, dtype)
+            for pending_index in self._pending:
+                self._write(pending_index, None, None, None)
+            self._pending = []
+        is_array = dtype is not None
+        if value is not None and is_array != (self._kind == "array"):
+            raise Exception("Column '" + self._col + "' has samples of "
+                            "incompatible types.")
+        quantisation = None
+        if encoding is not None:
+            scale, offset, self._decoded_dtype, errors = encoding
+            self._encoder.add_errors(errors)
+            quantisation = (scale, offset)
+        self._write(index, value, chunks, quantisation)
+
+    def _setup(self, value, dtype):
+        if dtype is None:
+            self._kind = "string" if isinstance(value,
+                                                (str, bytes)) else "scalar"
+            self._data = [None] * self._length
+            return
+        self._kind = "array"
+        self._dtype = dtype
+        self._frame_shape = value[1:]
+        self._shapes = np.full((self._length, len(value)), -1, dtype=np.int64)
+        self._chunks = np.zeros(self._length + 1, dtype=np.int64)
+        self._chunk_offsets = [0]
+        if self.encoding == "int16":
+            num_channels = value[-1] if len(value) > 1 else 1
+            self._quant_scale = np.ones((self._length, num_channels))
+            self._quant_offset = np.zeros((self._length, num_channels))
+        self._file = open(os.path.join(self._path, self._col + ".bin"), "wb")
+
+    def _write(self, index, value, chunks, quantisation):
+        if self._kind in ("string", "scalar"):
+            if value is None:
+                raise Exception("Column '" + self._col + "' is missing data "
+                                "which can't be exported.")
+            self._data[index] = value
+            return
+        if value is not None:
+            if (len(value) != self._shapes.shape[1]
+                    or value[1:] != self._frame_shape):
+                raise Exception("Column '" + self._col + "' has samples of "
+                                "incompatible shapes.")
+            self._shapes[index] = value
+            for chunk in chunks:
+                self._file.write(chunk)
+                self._chunk_offsets.append(self._chunk_offsets[-1] +
+                                           len(chunk))
+            if self.encoding == "int16":
+                self._quant_scale[index] = quantisation[0]
+                self._quant_offset[index] = quantisation[1]
+        self._chunks[index + 1] = len(self._chunk_offsets) - 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def info(self):
+        """
+        Description of the column for the meta data of the store.
+        """
+        if self._kind is None:
+            raise Exception("Column '" + self._col + "' has no data in the "
+                            "exported samples!")
+        info = {"kind": self._kind}
+        if self._kind == "array":
+            info["dtype"] = self._dtype.str
+            if self.encoding is not None:
+                info["encoding"] = self.encoding
+                info["decoded_dtype"] = self._decoded_dtype.str
+        return info
+
+    def index_arrays(self):
+        if self._kind != "array":
+            return {"data": np.array(self._data)}
+        arrays = {
+            "shapes": self._shapes,
+            "chunks": self._chunks,
+            "chunk_offsets": np.array(self._chunk_offsets, dtype=np.int64)
+        }
+        if self.encoding == "int16":
+            arrays["quant_scale"] = self._quant_scale
+            arrays["quant_offset"] = self._quant_offset
+        return arrays
+
+    def error_report(self):
+        """
+        Error introduced by the encoding of the column.
+        """
+        return self._encoder.report()
+
+
+class ChunkStoreDataset(DatasetLoader):
+    """
+    Dataset stored in a chunk store written by export_chunkstore.
+
+    Scalar and string columns are held in memory, array columns are read from
+    the store on access. load_frames reads a range of frames of a sample,
+    decompressing only the chunks overlapping it.
+    """
+    splits = None
+
+    def __init__(self, data_path, **kwargs):
+        """
+        Parameters
+        ----------
+        data_path : string
+            Folder of the store written by export_chunkstore
+        """
+        meta_filename = os.path.join(data_path, META_FILENAME)
+        if not os.path.exists(meta_filename):
+            raise Exception("'" + data_path + "' is not a complete chunk "
+                            "store written by export_chunkstore!")
+        with open(meta_filename, "r") as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT_NAME:
+            raise Exception("'" + data_path + "' is not a chunk store "
+                            "written by export_chunkstore!")
+        self.dataset_name = meta["dataset"]
+        for attr in ("landmarks", "actions"):
+            if attr in meta:
+                setattr(self, attr, meta[attr])
+        self._decompress = CODECS[meta["codec"]][1]
+        self._chunk_frames = meta["chunk_frames"]
+
+        self._data_cols = meta["columns"]
+        self._data = {}
+        self._columns = {}
+        with np.load(os.path.join(data_path, INDEX_FILENAME)) as index:
+            self._source_indices = index["source_indices"]
+            for col in self._data_cols:
+                info = meta["column_info"][col]
+                if info["kind"] == "scalar":
+                    self._data[col] = index[col + "/data"]
+                elif info["kind"] == "string":
+                    self._data[col] = index[col + "/data"].astype(object)
+                else:
+                    self._columns[col] = _Column(data_path, col, info, index)
+
+        self._splits = None
+        if len(meta["splits"]) > 0:
+            self._splits = meta["splits"]
+            self.splits = list(self._splits.keys())
+        self._length = meta["length"]
+        super().__init__(**kwargs)
+
+    @property
+    def source_indices(self):
+        """
+        Indices of the samples in the dataset they were exported from.
+        """
+        return self._source_indices
+
+    def num_frames(self, col):
+        """
+        Number of frames of each sample of an array column (-1 for missing
+        data), e.g. to sample clips.
+        """
+        return self._columns[col].shapes[:, 0].copy()
+
+    def __getitem__(self, index):
+        """
+        Indexing access to the dataset.
+
+        Returns a dictionary of all currently selected data columns of the
+        selected item.
+        """
+        data = super().__getitem__(index)
+        for col in self._selected_cols:
+            if col in self._columns:
+                data[col] = self.load_frames(col, index)
+        return data
+
+    def load_frames(self, col, index, start=None, stop=None):
+        """
+        Read a range of frames of a single sample.
+
+        Only the chunks overlapping the range are read and decompressed.
+
+        Parameters
+        ----------
+        col : string
+            Array column to read.
+        index : int
+            Index of the sample.
+        start, stop : int, optional (default is None)
+            Range of frames to be read, as in slicing the full sequence.
+        """
+        column = self._columns[col]
+        shape = column.shapes[index]
+        if shape[0] < 0:
+            return None
+        start, stop, _ = slice(start, stop).indices(shape[0])
+        stop = max(start, stop)
+        first_chunk = start // self._chunk_frames
+        last_chunk = max((stop - 1) // self._chunk_frames, first_chunk)
+        chunk_ids = column.chunks[index] + np.arange(first_chunk,
+                                                     last_chunk + 1)
+        chunk_ids = chunk_ids[chunk_ids < column.chunks[index + 1]]
+        if len(chunk_ids) == 0:
+            frames = np.empty((0, ) + tuple(shape[1:]), dtype=column.dtype)
+        else:
+            # the chunks of a sample are contiguous, read them in one go
+            byte_start = column.chunk_offsets[chunk_ids[0]]
+            with open(column.filename, "rb") as f:
+                f.seek(byte_start)
+                data = f.read(column.chunk_offsets[chunk_ids[-1] + 1] -
+                              byte_start)
+            frames = np.concatenate([
+                _unfilter_chunk(
+                    self._decompress(
+                        data[column.chunk_offsets[chunk_id] -
+                             byte_start:column.chunk_offsets[chunk_id + 1] -
+                             byte_start]), column.dtype, shape[1:])
+                for chunk_id in chunk_ids
+            ])
+            offset = first_chunk * self._chunk_frames
+            frames = frames[start - offset:stop - offset]
+        if column.encoding is not None:
+            scale = offset = None
+            if column.encoding == "int16":
+                scale = column.quant_scale[index]
+                offset = column.quant_offset[index]
+            frames = decode(
+                frames.reshape(frames.shape + (1, ) * (frames.ndim < 2)),
+                column.encoding, scale, offset,
+                column.decoded_dtype).reshape(frames.shape)
+        return frames
+
+
+class _Column:
+    """
+    Index of the chunks of an array column.
+    """
+    def __init__(self, data_path, col, info, index):
+        self.filename = os.path.join(data_path, col + ".bin")
+        self.dtype = np.dtype(info["dtype"])
+        self.shapes = index[col + "/shapes"]
+        self.chunks = index[col + "/chunks"]
+        self.chunk_offsets = index[col + "/chunk_offsets"]
+        self.encoding = info.get("encoding")
+        if self.encoding is not None:
+            self.decoded_dtype = np.dtype(info["decoded_dtype"])
+        if self.encoding == "int16":
+            self.quant_scale = index[col + "/quant_scale"]
+            self.quant_offset = index[col + "/quant_offset"]
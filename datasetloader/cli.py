@@ -0,0 +1,355 @@
+"""
+Command line interface for the expensive one-off operations on a dataset,
+meant to be run once (e.g. by a batch job) before training jobs use the
+dataset.
+
+    python -m datasetloader <command> <dataset> -p PATH [options]
+
+Commands:
+    cache: scan the dataset (writing the manifest of datasets storing one
+        sample per file), validate it and optionally compute statistics,
+        storing all results in the cache_dir
+    validate: check all samples and store the validity index
+    stats: compute normalisation statistics of keypoint columns
+    pack: export the dataset into an HDF5 file or a chunk store
+    benchmark: measure construction time and the throughput of iterating
+        over the dataset, optionally (--memory) also the memory allocated
+        per sample
+
+The dataset options are the ones added by the add_argparse_args method of
+the dataset class. Validation and statistics checkpoint their progress in the
+cache_dir, so rerunning an interrupted command continues where it stopped.
+Packed output only appears under its final name once complete, existing
+output is kept unless --overwrite is given. Results are printed as json.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+
+import numpy as np
+
+from . import (JHMDB, HARPET, LSP, LSPExtended, MPII, UCFSports, PKUMMD,
+               ChaLearn2013, TotalCapture, MPI3DHP, NTURGBD, Skeletics152,
+               BerkeleyMHAD, HDF5Dataset, ChunkStoreDataset)
+from .chunkstore import export_chunkstore, CODECS, META_FILENAME
+from .datasetloader import DatasetLoader
+from .encoding import ENCODINGS
+from .hdf5 import export_hdf5
+from .prefetch import prefetch_map
+from .profiling import memory_profile
+from .progress import PhaseTimings, log_progress
+
+DATASETS = {
+    dataset_class.__name__: dataset_class
+    for dataset_class in (JHMDB, HARPET, LSP, LSPExtended, MPII, UCFSports,
+                          PKUMMD, ChaLearn2013, TotalCapture, MPI3DHP, NTURGBD,
+                          Skeletics152, BerkeleyMHAD, HDF5Dataset,
+                          ChunkStoreDataset)
+}
+COMMANDS = ("cache", "validate", "stats", "pack", "benchmark")
+PACK_FORMATS = ("hdf5", "chunkstore")
+
+
+def main(argv=None):
+    """
+    Run the command given by the command line arguments.
+
+    Parameters
+    ----------
+    argv : list of strings, optional (default is None)
+        Command line arguments, defaults to sys.argv[1:].
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    command_parser = argparse.ArgumentParser(add_help=False)
+    command_parser.add_argument("command", choices=COMMANDS)
+    command_parser.add_argument("dataset", choices=sorted(DATASETS))
+    known_args, _ = command_parser.parse_known_args(argv)
+    dataset_class = DATASETS[known_args.dataset]
+
+    parser = argparse.ArgumentParser(
+        prog="python -m datasetloader",
+        description="Expensive one-off operations on a dataset.")
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    dataset_args = _add_dataset_args(parser, dataset_class)
+    _add_command_args(parser, known_args.command)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(message)s",
+                        stream=sys.stderr)
+    timings = PhaseTimings()
+
+    def progress(report):
+        timings(report)
+        log_progress(report)
+
+    dataset_kwargs = {arg: getattr(args, arg) for arg in dataset_args}
+    start = time.perf_counter()
+    dataset_loader = dataset_class(progress=progress, **dataset_kwargs)
+    result = {
+        "dataset": dataset_class.__name__,
+        "length": len(dataset_loader),
+        "construction_time": time.perf_counter() - start
+    }
+    result.update(_COMMAND_FUNCTIONS[args.command](dataset_loader, args))
+    result["phases"] = timings.summary()
+    print(json.dumps(result, indent=2, default=_json_default))
+    return 0
+
+
+def _add_dataset_args(parser, dataset_class):
+    """
+    Add the arguments of the dataset class to the parser and return the
+    names of the added arguments (the constructor arguments).
+    """
+    # add_argparse_args only adds the general arguments once per process (to
+    # combine several datasets in one parser), here each call builds a fresh
+    # parser for a single dataset
+    DatasetLoader._general_parser_args_added = False
+    DatasetLoader._parser_split_added = False
+    existing = {action.dest for action in parser._actions}
+    dataset_class.add_argparse_args(parser)
+    return [
+        action.dest for action in parser._actions
+        if action.dest not in existing
+    ]
+
+
+def _add_command_args(parser, command):
+    """
+    Add the arguments of the given command to the parser.
+    """
+    group = parser.add_argument_group(command + " arguments")
+    group.add_argument("--num_workers",
+                       type=int,
+                       default=0,
+                       help="Number of worker threads loading samples "
+                       "(Default is 0, loading in the main thread)")
+    if command in ("cache", "stats"):
+        group.add_argument("--stats_cols",
+                           type=str,
+                           nargs="+",
+                           required=(command == "stats"),
+                           help="Keypoint columns to compute statistics of")
+        group.add_argument("--subset",
+                           type=str,
+                           help="Only compute statistics of this subset "
+                           "(train/valid/test) of the selected split")
+    if command == "stats":
+        group.add_argument("--recompute",
+                           action="store_true",
+                           help="Ignore previously cached statistics")
+    if command in ("cache", "validate", "pack", "benchmark"):
+        group.add_argument("--cols",
+                           type=str,
+                           nargs="+",
+                           help="Columns to load (Default is all lazily "
+                           "loaded columns for cache and validate, all "
+                           "columns for pack and benchmark)")
+    if command == "pack":
+        group.add_argument("-o",
+                           "--output",
+                           type=str,
+                           required=True,
+                           help="HDF5 file or chunk store folder to write")
+        group.add_argument("--format",
+                           choices=PACK_FORMATS,
+                           default="chunkstore",
+                           help="Format of the output (Default is "
+                           "chunkstore)")
+        group.add_argument("--splits",
+                           type=str,
+                           nargs="+",
+                           help="Only pack the samples of these subsets, "
+                           "given as split_name/subset")
+        group.add_argument("--encodings",
+                           type=str,
+                           nargs="+",
+                           help="Lossy encodings of array columns, given as "
+                           "col=encoding with encoding one of " +
+                           ", ".join(ENCODINGS))
+        group.add_argument("--codec",
+                           choices=sorted(CODECS),
+                           default="zlib",
+                           help="Compression codec of a chunk store")
+        group.add_argument("--chunk_frames",
+                           type=int,
+                           default=64,
+                           help="Frames per compressed chunk of a chunk "
+                           "store")
+        group.add_argument("--overwrite",
+                           action="store_true",
+                           help="Replace existing output")
+    if command == "benchmark":
+        group.add_argument("--num_samples",
+                           type=int,
+                           help="Only load the first n samples")
+        group.add_argument("--repeat",
+                           type=int,
+                           default=1,
+                           help="Number of passes over the samples")
+        group.add_argument("--memory",
+                           action="store_true",
+                           help="Also measure the memory allocated while "
+                           "loading each sample (see the profiling module)")
+
+
+def _require_cache_dir(dataset_loader, command):
+    if dataset_loader._cache_dir is None:
+        raise Exception("The " + command + " command requires a cache_dir "
+                        "to store its results in!")
+
+
+def _default_cols(dataset_loader, cols, lazy_only):
+    if cols is not None:
+        return cols
+    return [
+        col for col in dataset_loader._data_cols
+        if not lazy_only or col not in dataset_loader._data
+    ]
+
+
+def _run_cache(dataset_loader, args):
+    _require_cache_dir(dataset_loader, "cache")
+    result = _run_validate(dataset_loader, args)
+    if args.stats_cols is not None:
+        result.update(_run_stats(dataset_loader, args))
+    return result
+
+
+def _run_validate(dataset_loader, args):
+    cols = _default_cols(dataset_loader, args.cols, lazy_only=True)
+    invalid = dataset_loader.validate(num_workers=args.num_workers, cols=cols)
+    return {"num_invalid": len(invalid), "invalid": invalid}
+
+
+def _run_stats(dataset_loader, args):
+    split_name = None
+    if args.subset is not None:
+        split_name = dataset_loader._cur_split
+    stats = dataset_loader.compute_stats(args.stats_cols,
+                                         split_name=split_name,
+                                         split=args.subset,
+                                         num_workers=args.num_workers,
+                                         recompute=getattr(
+                                             args, "recompute", False))
+    return {
+        "stats": {
+            col: {
+                key: val
+                for key, val in col_stats.items()
+                if key not in ("indices", "sample_min", "sample_max")
+            }
+            for col, col_stats in stats.items()
+        }
+    }
+
+
+def _run_pack(dataset_loader, args):
+    output = args.output
+    if os.path.exists(output) and not args.overwrite:
+        if args.format == "hdf5" or os.path.exists(
+                os.path.join(output, META_FILENAME)):
+            return {"output": output, "skipped": True}
+    cols = _default_cols(dataset_loader, args.cols, lazy_only=False)
+    splits = None
+    if args.splits is not None:
+        splits = [tuple(split.split("/", 1)) for split in args.splits]
+    encodings = None
+    if args.encodings is not None:
+        encodings = dict(encoding.split("=", 1) for encoding in args.encodings)
+    # write under a temporary name so only complete output has the final
+    # name, an interrupted run starts over
+    tmp_output = output + ".partial"
+    if os.path.isdir(tmp_output):
+        shutil.rmtree(tmp_output)
+    if args.format == "hdf5":
+        errors = export_hdf5(dataset_loader,
+                             tmp_output,
+                             cols=cols,
+                             splits=splits,
+                             encodings=encodings,
+                             num_workers=args.num_workers)
+    else:
+        errors = export_chunkstore(dataset_loader,
+                                   tmp_output,
+                                   cols=cols,
+                                   splits=splits,
+                                   chunk_frames=args.chunk_frames,
+                                   codec=args.codec,
+                                   encodings=encodings,
+                                   num_workers=args.num_workers)
+    if os.path.isdir(output):
+        shutil.rmtree(output)
+    os.replace(tmp_output, output)
+    return {"output": output, "skipped": False, "encoding_errors": errors}
+
+
+def _run_benchmark(dataset_loader, args):
+    cols = _default_cols(dataset_loader, args.cols, lazy_only=False)
+    indices = range(len(dataset_loader))
+    if args.num_samples is not None:
+        indices = indices[:args.num_samples]
+    loader = dataset_loader._with_cols(cols)
+    bytes_read = 0
+    for index in indices:
+        for filename in loader.sample_files(index):
+            if os.path.exists(filename):
+                bytes_read += os.path.getsize(filename)
+    passes = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        # same prefetching as iterate, on the selected samples
+        files = None
+        if args.num_workers > 0:
+            files = loader.sample_files
+        for _ in prefetch_map(loader.__getitem__,
+                              indices,
+                              args.num_workers,
+                              files=files):
+            pass
+        passes.append(time.perf_counter() - start)
+    elapsed = min(passes)
+    result = {}
+    if args.memory:
+        result["memory"] = memory_profile(dataset_loader, indices, cols)
+    result.update({
+        "cols":
+        cols,
+        "num_samples":
+        len(indices),
+        "num_workers":
+        args.num_workers,
+        "bytes_per_pass":
+        bytes_read,
+        "pass_times":
+        passes,
+        "samples_per_second":
+        len(indices) / elapsed if elapsed > 0 else None,
+        "megabytes_per_second":
+        bytes_read / elapsed / 2**20 if elapsed > 0 else None
+    })
+    return result
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+_COMMAND_FUNCTIONS = {
+    "cache": _run_cache,
+    "validate": _run_validate,
+    "stats": _run_stats,
+    "pack": _run_pack,
+    "benchmark": _run_benchmark
+}
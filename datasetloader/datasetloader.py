@@ -1,24 +1,80 @@
-from abc import ABC
+import copy
 
+from .aio import amap
 from .datasubset import DataSubset
+from .manifest import scan_samples
+from .prefetch import prefetch_map, collate, chunks, locality_order
+from .progress import Progress
+from .registry import RegistryMeta, register, detach
+from .statistics import compute_stats
+from .transforms import apply_to_sample
+from .validity import validate, check_sample, load_validity
+from .views import readonly
 
 
-class DatasetLoader(ABC):
+class DatasetLoader(metaclass=RegistryMeta):
     """
     Base class for all dataset loaders to provide a common interface for
     retrieving the data out of the dataset object.
+
+    Loaders constructed with the same arguments (apart from the column
+    selection and per object options like split) share their scan results,
+    see the registry module.
     """
     _general_parser_args_added = False
     _parser_split_added = False
+    # Whether objects of the class may share their state through the registry
+    _shareable = True
+    # Filename column each lazily loaded column is read from (if it isn't the
+    # 'keypoint-filename' column), used to schedule reads
+    _file_cols = {}
 
-    def __init__(self, no_lazy_loading=False, split=None, **kwargs):
-        self._selected_cols = []
+    def __new__(cls, *args, **kwargs):
+        obj = super().__new__(cls)
+        # Keep the constructor arguments to identify cached data belonging to
+        # this dataset and configuration
+        obj._init_args = (args, kwargs)
+        # available during the initial scan of the dataset already
+        obj._cache_dir = kwargs.get("cache_dir")
+        # validity index, loaded from the cache on first use. Kept in a
+        # container so it is shared with loaders sharing this one's state.
+        obj._validity = {"invalid": None}
+        obj._shared = None
+        # reports the progress of the construction (see the progress module)
+        obj._progress = Progress(kwargs.get("progress"), cls.__name__)
+        return obj
+
+    def __init__(self,
+                 no_lazy_loading=False,
+                 split=None,
+                 cache_dir=None,
+                 keep_invalid=False,
+                 progress=None,
+                 **kwargs):
         self._lazy = not no_lazy_loading
-        if self.splits is not None:
-            self.set_split(split)
+        self._init_instance(split, cache_dir, keep_invalid)
         if not self._lazy:
             self._load_all()
 
+    def _init_instance(self, split=None, cache_dir=None, keep_invalid=False):
+        """
+        Set up the state belonging to this object only, which isn't shared
+        with other loaders of the same dataset.
+        """
+        self._selected_cols = []
+        self._cache_dir = cache_dir
+        self._keep_invalid = keep_invalid
+        if self.splits is not None:
+            self.set_split(split)
+
+    @property
+    def _invalid(self):
+        return self._validity["invalid"]
+
+    @_invalid.setter
+    def _invalid(self, invalid):
+        self._validity["invalid"] = invalid
+
     def __len__(self):
         return self._length
 
@@ -36,6 +92,16 @@ class DatasetLoader(ABC):
                                       action="store_true",
                                       help="Disable lazy data loading (some "
                                       "small datasets never use lazy loading)")
+            child_parser.add_argument(
+                "--cache_dir",
+                type=str,
+                help="Folder to store data derived from the dataset in, such "
+                "as statistics, for reuse in later runs")
+            child_parser.add_argument(
+                "--keep_invalid",
+                action="store_true",
+                help="Keep samples marked as invalid by a previous validation "
+                "run in the dataset splits")
             DatasetLoader._general_parser_args_added = True
         if cls.splits is not None and not cls._parser_split_added:
             child_parser.add_argument(
@@ -140,19 +206,40 @@ class DatasetLoader(ABC):
         """
         return (col in self._data_cols)
 
+    def _with_cols(self, cols):
+        """
+        Shallow copy of the loader with the given columns selected.
+
+        Used to load specific columns without changing the column selection
+        of this object, which other threads may be using at the same time.
+        All other state is shared with this object.
+        """
+        dataset_loader = copy.copy(self)
+        dataset_loader._selected_cols = list(cols)
+        return dataset_loader
+
     def __getitem__(self, index):
         """
         Indexing access to the dataset.
 
         Provides the non-lazy access only. Any dataset to offer lazy access
         must implement the lazy access for any lazy parts manually.
+
+        Arrays are returned as read-only views into the data held by the
+        dataset, see the views module.
         """
         return {
-            data_key: self._data[data_key][index]
+            data_key: readonly(self._data[data_key][index])
             for data_key in self._selected_cols if data_key in self._data
         }
 
-    def iterate(self, split_name=None, split=None, return_tuple=False):
+    def iterate(self,
+                split_name=None,
+                split=None,
+                return_tuple=False,
+                transform=None,
+                num_workers=0,
+                readahead=False):
         """
         Iterate over the dataset or a subset of it.
 
@@ -168,17 +255,303 @@ class DatasetLoader(ABC):
         return_tuple : bool, optional (default is False)
             If True return the data elements as tuples instead of dicts as
             __getitem__does
+        transform : callable, optional (default is None)
+            Batch transform (see the transforms module) to be applied to each
+            sample.
+        num_workers : int, optional (default is 0)
+            Number of worker threads loading samples ahead of time. If 0
+            samples are loaded one at a time in the calling thread.
+        readahead : bool, optional (default is False)
+            If True give the OS read-ahead hints for the files of upcoming
+            samples and load them in windows ordered by their location on
+            disk also without worker threads (always done with workers).
         """
-        if split_name is not None and split is not None:
-            index_list = self.get_split(split_name, split)
-        else:
-            index_list = range(len(self))
-        for i in index_list:
+
+        def load(index):
+            sample = self[index]
+            if transform is not None:
+                sample = apply_to_sample(transform, sample)
+            if return_tuple:
+                return tuple(sample[col] for col in self._selected_cols)
+            return sample
+
+        files = None
+        if num_workers > 0 or readahead:
+            files = self.sample_files
+        yield from prefetch_map(load,
+                                self._index_list(split_name, split),
+                                num_workers,
+                                files=files)
+
+    def aiterate(self,
+                 split_name=None,
+                 split=None,
+                 return_tuple=False,
+                 transform=None,
+                 executor=None,
+                 max_concurrency=4):
+        """
+        Asynchronously iterate over the dataset or a subset of it.
+
+        Samples are loaded in an executor, at most max_concurrency at a time
+        and only as fast as they are consumed. Loads which haven't started
+        are cancelled if the iteration stops early. Use as
+        'async for sample in dataset.aiterate(...)'.
+
+        Parameters
+        ----------
+        split_name : string, optional
+            Dataset split to iterate over, see iterate.
+        split : string, optional
+            One of {train, valid, test}, see iterate.
+        return_tuple : bool, optional (default is False)
+            If True return the data elements as tuples instead of dicts.
+        transform : callable, optional (default is None)
+            Batch transform (see the transforms module) to be applied to each
+            sample. Runs in the executor.
+        executor : concurrent.futures.Executor, optional (default is None)
+            Executor loading the samples. Defaults to the default executor of
+            the event loop.
+        max_concurrency : int, optional (default is 4)
+            Maximum number of samples being loaded at any time.
+        """
+
+        def load(index):
+            sample = self[index]
+            if transform is not None:
+                sample = apply_to_sample(transform, sample)
             if return_tuple:
-                sample = self[i]
-                yield tuple(sample[col] for col in self._selected_cols)
-            else:
-                yield self[i]
+                return tuple(sample[col] for col in self._selected_cols)
+            return sample
+
+        return amap(load, self._index_list(split_name, split), executor,
+                    max_concurrency)
+
+    def __aiter__(self):
+        return self.aiterate()
+
+    def get_batch(self, indices, return_tuple=False, transform=None):
+        """
+        Load the given samples and collate them into a batch.
+
+        Columns for which all samples have the same shape are stacked along a
+        new first axis, all other columns are returned as 1D object arrays.
+
+        Parameters
+        ----------
+        indices : list of ints
+            Indices of the samples forming the batch.
+        return_tuple : bool, optional (default is False)
+            If True return the columns as a tuple ordered as selected instead
+            of a dict.
+        transform : callable, optional (default is None)
+            Batch transform (see the transforms module) to be applied to the
+            collated batch.
+        """
+        # load in the order of the files on disk
+        samples = [None] * len(indices)
+        for i in locality_order([self.sample_files(i) for i in indices]):
+            samples[i] = self[indices[i]]
+        batch = collate(samples, self._selected_cols)
+        if transform is not None:
+            batch = transform(batch)
+        if return_tuple:
+            return tuple(batch[col] for col in self._selected_cols)
+        return batch
+
+    def iterate_batches(self,
+                        batch_size,
+                        split_name=None,
+                        split=None,
+                        return_tuple=False,
+                        drop_last=False,
+                        num_workers=0,
+                        transform=None,
+                        readahead=False):
+        """
+        Iterate over the dataset or a subset of it in batches.
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of samples per batch.
+        split_name : string, optional
+            Dataset split to iterate over, see iterate.
+        split : string, optional
+            One of {train, valid, test}, see iterate.
+        return_tuple : bool, optional (default is False)
+            If True return the batches as tuples instead of dicts.
+        drop_last : bool, optional (default is False)
+            If True drop the last batch if it is smaller than batch_size.
+        num_workers : int, optional (default is 0)
+            Number of worker threads loading batches ahead of time. If 0 all
+            data is loaded in the calling thread.
+        transform : callable, optional (default is None)
+            Batch transform (see the transforms module) to be applied to each
+            batch. Runs in the worker threads.
+        readahead : bool, optional (default is False)
+            If True give read-ahead hints for the files of the next batch
+            also without worker threads, see iterate.
+        """
+        batches = chunks(self._index_list(split_name, split), batch_size,
+                         drop_last)
+
+        def batch_files(indices):
+            return [
+                filename for i in indices for filename in self.sample_files(i)
+            ]
+
+        yield from prefetch_map(
+            lambda indices: self.get_batch(indices, return_tuple, transform),
+            batches,
+            num_workers,
+            window=max(num_workers, 1),
+            files=batch_files if num_workers > 0 or readahead else None)
+
+    def sample_files(self, index):
+        """
+        Files read when loading the given sample with the currently selected
+        columns.
+
+        Used to give the OS read-ahead hints and to order reads by their
+        location on disk when prefetching.
+
+        Parameters
+        ----------
+        index : int
+            Index of the sample.
+        """
+        files = []
+        for col in self._selected_cols:
+            if col in self._data:
+                continue
+            file_col = self._file_cols.get(col, "keypoint-filename")
+            if file_col not in self._data:
+                continue
+            filenames = self._data[file_col][index]
+            if isinstance(filenames, str):
+                filenames = [filenames]
+            for filename in filenames:
+                if filename not in files:
+                    files.append(filename)
+        return files
+
+    def compute_stats(self,
+                      cols,
+                      split_name=None,
+                      split=None,
+                      num_workers=0,
+                      recompute=False):
+        """
+        Compute normalisation statistics of keypoint columns in one pass.
+
+        Statistics are computed over the last two axes of the data, which are
+        interpreted as (joints, channels). If a cache_dir was given at
+        construction the results are stored there and reused by later calls
+        with the same arguments. Progress is checkpointed there as well, an
+        interrupted computation continues where it stopped.
+
+        Parameters
+        ----------
+        cols : string or list of strings
+            Keypoint columns to compute the statistics of.
+        split_name : string, optional
+            If given together with split only use the given data subset.
+        split : string, optional
+            One of {train, valid, test}, see split_name.
+        num_workers : int, optional (default is 0)
+            Number of worker threads loading and processing the data.
+        recompute : bool, optional (default is False)
+            If True ignore previously cached results.
+
+        Returns
+        -------
+        dict
+            For each column a dict with the number of points 'count' and the
+            per joint and channel 'mean', 'std', 'min' and 'max' (shape
+            (joints, channels)), the same per channel only as
+            'channel_mean', 'channel_std', 'channel_min' and 'channel_max' and
+            the per sample extents 'sample_min' and 'sample_max' (shape
+            (samples, channels), NaN for empty samples) of the samples listed
+            in 'indices'.
+        """
+        return compute_stats(self,
+                             cols,
+                             split_name=split_name,
+                             split=split,
+                             num_workers=num_workers,
+                             recompute=recompute)
+
+    def _index_list(self, split_name, split):
+        """
+        Indices of the samples of the given subset or of the whole dataset if
+        either split_name or split is None.
+        """
+        if split_name is not None and split is not None:
+            return self.get_split(split_name, split)
+        return self._exclude_invalid(range(len(self)))
+
+    def validate(self, num_workers=0, cols=None):
+        """
+        Check every sample of the dataset for problems.
+
+        Loads every sample and records those that fail to load or have
+        missing or empty data. If a cache_dir was given at construction the
+        result is stored there and later dataset objects automatically
+        exclude the invalid samples from their splits (unless keep_invalid is
+        set). Progress is checkpointed there as well, an interrupted
+        validation continues where it stopped.
+
+        Parameters
+        ----------
+        num_workers : int, optional (default is 0)
+            Number of worker threads checking samples.
+        cols : list of strings, optional (default is None)
+            Columns to be loaded for the check. Defaults to all columns which
+            are loaded lazily.
+
+        Returns
+        -------
+        dict
+            Indices of invalid samples mapped to a description of the
+            problem.
+        """
+        self._invalid = validate(self, num_workers, cols)
+        return dict(self._invalid)
+
+    @property
+    def invalid_samples(self):
+        """
+        Invalid samples found by the last validation (if known) as a dict of
+        indices mapped to a description of the problem.
+        """
+        if self._invalid is None:
+            self._invalid = load_validity(self) or {}
+        return dict(self._invalid)
+
+    def _exclude_invalid(self, indices):
+        """
+        Remove invalid samples from the given list of indices, unless the
+        dataset was created with keep_invalid.
+        """
+        if self._keep_invalid:
+            return indices
+        if self._invalid is None:
+            self._invalid = load_validity(self) or {}
+        if len(self._invalid) == 0:
+            return indices
+        return [i for i in indices if i not in self._invalid]
+
+    def _validate_sample(self, index):
+        """
+        Check a single sample, loading the currently selected columns.
+
+        Datasets with specific failure modes override this to give more
+        precise descriptions or to check additional files.
+
+        Returns None if the sample is valid or a description of the problem.
+        """
+        return check_sample(self, index)
 
     def get_split(self, split_name, split):
         """
@@ -197,7 +570,85 @@ class DatasetLoader(ABC):
         if split not in self._splits[split_name]:
             raise KeyError("The split '" + split_name +
                            "' doesn't have a subset " + split)
-        return self._splits[split_name][split]
+        return self._exclude_invalid(self._splits[split_name][split])
+
+    def refresh(self, check_files=False):
+        """
+        Update the samples to the current contents of the dataset folder.
+
+        Only directories modified since the last scan are listed again.
+        Existing samples keep their order, new samples are appended. Only
+        available for datasets storing one sample per file.
+
+        Parameters
+        ----------
+        check_files : bool, optional (default is False)
+            If True also detect sample files modified in place by comparing
+            their size and modification time with the previous check (which
+            requires a stat call for every file).
+
+        Returns
+        -------
+        dict
+            'added': indices of new samples, 'removed': previous indices of
+            removed samples, 'modified': indices of modified samples.
+        """
+        if self._sample_dirs() is None:
+            raise Exception("This dataset does not support refresh!")
+        shared = self._shared is not None
+        if shared:
+            detach(self)
+        if not self._lazy:
+            for col in self._data_cols:
+                if col in self._data and col not in self._manifest_cols:
+                    del self._data[col]
+        with self._progress.phase("refresh") as phase:
+            changes = scan_samples(self, check_files)
+            phase.update(len(self))
+        if not self._lazy:
+            self._load_all()
+        if shared:
+            register(self)
+        return changes
+
+    def _scan_samples(self):
+        """
+        Initial scan of a dataset storing one sample per file (see the
+        manifest module).
+        """
+        self._manifest_cols = list(self._data.keys())
+        with self._progress.phase("scan") as phase:
+            scan_samples(self)
+            phase.update(len(self))
+
+    def _sample_dirs(self):
+        """
+        Directories holding the sample files of the dataset, None if the
+        dataset doesn't store one sample per file.
+        """
+        return None
+
+    def _sample_entry(self, directory, filename):
+        """
+        Describe the sample stored in the given file.
+
+        Returns a tuple of a dict with the value of each _data column and a
+        dict mapping split names to the subset the sample belongs to, or None
+        if the file is not a (selected) sample.
+        """
+        raise NotImplementedError
+
+    def _sample_entries(self, directory, filenames):
+        """
+        Describe the samples stored in the given files of a directory.
+
+        Returns a list of the _sample_entry of every file. Datasets with
+        many files override this to describe all files of a directory at
+        once.
+        """
+        return [
+            self._sample_entry(directory, filename) for filename in filenames
+        ]
 
     def _load_all(self):
         """
@@ -212,10 +663,11 @@ class DatasetLoader(ABC):
                 self._selected_cols.append(col)
                 data[col] = []
         if len(self._selected_cols) > 0:
-            for i in range(len(self)):
-                sample = self[i]
-                for col in self._selected_cols:
-                    data[col].append(sample[col])
+            with self._progress.phase("load", len(self)) as phase:
+                for i in phase.iterate(range(len(self))):
+                    sample = self[i]
+                    for col in self._selected_cols:
+                        data[col].append(sample[col])
         for key, val in data.items():
             self._data[key] = val
         self._selected_cols = select_cols
@@ -1,3 +1,6 @@
+from .aio import amap
+
+
 class DataSubset:
     """
     Provides a Sequence for a given subset of a DatasetLoader object.
@@ -17,3 +20,22 @@ class DataSubset:
         sample = self._dataset_loader[self._samples[index]]
         return tuple(sample[col]
                      for col in self._dataset_loader._selected_cols)
+
+    def aiterate(self, executor=None, max_concurrency=4):
+        """
+        Asynchronously iterate over the subset, returning tuples as
+        __getitem__ does. See DatasetLoader.aiterate.
+
+        Parameters
+        ----------
+        executor : concurrent.futures.Executor, optional (default is None)
+            Executor loading the samples. Defaults to the default executor of
+            the event loop.
+        max_concurrency : int, optional (default is 4)
+            Maximum number of samples being loaded at any time.
+        """
+        return amap(self.__getitem__, range(len(self)), executor,
+                    max_concurrency)
+
+    def __aiter__(self):
+        return self.aiterate()
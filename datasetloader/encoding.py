@@ -0,0 +1,192 @@
+"""
+Lossy encodings to reduce the storage size of keypoint data.
+
+'float16': half precision floats.
+'int16': 16 bit fixed point with a scale and offset per channel (last axis),
+    computed from the range of the encoded values. The maximum error is half
+    a quantisation step, i.e. range / 131068 per channel. NaN values are
+    stored as the lowest int16 value and decoded as NaN again.
+"""
+import numpy as np
+
+ENCODINGS = ("float16", "int16")
+
+_INT16_NAN = -2**15
+_INT16_STEPS = 2**16 - 2
+
+
+def encode(values, encoding):
+    """
+    Encode an array of values.
+
+    Parameters
+    ----------
+    values : numpy array
+        Values to be encoded, channels along the last axis.
+    encoding : string
+        One of ENCODINGS.
+
+    Returns
+    -------
+    tuple
+        The encoded array and the per channel scale and offset (None for
+        float16).
+    """
+    if encoding == "float16":
+        encoded = values.astype(np.float16)
+        if not np.all(np.isfinite(encoded[np.isfinite(values)])):
+            raise Exception("Values exceed the range of float16!")
+        return encoded, None, None
+    if encoding == "int16":
+        axes = tuple(range(values.ndim - 1))
+        if values.size == 0:
+            num_channels = values.shape[-1] if values.ndim > 0 else 1
+            return (values.astype(np.int16), np.ones(num_channels),
+                    np.zeros(num_channels))
+        nan_mask = np.isnan(values)
+        if np.any(nan_mask):
+            # fully NaN channels get an arbitrary range
+            finite = np.where(np.all(nan_mask, axis=axes), 0, values)
+            offset = np.nanmin(finite, axis=axes)
+            value_range = np.nanmax(finite, axis=axes) - offset
+        else:
+            offset = values.min(axis=axes)
+            value_range = values.max(axis=axes) - offset
+        scale = np.where(value_range > 0, value_range / _INT16_STEPS, 1.0)
+        encoded = np.rint((values - offset) / scale) + (_INT16_NAN + 1)
+        encoded[nan_mask] = _INT16_NAN
+        return encoded.astype(np.int16), scale, offset
+    raise KeyError("Unknown encoding '" + str(encoding) + "'!")
+
+
+def decode(encoded, encoding, scale=None, offset=None, dtype=np.float64):
+    """
+    Decode an array encoded with encode.
+
+    Parameters
+    ----------
+    encoded : numpy array
+        The encoded values.
+    encoding : string
+        One of ENCODINGS.
+    scale, offset : numpy arrays, optional
+        Per channel scale and offset as returned by encode (int16 only).
+    dtype : numpy dtype, optional (default is float64)
+        Type of the decoded values.
+    """
+    if encoding == "float16":
+        return encoded.astype(dtype)
+    if encoding == "int16":
+        decoded = encoded.astype(dtype)
+        decoded -= _INT16_NAN + 1
+        decoded *= scale.astype(dtype)
+        decoded += offset.astype(dtype)
+        decoded[encoded == _INT16_NAN] = np.nan
+        return decoded
+    raise KeyError("Unknown encoding '" + str(encoding) + "'!")
+
+
+class ErrorStats:
+    """
+    Accumulates the error introduced by an encoding.
+    """
+    def __init__(self):
+        self.max_error = 0.0
+        self._sum = 0.0
+        self._count = 0
+
+    @staticmethod
+    def measure(values, decoded):
+        """
+        Maximum, sum and number of the absolute errors of one sample, to be
+        passed to merge.
+        """
+        error = np.abs(decoded - values)
+        error = error[~np.isnan(error)]
+        if error.size == 0:
+            return 0.0, 0.0, 0
+        return float(error.max()), float(error.sum()), error.size
+
+    def merge(self, measured):
+        max_error, error_sum, count = measured
+        self.max_error = max(self.max_error, max_error)
+        self._sum += error_sum
+        self._count += count
+
+    def update(self, values, decoded):
+        self.merge(self.measure(values, decoded))
+
+    @property
+    def mean_error(self):
+        if self._count == 0:
+            return 0.0
+        return self._sum / self._count
+
+
+class ColumnEncoder:
+    """
+    Encodes the samples of a column one at a time, keeping track of the error
+    introduced.
+
+    Calling the encoder encodes a sample and records its error. In worker
+    threads use encode instead, which leaves the encoder untouched, and pass
+    the errors it returns to add_errors on a single thread.
+    """
+    def __init__(self, encoding):
+        if encoding not in ENCODINGS:
+            raise KeyError("Unknown encoding '" + str(encoding) + "'!")
+        self.encoding = encoding
+        self._errors = ErrorStats()
+        self._error_bound = 0.0
+
+    def __call__(self, values):
+        """
+        Encode the values of one sample and record the error introduced.
+
+        Channels are the last axis of the values, 1D values are treated as a
+        single channel. Returns the encoded values (same shape as the input)
+        and the per channel scale and offset (None for float16).
+        """
+        encoded, scale, offset, errors = self.encode(values)
+        self.add_errors(errors)
+        return encoded, scale, offset
+
+    def encode(self, values):
+        """
+        Encode the values of one sample without recording the error.
+
+        Returns the same as calling the encoder plus the errors of the
+        sample, to be passed to add_errors.
+        """
+        values = values.reshape(values.shape + (1, ) * (values.ndim < 2))
+        encoded, scale, offset = encode(values, self.encoding)
+        error_bound = 0.0
+        if self.encoding == "int16":
+            error_bound = float(scale.max()) / 2
+        elif not np.all(np.isnan(values)):
+            # float16 has an 11 bit significand
+            error_bound = float(np.nanmax(np.abs(values))) * 2**-11
+        measured = ErrorStats.measure(
+            values, decode(encoded, self.encoding, scale, offset,
+                           values.dtype))
+        return encoded, scale, offset, (error_bound, measured)
+
+    def add_errors(self, errors):
+        """
+        Record the errors of a sample returned by encode.
+        """
+        error_bound, measured = errors
+        self._error_bound = max(self._error_bound, error_bound)
+        self._errors.merge(measured)
+
+    def report(self):
+        """
+        Encoding, maximum and mean absolute error and theoretical error bound
+        of all values encoded so far.
+        """
+        return {
+            "encoding": self.encoding,
+            "max_error": self._errors.max_error,
+            "mean_error": self._errors.mean_error,
+            "error_bound": self._error_bound
+        }
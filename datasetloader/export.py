@@ -0,0 +1,61 @@
+"""
+Helpers shared by the exporters writing datasets into consolidated files.
+"""
+
+
+def check_cols(dataset_loader, cols):
+    """
+    Columns to be exported, defaulting to the currently selected columns.
+    """
+    if cols is None:
+        cols = list(dataset_loader._selected_cols)
+    if len(cols) == 0:
+        raise Exception("No columns selected for export!")
+    for col in cols:
+        if not dataset_loader.has_col(col):
+            raise KeyError("This dataset does not have '" + col +
+                           "'information.")
+    return cols
+
+
+def select_samples(dataset_loader, splits=None):
+    """
+    Samples and splits to be exported.
+
+    Parameters
+    ----------
+    dataset_loader : DatasetLoader
+        The dataset to be exported.
+    splits : list of (split_name, subset) tuples, optional (default is None)
+        If given only export the samples of these subsets, otherwise export
+        all (valid) samples and all splits.
+
+    Returns
+    -------
+    tuple
+        The sorted list of exported sample indices and a dict mapping each
+        (split_name, subset) tuple to the indices of its samples in the
+        exported data.
+    """
+    if splits is None:
+        indices = list(dataset_loader._index_list(None, None))
+        splits = []
+        if dataset_loader._splits is not None:
+            splits = [
+                (split_name, subset)
+                for split_name, subsets in dataset_loader._splits.items()
+                for subset in subsets
+            ]
+    else:
+        indices = sorted(
+            set(index for split_name, subset in splits
+                for index in dataset_loader.get_split(split_name, subset)))
+    new_index = {index: i for i, index in enumerate(indices)}
+    split_indices = {
+        (split_name, subset): [
+            new_index[i] for i in dataset_loader.get_split(split_name, subset)
+            if i in new_index
+        ]
+        for split_name, subset in splits
+    }
+    return indices, split_indices
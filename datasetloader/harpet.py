@@ -1,7 +1,6 @@
 import os.path
 import numpy as np
 import h5py
-from tqdm import trange
 
 from .datasetloader import DatasetLoader
 
@@ -74,21 +73,27 @@ class HARPET(DatasetLoader):
         This seems to be a very inefficient way to get the data but the only
         way that team to work to parse these files?
         """
-        h5_file = h5py.File(os.path.join(data_path, "annot_" + split + ".h5"),
-                            "r")
-        for seq in trange(0,
-                          len(h5_file["imgname"]),
-                          3,
-                          desc="Loading " + split + " file"):
-            filenames = [""] * 3
-            for i in range(3):
-                for j in range(len(h5_file["imgname"][seq + i])):
-                    if h5_file['imgname'][seq + i][j] != 0:
-                        filenames[i] += chr(int(h5_file["imgname"][seq +
-                                                                   i][j]))
-                action = filenames[i][14:filenames[i].find("_")]
-                filenames[i] = os.path.join(data_path, "images_" + split,
-                                            filenames[i])
-            self._data["image-filenames"].append(tuple(filenames))
-            self._data["keypoints"].append(h5_file["part"][seq:seq + 3])
-            self._data["actions"].append(HARPET.actions.index(action))
+        h5_filename = os.path.join(data_path, "annot_" + split + ".h5")
+        h5_file = h5py.File(h5_filename, "r")
+        seq_starts = range(0, len(h5_file["imgname"]), 3)
+        with self._progress.phase("load " + split + " file",
+                                  len(seq_starts)) as phase:
+            for seq in phase.iterate(seq_starts):
+                self._parse_sequence(data_path, split, h5_file, seq)
+            phase.update(0, bytes_read=os.path.getsize(h5_filename))
+
+    def _parse_sequence(self, data_path, split, h5_file, seq):
+        """
+        Add the sequence of 3 frames starting at the given index of the file.
+        """
+        filenames = [""] * 3
+        for i in range(3):
+            for j in range(len(h5_file["imgname"][seq + i])):
+                if h5_file['imgname'][seq + i][j] != 0:
+                    filenames[i] += chr(int(h5_file["imgname"][seq + i][j]))
+            action = filenames[i][14:filenames[i].find("_")]
+            filenames[i] = os.path.join(data_path, "images_" + split,
+                                        filenames[i])
+        self._data["image-filenames"].append(tuple(filenames))
+        self._data["keypoints"].append(h5_file["part"][seq:seq + 3])
+        self._data["actions"].append(HARPET.actions.index(action))
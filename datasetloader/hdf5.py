@@ -0,0 +1,422 @@
+"""
+Export of datasets into a single, self-describing HDF5 file and a dataset
+loader reading from such files.
+
+File layout:
+    attrs: format, version, dataset (class name of the source), length,
+           columns, landmarks/actions (json, if the source has them)
+    source_indices: index of each sample in the source dataset
+    splits/<split name>/<subset>: sample indices of the dataset splits
+    columns/<col>: one group per column with attribute 'kind'
+        kind 'scalar': 'data' with one value per sample
+        kind 'string': 'data' with one string per sample
+        kind 'array': samples flattened into rows of 'data' (the last two
+            axes for arrays of 3 or more dimensions, the last axis for 2D
+            arrays, nothing for 1D), 'offsets' (samples + 1 row offsets) and
+            'shapes' (original shape of each sample, -1 for missing data)
+        kind 'strings': like 'array' with strings as data
+        Array columns stored with a lossy encoding (see the encoding module)
+        have the attributes 'encoding' and 'dtype' (of the decoded data) and
+        for int16 the datasets 'quant_scale' and 'quant_offset' with the per
+        sample and channel scale and offset.
+"""
+import json
+
+import numpy as np
+import h5py
+
+from .datasetloader import DatasetLoader
+from .encoding import ENCODINGS, decode, ColumnEncoder
+from .export import check_cols, select_samples
+from .prefetch import prefetch_map
+
+FORMAT_NAME = "datasetloader-hdf5"
+FORMAT_VERSION = 1
+# Bounds for the size of a chunk of array data. Chunks are sized to hold about
+# one sample so random access to a sample touches as few chunks as possible.
+MIN_CHUNK_BYTES = 16 * 1024
+MAX_CHUNK_BYTES = 1024 * 1024
+# Amount of array data buffered before it is written to the file
+WRITE_BUFFER_BYTES = 8 * 1024 * 1024
+
+
+def export_hdf5(dataset_loader,
+                filename,
+                cols=None,
+                splits=None,
+                compression="gzip",
+                compression_opts=4,
+                encodings=None,
+                num_workers=0):
+    """
+    Write the selected columns and samples of a dataset into an HDF5 file.
+
+    Samples are loaded and written one at a time, the dataset is never held
+    in memory as a whole.
+
+    Returns a dict with the encoding, the maximum and mean absolute error and
+    the theoretical error bound of each column stored with a lossy encoding.
+
+    Parameters
+    ----------
+    dataset_loader : DatasetLoader
+        The dataset to be exported.
+    filename : string
+        Name of the HDF5 file to be created (overwritten if it exists).
+    cols : list of strings, optional (default is None)
+        Columns to be exported. Defaults to the currently selected columns.
+    splits : list of (split_name, subset) tuples, optional (default is None)
+        If given only export the samples of these subsets, otherwise export
+        all samples.
+    compression : string, optional (default is "gzip")
+        HDF5 compression filter of the array data, None for no compression.
+    compression_opts : optional (default is 4)
+        Options of the compression filter (e.g. the gzip level).
+    encodings : dict, optional (default is None)
+        Lossy encodings ('float16' or 'int16', see the encoding module) of
+        floating point array columns, by column name.
+    num_workers : int, optional (default is 0)
+        Number of worker threads loading samples ahead of time.
+    """
+    cols = check_cols(dataset_loader, cols)
+    if encodings is None:
+        encodings = {}
+    for col, encoding in encodings.items():
+        if col not in cols:
+            raise KeyError("Encoding given for column '" + col +
+                           "' which is not exported.")
+        if encoding not in ENCODINGS:
+            raise KeyError("Unknown encoding '" + str(encoding) + "'!")
+    indices, split_indices = select_samples(dataset_loader, splits)
+
+    loader = dataset_loader._with_cols(cols)
+    with h5py.File(filename, "w") as h5_file:
+        h5_file.attrs["format"] = FORMAT_NAME
+        h5_file.attrs["version"] = FORMAT_VERSION
+        h5_file.attrs["dataset"] = type(dataset_loader).__name__
+        h5_file.attrs["length"] = len(indices)
+        h5_file.attrs["columns"] = json.dumps(cols)
+        for attr in ("landmarks", "actions"):
+            if hasattr(dataset_loader, attr):
+                h5_file.attrs[attr] = json.dumps(
+                    list(getattr(dataset_loader, attr)))
+        h5_file.create_dataset("source_indices",
+                               data=np.array(indices, dtype=np.int64))
+        for (split_name, subset), subset_indices in split_indices.items():
+            h5_file.create_dataset("splits/" + split_name + "/" + subset,
+                                   data=np.array(subset_indices,
+                                                 dtype=np.int64))
+
+        writers = {}
+        for col in cols:
+            writers[col] = _ColumnWriter(h5_file, col, len(indices),
+                                         compression, compression_opts,
+                                         encodings.get(col))
+        for i, sample in enumerate(
+                prefetch_map(loader.__getitem__, indices, num_workers)):
+            for col in cols:
+                writers[col].write(i, sample[col])
+        for writer in writers.values():
+            writer.close()
+    return {
+        col: writer.error_report()
+        for col, writer in writers.items() if writer.encoding is not None
+    }
+
+
+class _ColumnWriter:
+    """
+    Streams the values of one column into the HDF5 file.
+
+    The storage layout is determined from the first (non-missing) value.
+    """
+    def __init__(self,
+                 h5_file,
+                 col,
+                 length,
+                 compression,
+                 compression_opts,
+                 encoding=None):
+        self._group = h5_file.create_group("columns/" + col)
+        self._col = col
+        self._length = length
+        self._compression = compression
+        self._compression_opts = compression_opts
+        self.encoding = encoding
+        if encoding is not None:
+            self._encoder = ColumnEncoder(encoding)
+        self._kind = None
+        self._pending = []
+
+    def write(self, index, value):
+        if self._kind is None:
+            if value is None:
+                # layout is still unknown, keep until there is data
+                self._pending.append(index)
+                return
+            self._setup(value)
+            for pending_index in self._pending:
+                self._write(pending_index, None)
+            self._pending = []
+        self._write(index, value)
+
+    def _setup(self, value):
+        group = self._group
+        if isinstance(value, (str, bytes)):
+            self._kind = "string"
+            group.create_dataset("data", (self._length, ),
+                                 dtype=h5py.string_dtype())
+        elif np.ndim(value) == 0:
+            self._kind = "scalar"
+            group.create_dataset("data", (self._length, ),
+                                 dtype=np.asarray(value).dtype)
+        else:
+            array = np.asarray(value)
+            if array.dtype == object:
+                raise Exception("Column '" + self._col + "' contains "
+                                "samples of differently shaped parts which "
+                                "can't be exported.")
+            if array.dtype.kind in ("U", "S"):
+                self._kind = "strings"
+                dtype = h5py.string_dtype()
+            else:
+                self._kind = "array"
+                dtype = array.dtype
+            if self.encoding is not None:
+                if self._kind != "array" or array.dtype.kind != "f":
+                    raise Exception("Column '" + self._col + "' can't be "
+                                    "encoded, encodings only apply to "
+                                    "floating point data.")
+                group.attrs["encoding"] = self.encoding
+                group.attrs["dtype"] = array.dtype.str
+                dtype = np.dtype(self.encoding)
+            if array.ndim >= 3:
+                self._row_shape = array.shape[-2:]
+            elif array.ndim == 2:
+                self._row_shape = array.shape[-1:]
+            else:
+                self._row_shape = ()
+            self._ndim = array.ndim
+            row_bytes = max(int(np.prod(self._row_shape)) * dtype.itemsize, 1)
+            chunk_bytes = min(
+                max(array.size * dtype.itemsize, MIN_CHUNK_BYTES),
+                MAX_CHUNK_BYTES)
+            chunk_rows = max(chunk_bytes // row_bytes, 1)
+            options = {}
+            if self._kind == "array" and self._compression is not None:
+                options = {
+                    "compression": self._compression,
+                    "compression_opts": self._compression_opts,
+                    "shuffle": True
+                }
+            group.create_dataset("data", (0, ) + self._row_shape,
+                                 maxshape=(None, ) + self._row_shape,
+                                 chunks=(chunk_rows, ) + self._row_shape,
+                                 dtype=dtype,
+                                 **options)
+            self._offsets = np.zeros(self._length + 1, dtype=np.int64)
+            self._shapes = np.full((self._length, self._ndim),
+                                   -1,
+                                   dtype=np.int64)
+            self._buffer = []
+            self._buffer_bytes = 0
+            self._rows = 0
+            if self.encoding == "int16":
+                num_channels = 1
+                if len(self._row_shape) > 0:
+                    num_channels = self._row_shape[-1]
+                self._quant_scale = np.ones((self._length, num_channels))
+                self._quant_offset = np.zeros((self._length, num_channels))
+        group.attrs["kind"] = self._kind
+
+    def _write(self, index, value):
+        if self._kind in ("string", "scalar"):
+            if value is None:
+                raise Exception("Column '" + self._col + "' is missing data "
+                                "which can't be exported.")
+            self._group["data"][index] = value
+            return
+        if value is not None:
+            value = np.asarray(value)
+            if value.ndim != self._ndim or (
+                    self._ndim > 0
+                    and value.shape[value.ndim - len(self._row_shape):]
+                    != self._row_shape):
+                raise Exception("Column '" + self._col + "' has samples of "
+                                "incompatible shapes.")
+            self._shapes[index] = value.shape
+            rows = value.reshape((-1, ) + self._row_shape)
+            if self.encoding is not None:
+                rows = self._encode(index, rows)
+            self._buffer.append(rows)
+            self._buffer_bytes += rows.nbytes
+            self._rows += rows.shape[0]
+        self._offsets[index + 1] = self._rows
+        if self._buffer_bytes >= WRITE_BUFFER_BYTES:
+            self._flush()
+
+    def _encode(self, index, rows):
+        """
+        Encode the rows of a sample, keeping track of the error.
+        """
+        encoded, scale, offset = self._encoder(rows)
+        if self.encoding == "int16":
+            self._quant_scale[index] = scale
+            self._quant_offset[index] = offset
+        return encoded.reshape(rows.shape)
+
+    def error_report(self):
+        """
+        Error introduced by the encoding of the column.
+        """
+        return self._encoder.report()
+
+    def _flush(self):
+        if len(self._buffer) == 0:
+            return
+        data = self._group["data"]
+        rows = np.concatenate(self._buffer)
+        start = data.shape[0]
+        data.resize(start + rows.shape[0], axis=0)
+        if self._kind == "strings":
+            rows = rows.astype(object)
+        data[start:] = rows
+        self._buffer = []
+        self._buffer_bytes = 0
+
+    def close(self):
+        if self._kind is None:
+            raise Exception("Column '" + self._col + "' has no data in the "
+                            "exported samples!")
+        if self._kind in ("array", "strings"):
+            self._flush()
+            self._group.create_dataset("offsets", data=self._offsets)
+            self._group.create_dataset("shapes", data=self._shapes)
+        if self.encoding == "int16":
+            self._group.create_dataset("quant_scale", data=self._quant_scale)
+            self._group.create_dataset("quant_offset", data=self._quant_offset)
+
+
+class HDF5Dataset(DatasetLoader):
+    """
+    Dataset stored in an HDF5 file written by export_hdf5.
+
+    Scalar and string columns are held in memory, array columns are read from
+    the file on access, touching only the chunks holding the requested
+    sample. Encoded columns are decoded on read.
+    """
+    splits = None
+    # objects hold their own file handle
+    _shareable = False
+
+    def __init__(self, data_path, **kwargs):
+        """
+        Parameters
+        ----------
+        data_path : string
+            HDF5 file written by export_hdf5
+        """
+        self._file = h5py.File(data_path, "r")
+        if self._file.attrs.get("format") != FORMAT_NAME:
+            raise Exception("'" + data_path + "' is not a dataset file "
+                            "written by export_hdf5!")
+        self.dataset_name = self._file.attrs["dataset"]
+        for attr in ("landmarks", "actions"):
+            if attr in self._file.attrs:
+                setattr(self, attr, json.loads(self._file.attrs[attr]))
+
+        self._data_cols = json.loads(self._file.attrs["columns"])
+        self._data = {}
+        self._columns = {}
+        for col in self._data_cols:
+            group = self._file["columns/" + col]
+            kind = group.attrs["kind"]
+            if kind == "scalar":
+                self._data[col] = group["data"][()]
+            elif kind == "string":
+                self._data[col] = np.array(_decode(group["data"][()]),
+                                           dtype=object)
+            else:
+                self._columns[col] = _Column(group)
+
+        self._splits = None
+        if "splits" in self._file:
+            self._splits = {
+                split_name: {
+                    subset: list(indices[()])
+                    for subset, indices in subsets.items()
+                }
+                for split_name, subsets in self._file["splits"].items()
+            }
+            self.splits = list(self._splits.keys())
+        self._length = int(self._file.attrs["length"])
+        super().__init__(**kwargs)
+
+    @property
+    def source_indices(self):
+        """
+        Indices of the samples in the dataset they were exported from.
+        """
+        return self._file["source_indices"][()]
+
+    def close(self):
+        self._file.close()
+
+    def __getitem__(self, index):
+        """
+        Indexing access to the dataset.
+
+        Returns a dictionary of all currently selected data columns of the
+        selected item.
+        """
+        data = super().__getitem__(index)
+        for col in self._selected_cols:
+            if col in self._columns:
+                data[col] = self._read(col, index)
+        return data
+
+    def _read(self, col, index):
+        """
+        Read the array data of a single sample.
+        """
+        column = self._columns[col]
+        if column.shapes[index, 0] < 0:
+            return None
+        rows = column.data[column.offsets[index]:column.offsets[index + 1]]
+        if column.kind == "strings":
+            rows = np.array(_decode(rows))
+        elif column.encoding is not None:
+            scale = offset = None
+            if column.encoding == "int16":
+                scale = column.quant_scale[index]
+                offset = column.quant_offset[index]
+            rows = decode(rows.reshape(rows.shape + (1, ) * (rows.ndim == 1)),
+                          column.encoding, scale, offset, column.dtype)
+        return rows.reshape(column.shapes[index])
+
+
+class _Column:
+    """
+    Handles of the datasets of an array column.
+    """
+    def __init__(self, group):
+        self.kind = group.attrs["kind"]
+        self.data = group["data"]
+        self.offsets = group["offsets"][()]
+        self.shapes = group["shapes"][()]
+        self.encoding = group.attrs.get("encoding")
+        if self.encoding is not None:
+            self.dtype = np.dtype(group.attrs["dtype"])
+        if self.encoding == "int16":
+            self.quant_scale = group["quant_scale"][()]
+            self.quant_offset = group["quant_offset"][()]
+
+
+def _decode(strings):
+    """
+    Strings are read as bytes or str depending on the h5py version.
+    """
+    return [
+        string.decode("utf-8") if isinstance(string, bytes) else string
+        for string in strings
+    ]
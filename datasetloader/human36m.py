@@ -1,6 +1,5 @@
 import os
 
-import numpy as np
 import cdflib
 
 from .datasetloader import DatasetLoader
@@ -53,6 +52,12 @@ class Human36M(DatasetLoader):
     ]
 
     splits = ["default"]
+    _file_cols = {
+        "keypoints2D": "keypoint2D-filenames",
+        "keypoints3D": "keypoint3D-filename",
+        "keypoints3D-mono": "keypoint3D-mono-filenames",
+        "keypoints3D-mono-universal": "keypoint3D-mono-universal-filenames"
+    }
 
     def __init__(self, data_path, **kwargs):
         """
@@ -186,7 +191,9 @@ class Human36M(DatasetLoader):
                 keypoints[:, :, 1] *= -1
             else:
                 keypoints = keypoints[:, :, (0, 2, 1)]
-        return np.array(keypoints)
+        # the pose variable is read into a new array already, which the
+        # reshapes only view
+        return keypoints
 
     def __getitem__(self, index):
         """
@@ -1,7 +1,6 @@
 import os
 import numpy as np
 from scipy.io import loadmat
-from tqdm import tqdm
 
 from .datasetloader import DatasetLoader
 
@@ -32,6 +31,11 @@ class JHMDB(DatasetLoader):
     ]
 
     splits = [str(i) for i in range(1, 4)]
+    _file_cols = {
+        "keypoints2D": "data-filename",
+        "viewpoint": "data-filename",
+        "scales": "data-filename"
+    }
 
     @classmethod
     def add_argparse_args(cls, parser, default_split=None):
@@ -78,34 +82,41 @@ class JHMDB(DatasetLoader):
         else:
             split_filename = "_test_split"
             split_folder = "splits"
-        for cls_id, cls in tqdm(enumerate(JHMDB.actions)):
-            # load dat for this class
-            for filename in os.listdir(os.path.join(data_path, "videos", cls)):
-                if filename.endswith(".avi"):
-                    self._data["video-filename"].append(
-                        os.path.join(data_path, "videos", cls, filename))
-                    self._data["data-filename"].append(
-                        os.path.join(data_path, "joint_positions", cls,
-                                     filename[:-4], "joint_positions.mat"))
-                    self._data["action"].append(cls_id)
-                    self._length += 1
-            # load splits  information for this class
-            for split in self._splits.keys():
-                split_file = os.path.join(
-                    data_path, split_folder,
-                    cls + split_filename + str(split) + ".txt")
-                if os.path.exists(split_file):
-                    with open(split_file, 'r') as f:
-                        for line in f:
-                            line = line.strip()
-                            seq_name = line[:line.find(".avi") + 4]
-                            for i, filename in enumerate(
-                                    self._data["video-filename"]):
-                                if filename.endswith(os.path.sep + seq_name):
-                                    if line[-1] == "1":
-                                        self._splits[split]["train"].append(i)
-                                    else:
-                                        self._splits[split]["test"].append(i)
+        with self._progress.phase("scan classes", len(JHMDB.actions)) as phase:
+            for cls_id, cls in phase.iterate(enumerate(JHMDB.actions)):
+                # load dat for this class
+                for filename in os.listdir(
+                        os.path.join(data_path, "videos", cls)):
+                    if filename.endswith(".avi"):
+                        self._data["video-filename"].append(
+                            os.path.join(data_path, "videos", cls, filename))
+                        self._data["data-filename"].append(
+                            os.path.join(data_path, "joint_positions", cls,
+                                         filename[:-4], "joint_positions.mat"))
+                        self._data["action"].append(cls_id)
+                        self._length += 1
+                # load splits  information for this class
+                for split in self._splits.keys():
+                    split_file = os.path.join(
+                        data_path, split_folder,
+                        cls + split_filename + str(split) + ".txt")
+                    if os.path.exists(split_file):
+                        phase.update(0,
+                                     bytes_read=os.path.getsize(split_file))
+                        with open(split_file, 'r') as f:
+                            for line in f:
+                                line = line.strip()
+                                seq_name = line[:line.find(".avi") + 4]
+                                for i, filename in enumerate(
+                                        self._data["video-filename"]):
+                                    if filename.endswith(os.path.sep +
+                                                         seq_name):
+                                        if line[-1] == "1":
+                                            self._splits[split][
+                                                "train"].append(i)
+                                        else:
+                                            self._splits[split]["test"].append(
+                                                i)
         super().__init__(**kwargs)
 
     def load_datafile(self, filename):
@@ -1,7 +1,6 @@
 import os.path
 import numpy as np
 from scipy.io import loadmat
-from tqdm import trange
 
 from .datasetloader import DatasetLoader
 
@@ -38,12 +37,16 @@ class LSP(DatasetLoader):
         kwargs["no_lazy_loading"] = True
         super().__init__(**kwargs)
 
-        raw_data = loadmat(os.path.join(data_path, "joints.mat"))
+        joints_file = os.path.join(data_path, "joints.mat")
+        with self._progress.phase("read annotations", 1) as phase:
+            raw_data = loadmat(joints_file)
+            phase.update(bytes_read=os.path.getsize(joints_file))
         self._data["keypoints2D"] = np.transpose(raw_data['joints'])
-        for i in trange(0, 2000):
-            self._data["image-filename"].append(
-                os.path.join(
-                    data_path, "images", "im" + ("0" * (4 - len(str(i + 1)))) +
-                    str(i + 1) + ".jpg"))
+        with self._progress.phase("list images", 2000) as phase:
+            for i in phase.iterate(range(0, 2000)):
+                self._data["image-filename"].append(
+                    os.path.join(
+                        data_path, "images", "im" +
+                        ("0" * (4 - len(str(i + 1)))) + str(i + 1) + ".jpg"))
 
         self._data["image-filename"] = np.array(self._data["image-filename"])
@@ -1,7 +1,6 @@
 import os.path
 import numpy as np
 from scipy.io import loadmat
-from tqdm import trange
 
 from .datasetloader import DatasetLoader
 
@@ -56,20 +55,24 @@ class LSPExtended(DatasetLoader):
         kwargs["no_lazy_loading"] = True
         super().__init__(**kwargs)
 
-        raw_data = loadmat(os.path.join(data_path, "joints.mat"))
+        joints_file = os.path.join(data_path, "joints.mat")
+        with self._progress.phase("read annotations", 1) as phase:
+            raw_data = loadmat(joints_file)
+            phase.update(bytes_read=os.path.getsize(joints_file))
         self._data["keypoints2D"] = np.transpose(raw_data['joints'], (2, 0, 1))
-        for i in trange(0, 10000):
-            filename = os.path.join(
-                data_path, "images",
-                "im" + ("0" * (5 - len(str(i + 1)))) + str(i + 1))
-            if improved:
-                filename += ".png"
-                # the improved version misses a few images, in this case skip
-                # numbers that don't exist
-                if not os.path.exists(filename):
-                    continue
-            else:
-                filename += ".jpg"
-            self._data["image-filename"].append(filename)
+        with self._progress.phase("list images", 10000) as phase:
+            for i in phase.iterate(range(0, 10000)):
+                filename = os.path.join(
+                    data_path, "images",
+                    "im" + ("0" * (5 - len(str(i + 1)))) + str(i + 1))
+                if improved:
+                    filename += ".png"
+                    # the improved version misses a few images, in this case
+                    # skip numbers that don't exist
+                    if not os.path.exists(filename):
+                        continue
+                else:
+                    filename += ".jpg"
+                self._data["image-filename"].append(filename)
 
         self._data["image-filename"] = np.array(self._data["image-filename"])
@@ -0,0 +1,258 @@
+"""
+Incremental scanning of datasets which store one sample per file.
+
+Such datasets list the directories holding their sample files
+(_sample_dirs) and describe the sample belonging to a file (_sample_entry, or
+_sample_entries for all files of a directory at once).
+The result of a scan is kept as a manifest of the modification times of the
+directories and the files of all samples in index order. Rescans only list
+directories whose modification time changed, keep the indices of existing
+samples and append new samples at the end. If the dataset has a cache_dir
+the manifest is stored there, making the initial scan of later constructions
+incremental as well.
+"""
+import os
+import json
+import time
+
+import numpy as np
+
+from .cache import cache_path, remove_cached
+from .validity import (load_validity, save_validity,
+                       VALIDITY_PARTIAL_FILENAME)
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 2
+# Directories modified less than this many seconds before a scan are listed
+# again by the next scan, since further changes within the resolution of
+# their modification time would go unnoticed.
+_MTIME_GRACE = 2
+
+
+def scan_samples(dataset_loader, check_files=False):
+    """
+    Scan the sample directories of a dataset and update its samples.
+
+    Sets the '_data' columns, '_splits' and '_length' of the dataset in
+    place. The indices of samples which still exist are kept (shifting down
+    past removed samples), new samples are appended in the order of their
+    directories and filenames. Cached validity information is remapped to
+    the new indices and cached statistics (and unfinished validations) are
+    discarded if anything changed.
+
+    Parameters
+    ----------
+    dataset_loader : DatasetLoader
+        Dataset implementing _sample_dirs and _sample_entry (or
+        _sample_entries).
+    check_files : bool, optional (default is False)
+        If True also compare the size and modification time of every sample
+        file with the previous scan to detect files modified in place. Files
+        are only reported as modified if the previous scan checked them too.
+
+    Returns
+    -------
+    dict
+        'added': new indices of added samples, 'removed': previous indices
+        of removed samples, 'modified': new indices of modified samples.
+    """
+    manifest = getattr(dataset_loader, "_manifest", None)
+    if manifest is None:
+        manifest = _load_manifest(dataset_loader)
+    old_dirs = dict(manifest["dirs"])
+    # samples are stored as parallel lists, which load much faster than a
+    # list per sample
+    dir_names = [directory for directory, _ in manifest["dirs"]]
+    old_samples = list(
+        zip([dir_names[dir_index] for dir_index in manifest["sample_dirs"]],
+            manifest["filenames"]))
+
+    now = time.time()
+    dirs = []
+    listings = {}
+    # the manifest identifies directories by their absolute path
+    given_dirs = {}
+    for given_dir in dataset_loader._sample_dirs():
+        directory = os.path.abspath(given_dir)
+        given_dirs[directory] = given_dir
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime is None:
+            listings[directory] = set()
+        elif old_dirs.get(directory) != mtime:
+            listings[directory] = set(os.listdir(directory))
+        if mtime is not None and now - mtime / 1e9 < _MTIME_GRACE:
+            mtime = None
+        dirs.append([directory, mtime])
+    dir_indices = {directory: i for i, (directory, _) in enumerate(dirs)}
+
+    samples = []
+    entries = []
+    removed = []
+    mapping = np.full(len(old_samples), -1, dtype=np.int64)
+    # only needed to find new files in listed directories
+    known = set(old_samples) if len(listings) > 0 else set()
+    # samples whose file still exists, None for the others
+    existing = [
+        sample if sample[0] in dir_indices and
+        (sample[0] not in listings or sample[1] in listings[sample[0]]) else
+        None for sample in old_samples
+    ]
+    old_entries = _describe_samples(dataset_loader, given_dirs, existing)
+    for old_index, sample in enumerate(old_samples):
+        entry = old_entries[old_index]
+        if entry is None:
+            removed.append(old_index)
+            continue
+        mapping[old_index] = len(samples)
+        samples.append(sample)
+        entries.append(entry)
+    added = []
+    for directory, _ in dirs:
+        filenames = [
+            filename for filename in sorted(listings.get(directory, ()))
+            if (directory, filename) not in known
+        ]
+        new_entries = dataset_loader._sample_entries(given_dirs[directory],
+                                                     filenames)
+        for filename, entry in zip(filenames, new_entries):
+            if entry is not None:
+                added.append(len(samples))
+                samples.append((directory, filename))
+                entries.append(entry)
+
+    modified = []
+    file_stats = {}
+    old_stats = manifest["file_stats"]
+    # without file checks only the stats of earlier checks are carried over
+    if check_files or len(old_stats) > 0:
+        for index, (directory, filename) in enumerate(samples):
+            path = os.path.join(directory, filename)
+            if check_files:
+                stat = os.stat(path)
+                file_stats[path] = [stat.st_mtime_ns, stat.st_size]
+                if path in old_stats and old_stats[path] != file_stats[path]:
+                    modified.append(index)
+            elif path in old_stats:
+                file_stats[path] = old_stats[path]
+
+    _set_samples(dataset_loader, entries)
+    if (len(added) == 0 and len(removed) == 0
+            and [directory for directory, _ in dirs
+                 ] == [directory for directory, _ in manifest["dirs"]]):
+        # same samples in the same directories
+        sample_dirs = manifest["sample_dirs"]
+        filenames = manifest["filenames"]
+    else:
+        sample_dirs = [dir_indices[directory] for directory, _ in samples]
+        filenames = [filename for _, filename in samples]
+    dataset_loader._manifest = {
+        "version": MANIFEST_VERSION,
+        "dirs": dirs,
+        "sample_dirs": sample_dirs,
+        "filenames": filenames,
+        "file_stats": file_stats
+    }
+    changed = (len(added) > 0 or len(removed) > 0 or len(modified) > 0)
+    if changed or dirs != manifest["dirs"] or check_files:
+        _save_manifest(dataset_loader)
+    if len(old_samples) > 0 and changed:
+        _update_caches(dataset_loader, mapping, modified)
+    return {"added": added, "removed": removed, "modified": modified}
+
+
+def _describe_samples(dataset_loader, given_dirs, samples):
+    """
+    Entries of the given (directory, filename) samples (None for samples to
+    be skipped), describing the files of each directory in a single call.
+    """
+    by_directory = {}
+    for index, sample in enumerate(samples):
+        if sample is not None:
+            by_directory.setdefault(sample[0], []).append(index)
+    entries = [None] * len(samples)
+    for directory, indices in by_directory.items():
+        dir_entries = dataset_loader._sample_entries(
+            given_dirs[directory], [samples[index][1] for index in indices])
+        for index, entry in zip(indices, dir_entries):
+            entries[index] = entry
+    return entries
+
+
+def _set_samples(dataset_loader, entries):
+    """
+    Replace the samples of the dataset with the given (data, splits) entries.
+    """
+    for col in dataset_loader._data:
+        dataset_loader._data[col] = [data[col] for data, _ in entries]
+    for subsets in dataset_loader._splits.values():
+        for subset in subsets:
+            subsets[subset] = []
+    # loaders share the splits dict between entries with the same subsets,
+    # so the indices are collected once per distinct dict
+    groups = {}
+    for index, (_, splits) in enumerate(entries):
+        group = groups.get(id(splits))
+        if group is None:
+            group = groups[id(splits)] = (splits, [])
+        group[1].append(index)
+    for splits, indices in groups.values():
+        for split_name, subset in splits.items():
+            dataset_loader._splits[split_name][subset].extend(indices)
+    if len(groups) > 1:
+        for subsets in dataset_loader._splits.values():
+            for indices in subsets.values():
+                indices.sort()
+    dataset_loader._length = len(entries)
+
+
+def _update_caches(dataset_loader, mapping, modified):
+    """
+    Remap the validity index to the new sample indices, dropping removed and
+    modified samples (which need to be validated again), and discard cached
+    statistics.
+    """
+    invalid = getattr(dataset_loader, "_invalid", None)
+    if invalid is None:
+        invalid = load_validity(dataset_loader, length=len(mapping))
+    if invalid is not None:
+        modified = set(modified)
+        invalid = {
+            int(mapping[index]): problem
+            for index, problem in invalid.items()
+            if mapping[index] >= 0 and mapping[index] not in modified
+        }
+        dataset_loader._invalid = invalid
+        save_validity(dataset_loader, invalid)
+    remove_cached(dataset_loader, "stats_")
+    remove_cached(dataset_loader, VALIDITY_PARTIAL_FILENAME)
+
+
+def _load_manifest(dataset_loader):
+    """
+    Read the stored manifest of the dataset, or an empty one if there is
+    none.
+    """
+    filename = cache_path(dataset_loader, MANIFEST_FILENAME)
+    if filename is not None and os.path.exists(filename):
+        with open(filename, "r") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    return {"dirs": [], "sample_dirs": [], "filenames": [], "file_stats": {}}
+
+
+def _save_manifest(dataset_loader):
+    """
+    Atomically write the manifest to the cache folder of the dataset (if it
+    has one).
+    """
+    filename = cache_path(dataset_loader, MANIFEST_FILENAME)
+    if filename is None:
+        return
+    tmp_filename = filename + ".tmp" + str(os.getpid())
+    with open(tmp_filename, "w") as f:
+        json.dump(dataset_loader._manifest, f)
+    os.replace(tmp_filename, filename)
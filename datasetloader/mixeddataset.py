@@ -0,0 +1,360 @@
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from .prefetch import prefetch_map, collate, chunks, readahead
+from .transforms import apply_to_sample
+
+
+class MixedDataset:
+    """
+    Mixes the samples of several DatasetLoader objects.
+
+    Samples are drawn from the individual datasets in proportion to the given
+    weights. Every dataset is read by its own pool of worker threads, which
+    keeps up to a fixed number of reads in flight (the per-dataset throughput
+    budget). Samples are passed on in the order in which they become
+    available so a slow dataset does not hold up the faster ones.
+    """
+    def __init__(self,
+                 datasets,
+                 weights=None,
+                 num_workers=2,
+                 prefetch=None,
+                 strict=False,
+                 seed=None):
+        """
+        Parameters
+        ----------
+        datasets : list of DatasetLoader objects
+            Datasets to be mixed. Column selections are configured on the
+            datasets directly.
+        weights : list of floats, optional (default is None)
+            Relative sampling weight of each dataset. If None all datasets are
+            weighted equally.
+        num_workers : int or list of ints, optional (default is 2)
+            Number of worker threads per dataset, at least 1. Either one number
+            for all datasets or one per dataset.
+        prefetch : int or list of ints, optional (default is None)
+            Maximum number of samples being read ahead per dataset, at least 1.
+            Either one number for all datasets or one per dataset. Defaults to
+            twice the number of workers of the dataset.
+        strict : bool, optional (default is False)
+            If True always wait for the dataset which is next in line
+            according to the weights. If False take a sample from the most
+            underrepresented dataset which has data ready instead, so that
+            the proportions only hold as long as all datasets keep up.
+        seed : int, optional (default is None)
+            Seed for shuffling the samples of each dataset.
+        """
+        if len(datasets) == 0:
+            raise Exception("At least one dataset is required!")
+        self._datasets = list(datasets)
+        if weights is None:
+            weights = [1] * len(self._datasets)
+        if len(weights) != len(self._datasets):
+            raise Exception("The number of weights must match the number of "
+                            "datasets!")
+        weights = np.array(weights, dtype=np.float64)
+        if np.any(weights < 0) or weights.sum() == 0:
+            raise Exception("Weights must be non-negative and not all zero!")
+        self._weights = weights / weights.sum()
+        self._num_workers = self._per_dataset(num_workers)
+        if prefetch is None:
+            prefetch = [2 * workers for workers in self._num_workers]
+        self._prefetch = self._per_dataset(prefetch)
+        if min(self._num_workers) < 1:
+            raise Exception("Every dataset needs at least one worker!")
+        if min(self._prefetch) < 1:
+            raise Exception("Every dataset needs to read at least one sample "
+                            "ahead!")
+        self._strict = strict
+        self._rng = np.random.default_rng(seed)
+        self._executors = [
+            ThreadPoolExecutor(workers) for workers in self._num_workers
+        ]
+        self._offsets = np.cumsum([0] +
+                                  [len(dataset) for dataset in self._datasets])
+
+    def _per_dataset(self, value):
+        """
+        Expand a single setting to a list with one entry per dataset.
+        """
+        if isinstance(value, int):
+            return [value] * len(self._datasets)
+        if len(value) != len(self._datasets):
+            raise Exception("Per dataset settings must have one entry per "
+                            "dataset!")
+        return list(value)
+
+    @property
+    def datasets(self):
+        return self._datasets
+
+    @property
+    def weights(self):
+        return self._weights
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def __getitem__(self, index):
+        """
+        Indexing access to the concatenation of all datasets.
+        """
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("Index out of range")
+        dataset_id = bisect_right(self._offsets, index) - 1
+        return self._datasets[dataset_id][index - self._offsets[dataset_id]]
+
+    def close(self):
+        """
+        Shut down the worker threads of all datasets.
+        """
+        for executor in self._executors:
+            executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def iterate(self,
+                split_name=None,
+                split=None,
+                return_tuple=False,
+                num_samples=None,
+                shuffle=True,
+                return_source=False,
+                transform=None):
+        """
+        Iterate over a weighted mix of the datasets.
+
+        Datasets which run out of samples before the end of the iteration
+        start over (reshuffled if shuffle is True).
+
+        Parameters
+        ----------
+        split_name : string or list of strings, optional
+            Dataset split to draw samples from, either one name for all
+            datasets or one per dataset. If None but split is given the
+            currently selected split of each dataset is used.
+        split : string, optional
+            One of {train, valid, test}. If None iterate over the whole
+            datasets.
+        return_tuple : bool, optional (default is False)
+            If True return the data elements as tuples instead of dicts
+        num_samples : int, optional (default is None)
+            Total number of samples to return. Defaults to the sum of the
+            sizes of all selected subsets.
+        shuffle : bool, optional (default is True)
+            If True visit the samples of each dataset in random order.
+        return_source : bool, optional (default is False)
+            If True yield tuples of (dataset id, sample).
+        transform : callable, optional (default is None)
+            Batch transform (see the transforms module) to be applied to each
+            sample. Runs in the worker threads of the datasets.
+        """
+        index_lists = self._index_lists(split_name, split)
+        if num_samples is None:
+            num_samples = sum(len(index_list) for index_list in index_lists)
+        weights = self._weights.copy()
+        for dataset_id, index_list in enumerate(index_lists):
+            if len(index_list) == 0:
+                weights[dataset_id] = 0
+        if num_samples > 0 and weights.sum() == 0:
+            raise Exception("None of the datasets with non-zero weight has "
+                            "any samples!")
+        weights /= max(weights.sum(), 1e-12)
+        active = [
+            dataset_id for dataset_id in range(len(self._datasets))
+            if weights[dataset_id] > 0
+        ]
+
+        samplers = {
+            dataset_id:
+            self._readahead(dataset_id,
+                            self._sampler(index_lists[dataset_id], shuffle))
+            for dataset_id in active
+        }
+        pending = {dataset_id: deque() for dataset_id in active}
+        emitted = np.zeros(len(self._datasets))
+        try:
+            for total in range(num_samples):
+                for dataset_id in active:
+                    queue = pending[dataset_id]
+                    while len(queue) < self._prefetch[dataset_id]:
+                        queue.append(self._executors[dataset_id].submit(
+                            self._load, dataset_id, next(samplers[dataset_id]),
+                            return_tuple, transform))
+                # deficit of each dataset w.r.t. its share after this sample
+                deficit = weights * (total + 1) - emitted
+                # random tie breaking, without it equally weighted datasets
+                # are always visited in the same order
+                deficit += self._rng.random(len(deficit)) * 1e-9
+                while True:
+                    if self._strict:
+                        candidates = [max(active, key=lambda i: deficit[i])]
+                    else:
+                        candidates = active
+                    ready = [
+                        dataset_id for dataset_id in candidates
+                        if pending[dataset_id][0].done()
+                    ]
+                    if len(ready) > 0:
+                        break
+                    wait([pending[dataset_id][0] for dataset_id in candidates],
+                         return_when=FIRST_COMPLETED)
+                dataset_id = max(ready, key=lambda i: deficit[i])
+                sample = pending[dataset_id].popleft().result()
+                emitted[dataset_id] += 1
+                if return_source:
+                    yield dataset_id, sample
+                else:
+                    yield sample
+        finally:
+            for queue in pending.values():
+                for future in queue:
+                    future.cancel()
+
+    def iterate_batches(self,
+                        batch_size,
+                        split_name=None,
+                        split=None,
+                        return_tuple=False,
+                        drop_last=False,
+                        num_samples=None,
+                        shuffle=True,
+                        return_source=False,
+                        transform=None):
+        """
+        Iterate over a weighted mix of the datasets in batches.
+
+        All datasets need to have the same columns selected. See iterate for
+        the parameters.
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of samples per batch.
+        drop_last : bool, optional (default is False)
+            If True drop the last batch if it is smaller than batch_size.
+        return_source : bool, optional (default is False)
+            If True yield tuples of (dataset ids, batch) where dataset ids is
+            an array with the id of the source dataset of each sample.
+        transform : callable, optional (default is None)
+            Batch transform (see the transforms module) to be applied to each
+            batch. Runs in a separate worker thread.
+        """
+        cols = self._common_cols()
+        samples = self.iterate(split_name,
+                               split,
+                               num_samples=num_samples,
+                               shuffle=shuffle,
+                               return_source=True)
+
+        def make_batch(batch):
+            data = collate([sample for _, sample in batch], cols)
+            if transform is not None:
+                data = transform(data)
+            if return_tuple:
+                data = tuple(data[col] for col in cols)
+            if return_source:
+                return np.array([dataset_id for dataset_id, _ in batch]), data
+            return data
+
+        yield from prefetch_map(make_batch,
+                                chunks(samples, batch_size, drop_last),
+                                num_workers=0 if transform is None else 1)
+
+    def get_batch(self, indices, return_tuple=False, transform=None):
+        """
+        Load the given samples (indexing the concatenation of all datasets)
+        and collate them into a batch.
+
+        Parameters
+        ----------
+        indices : list of ints
+            Indices of the samples forming the batch.
+        return_tuple : bool, optional (default is False)
+            If True return the columns as a tuple ordered as selected instead
+            of a dict.
+        transform : callable, optional (default is None)
+            Batch transform (see the transforms module) to be applied to the
+            collated batch.
+        """
+        cols = self._common_cols()
+        batch = collate([self[i] for i in indices], cols)
+        if transform is not None:
+            batch = transform(batch)
+        if return_tuple:
+            return tuple(batch[col] for col in cols)
+        return batch
+
+    def _common_cols(self):
+        """
+        The column selection shared by all datasets.
+        """
+        cols = self._datasets[0]._selected_cols
+        for dataset in self._datasets[1:]:
+            if dataset._selected_cols != cols:
+                raise Exception("Batching requires all datasets to have the "
+                                "same columns selected!")
+        return cols
+
+    def _index_lists(self, split_name, split):
+        """
+        Sample indices of the selected subset of each dataset.
+        """
+        if split_name is None or isinstance(split_name, str):
+            split_name = [split_name] * len(self._datasets)
+        index_lists = []
+        for dataset, name in zip(self._datasets, split_name):
+            if split is not None and name is None:
+                name = dataset._cur_split
+            index_lists.append(dataset._index_list(name, split))
+        return index_lists
+
+    def _sampler(self, index_list, shuffle):
+        """
+        Endless stream of sample indices of one dataset.
+        """
+        index_list = np.asarray(index_list)
+        while True:
+            if shuffle:
+                index_list = self._rng.permutation(index_list)
+            yield from index_list
+
+    def _readahead(self, dataset_id, sampler):
+        """
+        Pass on a stream of sample indices of one dataset, issuing read-ahead
+        hints for the files of the next window of samples.
+        """
+        dataset = self._datasets[dataset_id]
+        window = self._prefetch[dataset_id]
+        current = [next(sampler) for _ in range(window)]
+        while True:
+            upcoming = [next(sampler) for _ in range(window)]
+            readahead([
+                filename for index in upcoming
+                for filename in dataset.sample_files(index)
+            ])
+            yield from current
+            current = upcoming
+
+    def _load(self, dataset_id, index, return_tuple, transform=None):
+        """
+        Load a single sample of the given dataset (run in worker threads).
+        """
+        dataset = self._datasets[dataset_id]
+        sample = dataset[index]
+        if transform is not None:
+            sample = apply_to_sample(transform, sample)
+        if return_tuple:
+            return tuple(sample[col] for col in dataset._selected_cols)
+        return sample
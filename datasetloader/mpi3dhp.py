@@ -134,34 +134,49 @@ class MPI3DHP(DatasetLoader):
         """
         data = {}
         sample_data = loadmat(filename)
-        if "keypoints2D" in self._selected_cols:
-            data["keypoints2D"] = np.array([
-                sample_data["annot2"][i, 0][:num_frames].reshape(
-                    sample_data["annot2"][i, 0].shape[0], -1, 2)
+        fields = (("keypoints2D", "annot2", 2), ("keypoints3D", "annot3", 3),
+                  ("keypoints3D-normalised", "univ_annot3", 3))
+        for col, field, num_channels in fields:
+            if col not in self._selected_cols:
+                continue
+            cameras = [
+                sample_data[field][i, 0][:num_frames]
                 for i in self._camera_selection
-            ])
-        if "keypoints3D" in self._selected_cols:
-            data["keypoints3D"] = []
-            for i in self._camera_selection:
-                keypoints = sample_data["annot3"][i, 0][:num_frames].reshape(
-                    sample_data["annot3"][i, 0].shape[0], -1, 3)
+            ]
+            # write all cameras into one preallocated array instead of
+            # stacking a list of per camera arrays
+            keypoints = np.empty(
+                (len(cameras), cameras[0].shape[0],
+                 cameras[0].shape[1] // num_channels, num_channels),
+                dtype=cameras[0].dtype)
+            sign = np.ones(num_channels)
+            if num_channels == 3:
                 # For some reason keypoints are upside down by default
-                keypoints[:, :, 1] *= -1
-                data["keypoints3D"].append(keypoints)
-            data["keypoints3D"] = np.array(data["keypoints3D"])
-        if "keypoints3D-normalised" in self._selected_cols:
-            data["keypoints3D-normalised"] = []
-            for i in self._camera_selection:
-                keypoints = sample_data["univ_annot3"][
-                    i, 0][:num_frames].reshape(
-                        sample_data["univ_annot3"][i, 0].shape[0], -1, 3)
-                # For some reason keypoints are upside down by default
-                keypoints[:, :, 1] *= -1
-                data["keypoints3D-normalised"].append(keypoints)
-            data["keypoints3D-normalised"] = np.array(
-                data["keypoints3D-normalised"])
+                sign[1] = -1
+            for camera, camera_keypoints in zip(keypoints, cameras):
+                np.multiply(camera_keypoints.reshape(camera.shape),
+                            sign,
+                            out=camera)
+            data[col] = keypoints
         return data
 
+    def _validate_sample(self, index):
+        """
+        Check that the keypoint file and the video files of the selected
+        cameras exist before loading the sample.
+        """
+        filenames = [self._data["keypoint-filename"][index]] + [
+            self._data["video-filenames"][index][i]
+            for i in self._camera_selection
+        ]
+        missing = [
+            filename for filename in filenames
+            if not os.path.exists(filename)
+        ]
+        if len(missing) > 0:
+            return "Missing files: " + ", ".join(missing)
+        return super()._validate_sample(index)
+
     def __getitem__(self, index):
         """
         Indexing access to the dataset.
@@ -1,6 +1,5 @@
 import os.path
 import numpy as np
-from tqdm import tqdm
 from scipy.io import loadmat, matlab
 
 from .datasetloader import DatasetLoader
@@ -60,14 +59,24 @@ class MPII(DatasetLoader):
         kwargs["no_lazy_loading"] = True
         super().__init__(**kwargs)
 
-        print("Loading the data file. This may take a while...")
         self._length = 0
-        raw_data = loadmat(os.path.join(data_path,
-                                        "mpii_human_pose_v1_u12_1.mat"),
-                           struct_as_record=False,
-                           squeeze_me=True)
+        annotation_file = os.path.join(data_path,
+                                       "mpii_human_pose_v1_u12_1.mat")
+        with self._progress.phase("read annotations", 1) as phase:
+            raw_data = loadmat(annotation_file,
+                               struct_as_record=False,
+                               squeeze_me=True)
+            phase.update(bytes_read=os.path.getsize(annotation_file))
+        with self._progress.phase("parse annotations",
+                                  len(raw_data["RELEASE"].img_train)) as phase:
+            self._parse_annotations(data_path, raw_data, single_person, phase)
+
+    def _parse_annotations(self, data_path, raw_data, single_person, phase):
+        """
+        Fill the data columns from the contents of the annotation file.
+        """
         for img_id, is_training in enumerate(
-                tqdm(raw_data["RELEASE"].img_train)):
+                phase.iterate(raw_data["RELEASE"].img_train)):
             if single_person:
                 # single_person ids are 1-indexed, arrays are 0-indexed
                 # => need to subtract one
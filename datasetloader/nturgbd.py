@@ -10,6 +10,47 @@ import numpy as np
 from .datasetloader import DatasetLoader
 from .subsetmixin import SubsetMixin
 
+# Columns of the per joint records of the skeleton files: the fields of a
+# record (x,y,z,depth_x,depth_y,rgb_x,rgb_y,orientation_w,orientation_x,
+# orientation_y,orientation_z,tracking_state) and the dtype of the column
+JOINT_COLS = {
+    "keypoints3D": (slice(0, 3), np.float64),
+    "keypoints2D": (slice(5, 7), np.float64),
+    "keypoints_depth": (slice(3, 5), np.float64),
+    "joint_orientation": (slice(7, 11), np.float64),
+    "joint_tracking_state": (11, np.int8),
+}
+# Keypoint columns returned as a list by load_keypointfile without cols, in
+# the order of the list
+KEYPOINT_COLS = ("keypoints3D", "keypoints2D", "keypoints_depth")
+# Columns of the per body info of the skeleton files: the fields of the info
+# after the body ID (None for the ID itself) and the dtype of the column
+BODY_COLS = {
+    "body_id": (None, np.int64),
+    "clipped_edges": (0, np.int8),
+    "hand_left_confidence": (1, np.int8),
+    "hand_left_state": (2, np.int8),
+    "hand_right_confidence": (3, np.int8),
+    "hand_right_state": (4, np.int8),
+    "is_restricted": (5, np.int8),
+    "lean": (slice(6, 8), np.float64),
+    "body_tracking_state": (8, np.int8),
+}
+# Columns decoded from the SsssCcccPpppRrrrAaaa sample names: the position of
+# their three digits in the name
+FILENAME_COLS = {
+    "setup": 1,
+    "camera": 5,
+    "performer": 9,
+    "replication": 13,
+    "action": 17,
+}
+# Ids of the training set of the cross-subject split (compared with the setup
+# id of the samples)
+TRAINING_SUBJECTS = [
+    1, 2, 4, 5, 8, 9, 13, 14, 15, 16, 17, 18, 19, 25, 27, 28, 31, 34, 35, 38
+]
+
 
 class NTURGBD(SubsetMixin, DatasetLoader):
     """
@@ -71,7 +112,7 @@ class NTURGBD(SubsetMixin, DatasetLoader):
         "right foot", "shoulder centre", "left handtip", "left thumb",
         "right handtip", "right thumb"
     ]
-    splits = ["cross-subject", "cross-view"]
+    splits = ["cross-subject", "cross-view", "cross-setup"]
 
     @classmethod
     def add_argparse_args(cls, parser, default_split=None):
@@ -87,14 +128,19 @@ class NTURGBD(SubsetMixin, DatasetLoader):
             "--include_missing_skeletons",
             action="store_true",
             help="Also include the samples with missing skeletons")
+        child_parser.add_argument(
+            "--num_actors",
+            type=int,
+            help="Track bodies by their ID and return the given number of "
+            "actors with the most motion as float32 arrays of fixed size")
         return parser
 
-    def __init__(
-            self,
-            data_path,
-            ntu120=False,
-            include_missing_skeletons=False,
-            **kwargs):
+    def __init__(self,
+                 data_path,
+                 ntu120=False,
+                 include_missing_skeletons=False,
+                 num_actors=None,
+                 **kwargs):
         """
         Parameters
         ----------
@@ -104,20 +150,33 @@ class NTURGBD(SubsetMixin, DatasetLoader):
             Load all 120 instead of first 60 classes of NTU RGB+D
         include_missing_skeletons : bool, optional (default is False)
             If True also include all samples that have missing skeletons
+        num_actors : int, optional (default is None)
+            If given, bodies are tracked through the sequence by their body
+            ID and the num_actors bodies with the most motion are returned,
+            ordered by their motion, as float32 arrays of the fixed size
+            (num_actors, num_frames, ...). By default bodies are numbered by
+            their order within each frame.
         """
         self._data_cols = [
             "keypoint-filename",
-            "keypoints3D",
-            "keypoints2D",
-            "keypoints_depth",
+        ] + list(JOINT_COLS) + list(BODY_COLS) + [
+            "presence",
             "action",
+            "setup",
+            "camera",
+            "performer",
+            "replication",
             # The dataset also contains these, to be implemented if/when needed
             # "video-filename",
             # "depth-filenames",
         ]
         self._data = {
             "keypoint-filename": [],
-            "action": []
+            "action": [],
+            "setup": [],
+            "camera": [],
+            "performer": [],
+            "replication": []
             # The dataset also contains these, to be implemented if/when needed
             # "video-filename": [],
             # "depth-filenames": [],
@@ -133,10 +192,19 @@ class NTURGBD(SubsetMixin, DatasetLoader):
             for split in NTURGBD.splits
         }
 
-        self._length = 0
+        self._ntu120 = ntu120
+        self._num_actors = num_actors
+        self._select_actions = kwargs["select_actions"]
+        # the (possibly re-indexed) id of every action, -1 for actions which
+        # are not selected
+        self._action_ids = np.array([
+            -1 if action_id is None else action_id for action_id in (
+                self.select_action(action_id, self._select_actions)
+                for action_id in range(len(NTURGBD.actions)))
+        ])
 
         # Load list of of samples to ignore
-        missing_skeletons = []
+        missing_skeletons = set()
         if not include_missing_skeletons:
             filenames = ["NTU_RGBD_samples_with_missing_skeletons.txt"]
             if ntu120:
@@ -147,35 +215,11 @@ class NTURGBD(SubsetMixin, DatasetLoader):
                     for i in range(3):
                         f.readline()
                     for line in f:
-                        missing_skeletons.append(line.strip())
-
-        skeleton_dir = os.path.join(data_path, "nturgb+d_skeletons")
-        for filename in os.listdir(skeleton_dir):
-            subject_id = int(filename[1:4])
-            if ntu120 or subject_id <= 17:
-                if filename[:-9] in missing_skeletons:
-                    continue
-
-                action_id = int(filename[17:20]) - 1
-                action_id = self.select_action(action_id,
-                                               kwargs["select_actions"])
-                if action_id is None:
-                    continue
-
-                self._data["keypoint-filename"].append(
-                    os.path.join(skeleton_dir, filename))
-                self._data["action"].append(action_id)
-                if subject_id in (1, 2, 4, 5, 8, 9, 13, 14, 15, 16, 17, 18, 19,
-                                  25, 27, 28, 31, 34, 35, 38):
-                    self._splits["cross-subject"]["train"].append(self._length)
-                else:
-                    self._splits["cross-subject"]["test"].append(self._length)
-                camera_id = int(filename[5:8])
-                if camera_id != 1:
-                    self._splits["cross-view"]["train"].append(self._length)
-                else:
-                    self._splits["cross-view"]["train"].append(self._length)
-                self._length += 1
+                        missing_skeletons.add(line.strip())
+        self._missing_skeletons = missing_skeletons
+
+        self._skeleton_dir = os.path.join(data_path, "nturgb+d_skeletons")
+        self._scan_samples()
 
         # If ntu120 is not selected only keep the list of the first 60 actions
         if not ntu120:
@@ -183,9 +227,220 @@ class NTURGBD(SubsetMixin, DatasetLoader):
 
         super().__init__(**kwargs)
 
-    def load_keypointfile(self, filename):
+    def _sample_dirs(self):
+        return [self._skeleton_dir]
+
+    def _sample_entry(self, directory, filename):
+        """
+        Describe the sample stored in the given skeleton file.
+        """
+        return self._sample_entries(directory, [filename])[0]
+
+    def _sample_entries(self, directory, filenames):
+        """
+        Describe the samples stored in the given skeleton files.
+
+        The metadata of all files is decoded from their names at once.
+        """
+        entries = [None] * len(filenames)
+        if len(filenames) == 0:
+            return entries
+        names = np.array(filenames)
+        candidates = np.flatnonzero((np.char.str_len(names) == 29)
+                                    & np.char.endswith(names, ".skeleton"))
+        codes = names[candidates].astype("U29").view(np.uint32).reshape(-1, 29)
+        positions = np.array(list(FILENAME_COLS.values()))
+        digits = codes[:, positions[:, None] + np.arange(3)] - ord("0")
+        is_name = (np.all(codes[:, positions - 1] == [ord(c) for c in "SCPRA"],
+                          axis=1)
+                   & np.all(digits <= 9, axis=(1, 2)))
+        values = digits.astype(np.int64) @ [100, 10, 1]
+        setup = values[:, 0]
+        action = values[:, 4] - 1
+        in_range = (action >= 0) & (action < len(self._action_ids))
+        action_ids = np.where(in_range,
+                              self._action_ids[np.where(in_range, action,
+                                                        0)], -1)
+        selected = is_name & (action_ids >= 0)
+        if not self._ntu120:
+            selected &= setup <= 17
+        selected &= np.array([
+            name[:-9] not in self._missing_skeletons
+            for name in names[candidates].tolist()
+        ])
+
+        values[:, 4] = action_ids
+        # the subsets of a sample in all splits, entries with the same
+        # subsets share the dict
+        # all cameras are in the training set of the cross-view split
+        in_train = np.stack([
+            np.isin(setup, TRAINING_SUBJECTS),
+            np.ones(len(setup), dtype=bool), setup % 2 == 0
+        ],
+                            axis=1)
+        split_codes = in_train @ (2**np.arange(len(NTURGBD.splits)))
+        split_dicts = [{
+            split_name: "train" if code & 2**i else "test"
+            for i, split_name in enumerate(NTURGBD.splits)
+        } for code in range(2**len(NTURGBD.splits))]
+        prefix = os.path.join(directory, "")
+        # one list per column rather than per sample, keeping the number of
+        # allocated containers low
+        for (index, setup_id, camera_id, performer_id, replication_id,
+             action_id, split_code) in zip(candidates[selected].tolist(),
+                                           *values[selected].T.tolist(),
+                                           split_codes[selected].tolist()):
+            entries[index] = ({
+                "keypoint-filename": prefix + filenames[index],
+                "action": action_id,
+                "setup": setup_id,
+                "camera": camera_id,
+                "performer": performer_id,
+                "replication": replication_id
+            }, split_dicts[split_code])
+        return entries
+
+    def sample_indices(self, **values):
+        """
+        Indices of the samples with the given metadata, e.g. to build
+        evaluation protocols other than the predefined splits.
+
+        Example: sample_indices(setup=range(2, 33, 2), camera=[2, 3])
+
+        Parameters
+        ----------
+        values : ints or lists of ints
+            Selected values of any of the columns setup, camera, performer,
+            replication and action
+
+        Returns
+        -------
+        list of ints
+            Indices of the samples matching all given values
+        """
+        selected = np.ones(len(self), dtype=bool)
+        for col, col_values in values.items():
+            if col not in FILENAME_COLS:
+                raise KeyError("The samples can't be selected by '" + col +
+                               "'!")
+            selected &= np.isin(np.array(self._data[col]),
+                                np.array(col_values).ravel())
+        return self._exclude_invalid(np.flatnonzero(selected).tolist())
+
+    def _parse_skeletonfile(self, filename, body_info=False):
+        """
+        Parse all joint records (and optionally body info) of a skeleton file
+        at once.
+
+        Only the header lines (bodies per frame, joints per body) are read one
+        by one to decode the structure of the file, the joint records are
+        converted to numbers in a single bulk conversion and addressed
+        through index arrays.
+
+        Returns
+        -------
+        num_frames : int
+            Number of frames of the sequence
+        body_slots : numpy array
+            Position of every body within its frame
+        body_frames : numpy array
+            Frame of every body
+        record_body : numpy array
+            Body of every joint record
+        joint_ids : numpy array
+            Joint id of every joint record
+        records : numpy array
+            All joint records of the file, shape (num_records, 12)
+        body_records : tuple of numpy arrays or None
+            If body_info is True the body IDs, shape (num_bodies,), and the
+            remaining body info, shape (num_bodies, 9)
+        """
+        with open(filename, "r") as skel_file:
+            lines = skel_file.read().split("\n")
+        num_frames = int(lines[0])
+        record_lines = []
+        body_lines = []
+        body_frames = []
+        body_slots = []
+        num_joints = []
+        line_index = 1
+        for frame_id in range(num_frames):
+            body_count = int(lines[line_index])
+            line_index += 1
+            for body_id in range(body_count):
+                # a line of body info followed by the joint count
+                body_lines.append(lines[line_index])
+                joint_count = int(lines[line_index + 1])
+                if joint_count != len(self.landmarks):
+                    self._progress.message("Wrong joint count " +
+                                           str(joint_count) + " in " +
+                                           filename)
+                line_index += 2
+                record_lines.extend(lines[line_index:line_index + joint_count])
+                body_frames.append(frame_id)
+                body_slots.append(body_id)
+                num_joints.append(joint_count)
+                line_index += joint_count
+        if len(record_lines) > 0:
+            records = np.loadtxt(record_lines, dtype=np.float64, ndmin=2)
+        else:
+            records = np.zeros((0, 12))
+        body_records = None
+        if body_info:
+            if len(body_lines) > 0:
+                # body IDs exceed the integers exactly representable as floats
+                body_records = (np.loadtxt(body_lines,
+                                           dtype=np.int64,
+                                           usecols=0,
+                                           ndmin=1),
+                                np.loadtxt(body_lines,
+                                           dtype=np.float64,
+                                           usecols=range(1, 10),
+                                           ndmin=2))
+            else:
+                body_records = (np.zeros(0, dtype=np.int64), np.zeros((0, 9)))
+
+        num_joints = np.array(num_joints, dtype=np.intp)
+        record_body = np.repeat(np.arange(len(num_joints)), num_joints)
+        joint_ids = (np.arange(len(record_body)) -
+                     np.repeat(np.cumsum(num_joints) - num_joints, num_joints))
+        return (num_frames, np.array(body_slots, dtype=np.intp),
+                np.array(body_frames, dtype=np.intp), record_body, joint_ids,
+                records, body_records)
+
+    def _actor_slots(self, body_ids, record_body, joint_ids, records):
         """
-        Load the keypoints sequence from the given file.
+        Slots of the bodies when tracking them through the sequence by their
+        body ID.
+
+        The num_actors actors with the most motion, measured as the sum over
+        all joints and the x, y and z coordinates of the standard deviation
+        of each joint coordinate over time, are assigned to the slots 0 to
+        num_actors - 1 in descending order of motion, the bodies of all
+        other actors to -1.
+        """
+        ids, body_tracks = np.unique(body_ids, return_inverse=True)
+        body_tracks = body_tracks.ravel()
+        num_joints = int(joint_ids.max()) + 1 if len(joint_ids) > 0 else 0
+        # one group per joint of each actor
+        groups = body_tracks[record_body] * num_joints + joint_ids
+        num_groups = len(ids) * num_joints
+        counts = np.maximum(np.bincount(groups, minlength=num_groups), 1)
+        spread = np.zeros(num_groups)
+        for coordinate in range(3):
+            values = records[:, coordinate]
+            mean = np.bincount(groups, values, num_groups) / counts
+            mean_square = np.bincount(groups, values**2, num_groups) / counts
+            spread += np.sqrt(np.maximum(mean_square - mean**2, 0))
+        motion = spread.reshape(len(ids), num_joints).sum(axis=1)
+        actors = np.argsort(-motion, kind="stable")[:self._num_actors]
+        track_slots = np.full(len(ids), -1, dtype=np.intp)
+        track_slots[actors] = np.arange(len(actors))
+        return track_slots[body_tracks]
+
+    def load_keypointfile(self, filename, cols=None):
+        """
+        Load joint and body columns of the sequence in the given file.
 
         For reference, the format of the skeleton-file is:
         num_frames
@@ -202,76 +457,88 @@ class NTURGBD(SubsetMixin, DatasetLoader):
         num_bodies (in frame 1)
         . . .
 
+        The number of bodies can change between frames, joint columns have
+        the shape (num_persons, num_frames, 25, ...) and body columns the
+        shape (num_persons, num_frames, ...). By default bodies are numbered
+        by their order within each frame and num_persons is the maximum
+        number of bodies in any frame. If the dataset was created with
+        num_actors, bodies are tracked by their body ID, num_persons is
+        num_actors (see _actor_slots) and float columns are float32. Persons
+        not present in a frame are all zeros, the presence column marks the
+        present ones.
+
         Parameters
         ----------
         filename : string
             Filename of the file containing a skeleton sequence
+        cols : list of strings, optional (default is None)
+            Columns of JOINT_COLS, BODY_COLS and presence to be loaded. If None
+            the selected KEYPOINT_COLS are loaded and returned as a list, as
+            by earlier versions which only supported these columns.
+
+        Returns
+        -------
+        dict or list
+            The given columns, or the list of the selected KEYPOINT_COLS (in
+            that order) if cols is None
         """
-        with open(filename, "r") as skel_file:
-            data = skel_file.readlines()
-        num_frames = int(data[0][:-1])
-        if "keypoints3D" in self._selected_cols:
-            persons3d = np.zeros((0, num_frames, 25, 3))
-        if "keypoints2D" in self._selected_cols:
-            persons2d = np.zeros((0, num_frames, 25, 2))
-        if "keypoints_depth" in self._selected_cols:
-            persons_depth = np.zeros((0, num_frames, 25, 2))
-        existing_persons = 0
-        data_index = 0
-        for frame_id in range(num_frames):
-            data_index += 1
-            person_count = int(data[data_index][:-1])
-            if existing_persons > 0 and person_count != existing_persons:
-                # print("INCONSISTENT PERSON COUNT", existing_persons,
-                #       person_count)
-                # Why do these occur? What do they mean/do they matter?
-                pass
-            if existing_persons < person_count:
-                add_persons = person_count - existing_persons
-                if "keypoints3D" in self._selected_cols:
-                    persons3d = np.append(persons3d,
-                                          np.zeros((add_persons, num_frames,
-                                                    25, 3)),
-                                          axis=0)
-                if "keypoints2D" in self._selected_cols:
-                    persons2d = np.append(persons2d,
-                                          np.zeros((add_persons, num_frames,
-                                                    25, 2)),
-                                          axis=0)
-                if "keypoints_depth" in self._selected_cols:
-                    persons_depth = np.append(persons_depth,
-                                              np.zeros((add_persons,
-                                                        num_frames, 25, 2)),
-                                              axis=0)
-                existing_persons += add_persons
-            for person_id in range(person_count):
-                data_index += 2
-                num_joints = int(data[data_index][:-1])
-                if num_joints != len(self.landmarks):
-                    print("WRONG JOINT COUNT!", num_joints)
-                for joint_id in range(num_joints):
-                    data_index += 1
-                    jointinfo = data[data_index][:-1].split(' ')
-                    jointinfo = np.array(list(map(float, jointinfo)))
-                    if "keypoints3D" in self._selected_cols:
-                        persons3d[person_id][frame_id,
-                                             joint_id] = jointinfo[:3]
-                    if "keypoints2D" in self._selected_cols:
-                        persons2d[person_id][frame_id,
-                                             joint_id] = jointinfo[5:7]
-                    if "keypoints_depth" in self._selected_cols:
-                        persons_depth[person_id][frame_id,
-                                                 joint_id] = jointinfo[3:5]
-        persons = []
-        if "keypoints3D" in self._selected_cols:
-            if persons3d.shape[0] == 0:
-                print("Empty person array", filename)
-            persons.append(persons3d)
-        if "keypoints2D" in self._selected_cols:
-            persons.append(persons2d)
-        if "keypoints_depth" in self._selected_cols:
-            persons.append(persons_depth)
-        return persons
+        if cols is None:
+            cols = [col for col in KEYPOINT_COLS if col in self._selected_cols]
+            data = self.load_keypointfile(filename, cols)
+            return [data[col] for col in cols]
+        track = self._num_actors is not None
+        body_cols = [col for col in BODY_COLS if col in cols]
+        (num_frames, body_slots, body_frames, record_body, joint_ids, records,
+         body_records) = self._parse_skeletonfile(filename,
+                                                  body_info=track
+                                                  or len(body_cols) > 0)
+        if "keypoints3D" in cols and len(body_slots) == 0:
+            self._progress.message("Empty person array in " + filename)
+        index = (body_slots[record_body], body_frames[record_body], joint_ids)
+        if track:
+            body_slots = self._actor_slots(body_records[0], record_body,
+                                           joint_ids, records)
+            num_persons = self._num_actors
+            # drop the bodies of the actors which aren't returned
+            selected = body_slots >= 0
+            record_selected = selected[record_body]
+            index = (body_slots[record_body][record_selected],
+                     index[1][record_selected], joint_ids[record_selected])
+            records = records[record_selected]
+            body_records = (body_records[0][selected],
+                            body_records[1][selected])
+            body_slots = body_slots[selected]
+            body_frames = body_frames[selected]
+        else:
+            num_persons = body_slots.max() + 1 if len(body_slots) > 0 else 0
+        body_index = (body_slots, body_frames)
+
+        data = {}
+        for col, (fields, dtype) in JOINT_COLS.items():
+            if col in cols:
+                if track and dtype == np.float64:
+                    dtype = np.float32
+                values = records[:, fields]
+                data[col] = np.zeros(
+                    (num_persons, num_frames, len(self.landmarks)) +
+                    values.shape[1:],
+                    dtype=dtype)
+                data[col][index] = values
+        for col in body_cols:
+            fields, dtype = BODY_COLS[col]
+            if track and dtype == np.float64:
+                dtype = np.float32
+            if fields is None:
+                values = body_records[0]
+            else:
+                values = body_records[1][:, fields]
+            data[col] = np.zeros((num_persons, num_frames) + values.shape[1:],
+                                 dtype=dtype)
+            data[col][body_index] = values
+        if "presence" in cols:
+            data["presence"] = np.zeros((num_persons, num_frames), dtype=bool)
+            data["presence"][body_index] = True
+        return data
 
     def __getitem__(self, index):
         """
@@ -283,16 +550,10 @@ class NTURGBD(SubsetMixin, DatasetLoader):
         data = super().__getitem__(index)
         # super() provides all non-lazy access, only need to do more for data
         # that hasn't been loaded previously
-        if len(self._selected_cols - data.keys()) > 0:
-            if ("keypoints3D" in self._selected_cols
-                    or "keypoints2D" in self._selected_cols
-                    or "keypoints_depth" in self._selected_cols):
-                keypoints = self.load_keypointfile(
-                    self._data["keypoint-filename"][index])
-                if "keypoints_depth" in self._selected_cols:
-                    data["keypoints_depth"] = keypoints.pop()
-                if "keypoints2D" in self._selected_cols:
-                    data["keypoints2D"] = keypoints.pop()
-                if "keypoints3D" in self._selected_cols:
-                    data["keypoints3D"] = keypoints.pop()
+        missing_cols = self._selected_cols - data.keys()
+        if len(missing_cols) > 0:
+            # all skeleton columns come from a single parse of the file
+            data.update(
+                self.load_keypointfile(self._data["keypoint-filename"][index],
+                                       missing_cols))
         return data
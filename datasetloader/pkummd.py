@@ -1,7 +1,50 @@
 import os
+import threading
+from collections import OrderedDict
+
 import numpy as np
 
 from .datasetloader import DatasetLoader
+from .prefetch import prefetch_map
+from .validity import check_sample
+from .views import readonly
+
+# Number of parsed sequences kept in memory in segment mode
+SEQUENCE_CACHE_SIZE = 8
+# Number of threads parsing the label files at construction
+LABEL_WORKERS = 8
+
+
+def _parse_labelfile(filename):
+    """
+    Parse a label file into an array of rows of action id (zero-based),
+    start frame and end frame, sorted by start frame.
+    """
+    with open(filename, "r") as f:
+        lines = [line for line in f.read().splitlines() if line.strip()]
+    if len(lines) == 0:
+        return np.empty((0, 3), dtype=np.int64)
+    labels = np.loadtxt(lines,
+                        delimiter=",",
+                        dtype=np.int64,
+                        usecols=(0, 1, 2),
+                        ndmin=2)
+    # Action class ids are one-based in the file
+    labels[:, 0] -= 1
+    # Correct occasional order errors in the label file
+    labels[:, 1:] = np.sort(labels[:, 1:], axis=1)
+    return labels[np.argsort(labels[:, 1], kind="stable")]
+
+
+def _remap(ids, action_id):
+    """
+    Look up action ids in the given remap, None for ids outside of the
+    remapped set if a single id is given.
+    """
+    remapped = ids[action_id]
+    if np.ndim(remapped) == 0:
+        return None if remapped < 0 else int(remapped)
+    return remapped
 
 
 class PKUMMD(DatasetLoader):
@@ -46,6 +89,12 @@ class PKUMMD(DatasetLoader):
         "right handtip", "right thumb"
     ]
     splits = ["cross-subject", "cross-view"]
+    # action id remaps (-1 for actions not in the respective set)
+    _interaction_mask = np.isin(actions, interactions)
+    _single_action_ids = np.where(_interaction_mask, -1,
+                                  np.cumsum(~_interaction_mask) - 1)
+    _interaction_ids = np.where(_interaction_mask,
+                                np.cumsum(_interaction_mask) - 1, -1)
 
     @classmethod
     def add_argparse_args(cls, parser, default_split=None):
@@ -60,12 +109,18 @@ class PKUMMD(DatasetLoader):
             action="store_true",
             help="If given missing skeletons are returned as an empty list "
             "instead of a zero vector in skeleton shape")
+        child_parser.add_argument(
+            "--segments",
+            action="store_true",
+            help="Each labelled action interval is a sample of its own "
+            "instead of each full sequence")
         return parser
 
     def __init__(self,
                  data_path,
                  single_person=False,
                  exclude_missing=False,
+                 segments=False,
                  **kwargs):
         """
         Parameters
@@ -80,6 +135,12 @@ class PKUMMD(DatasetLoader):
             If False missing skeletons are returned as zero-vectors of the same
             shape as a skeleton. If True missing skeletons are returned as an
             empty list.
+        segments : bool, optional (default is False)
+            If True each labelled action interval of a sequence is a sample,
+            with its own 'action' and 'segment' (first and last frame)
+            columns and belonging to the split of its sequence. The keypoints
+            of a segment are read-only views into its parsed sequence, which
+            is cached and shared by all segments of the sequence.
         """
         self._data_cols = [
             "video-filename",
@@ -112,45 +173,56 @@ class PKUMMD(DatasetLoader):
 
         self._single_person = single_person
         self._exclude_missing = exclude_missing
+        self._segments = segments
 
-        self._length = 0
-        filename_list = []
+        # parse all label files into one table of label rows, see _labels
+        label_dir = os.path.join(data_path, "Label")
+        filename_list = sorted(filename[:-4]
+                               for filename in os.listdir(label_dir))
+        with self._progress.phase("labels", len(filename_list)) as phase:
+            labels = list(
+                phase.iterate(
+                    prefetch_map(_parse_labelfile, [
+                        os.path.join(label_dir, filename + ".txt")
+                        for filename in filename_list
+                    ], LABEL_WORKERS)))
+        num_labels = np.array([len(rows) for rows in labels], dtype=np.int64)
+        sequence_ids = np.repeat(np.arange(len(filename_list)), num_labels)
+        labels = np.concatenate([np.empty((0, 3), dtype=np.int64)] + labels)
+        keep = np.ones(len(filename_list), dtype=bool)
         if single_person:
-            interaction_ids = set([
-                PKUMMD.actions.index(interaction)
-                for interaction in PKUMMD.interactions
-            ])
-        filelist = sorted(os.listdir(os.path.join(data_path, "Label")))
-        for filename in filelist:
-            filename = filename[:-4]
-
             # the label files are the easiest ones, use these to check at init
             # time which of the sequences are single person if the dataset is
-            # to be restricted to single person
-            if single_person:
-                with open(os.path.join(data_path, "Label", filename + ".txt"),
-                          "r") as f:
-                    action_ids = []
-                    for l in f:
-                        # Action class ids are one-based in the file
-                        action_ids.append(int(l[:l.find(",")]) - 1)
-                    if len(interaction_ids.intersection(action_ids)) == len(
-                            set(action_ids)):
-                        # this is a sequence with 2 persons, skip
-                        # TODO: This misses a few sequences which have data for
-                        # two skeletons. Are thos true single person with extra
-                        # skeleton or true two person sequences?
-                        # TODO: action 17 and 20 occasionally occur as actions
-                        # in single person sequences, should maybe fix that
-                        continue
-
-            # store short filename for easier identification for split info
-            filename_list.append(filename)
+            # to be restricted to single person: sequences with nothing but
+            # interactions have 2 persons
+            # TODO: This misses a few sequences which have data for two
+            # skeletons. Are thos true single person with extra skeleton or
+            # true two person sequences?
+            # TODO: action 17 and 20 occasionally occur as actions in single
+            # person sequences, should maybe fix that
+            keep = np.bincount(sequence_ids,
+                               weights=~PKUMMD._interaction_mask[labels[:, 0]],
+                               minlength=len(filename_list)) > 0
+        kept_ids = np.full(len(filename_list), -1, dtype=np.int64)
+        kept_ids[keep] = np.arange(np.count_nonzero(keep))
+        kept_rows = keep[sequence_ids]
+        # one row per label: sequence (sample index), action, start frame,
+        # end frame; the rows of each sequence are contiguous and sorted by
+        # start frame
+        self._labels = np.column_stack(
+            (kept_ids[sequence_ids[kept_rows]], labels[kept_rows]))
+        label_offsets = np.concatenate(([0], np.cumsum(num_labels[keep])))
+
+        filename_list = [
+            filename for filename, kept in zip(filename_list, keep) if kept
+        ]
+        self._length = len(filename_list)
+        for filename in filename_list:
             self._data["keypoint-filename"].append(
                 os.path.join(data_path, "Data", "SKELETON_VIDEO",
                              filename + ".txt"))
             self._data["action-filename"].append(
-                os.path.join(data_path, "Label", filename + ".txt"))
+                os.path.join(label_dir, filename + ".txt"))
             self._data["video-filename"].append(
                 os.path.join(data_path, "Data", "RGB_VIDEO",
                              filename + ".avi"))
@@ -160,62 +232,99 @@ class PKUMMD(DatasetLoader):
             # self._data["depth-filenames"].append(
             #     os.path.join(data_path, "Data", "DEPTH_VIDEO",
             #                  filename + "-depth.avi"))
-            self._length += 1
+        self._data["actions"] = [
+            self._labels[label_offsets[i]:label_offsets[i + 1], 1:]
+            for i in range(self._length)
+        ]
 
         # Load splits information
+        sequence_index = {
+            filename: i
+            for i, filename in enumerate(filename_list)
+        }
         for split in self._splits.keys():
             with open(os.path.join(data_path, "Split", split + ".txt"),
                       "r") as f:
                 f.readline()  # Dump the "Training videos:" headline
                 line = f.readline()
                 trainingset = line[:line.rfind(",")].split(", ")
-                for filename in trainingset:
-                    for i, sample_file in enumerate(filename_list):
-                        if filename == sample_file:
-                            self._splits[split]["train"].append(i)
-                            break
                 f.readline()  # Dump the "Validation videos:" headline
                 line = f.readline()
                 testset = line[:line.rfind(",")].split(", ")
-                for filename in testset:
-                    for i, sample_file in enumerate(filename_list):
-                        if filename == sample_file:
-                            self._splits[split]["test"].append(i)
-                            break
+            for subset, filenames in (("train", trainingset), ("test",
+                                                               testset)):
+                self._splits[split][subset] = [
+                    sequence_index[filename] for filename in filenames
+                    if filename in sequence_index
+                ]
+
+        if segments:
+            self._split_segments()
 
         super().__init__(**kwargs)
 
+    def _split_segments(self):
+        """
+        Turn the samples of full sequences into one sample per labelled
+        action interval.
+        """
+        sequence_ids = self._labels[:, 0]
+        for col in ("keypoint-filename", "action-filename", "video-filename"):
+            self._data[col] = [self._data[col][i] for i in sequence_ids]
+        self._data["action"] = self._labels[:, 1]
+        self._data["segment"] = self._labels[:, 2:]
+        del self._data["actions"]
+        self._data_cols.remove("actions")
+        self._data_cols.extend(("action", "segment"))
+        self._length = len(sequence_ids)
+        # segments belong to the split of their sequence
+        for split in self._splits.values():
+            for subset, indices in split.items():
+                split[subset] = np.flatnonzero(np.isin(sequence_ids,
+                                                       indices)).tolist()
+        self._sequence_cache = _SequenceCache(SEQUENCE_CACHE_SIZE)
+
     def get_single_action_id(self, action_id):
         """
         Remaps the label action id into a set of purely single person actions
         for pure single person tasks.
+
+        Returns None for an interaction. Arrays of action ids are remapped
+        at once, with interactions mapped to -1.
         """
-        if not hasattr(self, "_single_action_ids"):
-            counter = 0
-            self._single_action_ids = []
-            for ac in self.actions:
-                if ac in self.interactions:
-                    self._single_action_ids.append(None)
-                else:
-                    self._single_action_ids.append(counter)
-                    counter += 1
-        return self._single_action_ids[action_id]
+        return _remap(PKUMMD._single_action_ids, action_id)
 
     def get_interaction_id(self, action_id):
         """
         Remaps the label action_ids into a set of purely interaction for pure
         interaction tasks.
+
+        Returns None for a single person action. Arrays of action ids are
+        remapped at once, with single person actions mapped to -1.
         """
-        if not hasattr(self, "_interaction_ids"):
-            counter = 0
-            self._interaction_ids = []
-            for ac in self.actions:
-                if ac in self.interactions:
-                    self._interaction_ids.append(counter)
-                    counter += 1
-                else:
-                    self._interaction_ids.append(None)
-        return self._interaction_ids[action_id]
+        return _remap(PKUMMD._interaction_ids, action_id)
+
+    def sample_indices(self, actions):
+        """
+        Indices of the samples containing any of the given actions (in
+        segment mode the segments of one of the given actions).
+
+        Parameters
+        ----------
+        actions : int or list of ints
+            Action ids to select
+
+        Returns
+        -------
+        list of ints
+            Indices of the selected samples
+        """
+        rows = np.isin(self._labels[:, 1], np.array(actions).ravel())
+        if self._segments:
+            selected = np.flatnonzero(rows)
+        else:
+            selected = np.unique(self._labels[rows, 0])
+        return self._exclude_invalid(selected.tolist())
 
     def load_keypointfile(self, filename):
         """
@@ -230,30 +339,32 @@ class PKUMMD(DatasetLoader):
         filename : string
             Filename of the file containing a skeleton sequence
         """
-        with open(filename, "r") as f:
-            keypoints = []
-            for l in f:
-                raw_kp = np.array(list(map(float, l.strip().split(" "))))
-                frame = []
-                if self._single_person:
-                    num_people = 0
-                for i in range(2):
-                    # single person videos are zero buffered, and sometimes
-                    # there are no skeletons at all in a frame
-                    has_data = np.count_nonzero(
-                        raw_kp[i * 75:(i + 1) * 75]) > 0
-                    if not self._exclude_missing or has_data:
-                        frame.append(raw_kp[i * 75:(i + 1) * 75].reshape(
-                            25, 3))
-                        if self._single_person and has_data:
-                            num_people += 1
-                if self._single_person:
-                    if num_people > 1:
-                        return None
-                    elif not self._exclude_missing:
-                        frame = frame[0]
-                keypoints.append(np.array(frame))
-        return np.array(keypoints)
+        # the whole file as one block of rows of 2 persons x 25 joints x 3
+        # coordinates, persons are views into it
+        keypoints = np.loadtxt(filename, dtype=np.float64,
+                               ndmin=2).reshape(-1, 2, 25, 3)
+        # single person videos are zero buffered, and sometimes there are no
+        # skeletons at all in a frame
+        has_data = np.any(keypoints != 0, axis=(2, 3))
+        persons_per_frame = np.count_nonzero(has_data, axis=1)
+        if self._single_person and np.any(persons_per_frame > 1):
+            return None
+        if not self._exclude_missing:
+            if self._single_person:
+                return keypoints[:, 0]
+            return keypoints
+        # all skeletons with data, in frame order
+        skeletons = keypoints[has_data]
+        if len(keypoints) == 0 or np.all(
+                persons_per_frame == persons_per_frame[0]):
+            num_persons = persons_per_frame[0] if len(keypoints) > 0 else 0
+            return skeletons.reshape((len(keypoints), num_persons, 25, 3))
+        # differing numbers of persons, one view per frame
+        ragged = np.empty(len(keypoints), dtype=object)
+        offsets = np.concatenate(([0], np.cumsum(persons_per_frame)))
+        for i in range(len(keypoints)):
+            ragged[i] = skeletons[offsets[i]:offsets[i + 1]]
+        return ragged
 
     def load_actionfile(self, filename):
         """
@@ -264,19 +375,38 @@ class PKUMMD(DatasetLoader):
         filename : string
             Filename of the file containing the action data.
         """
-        with open(filename, "r") as f:
-            actions = []
-            for l in f:
-                action_data = list(map(int, l.split(",")[0:3]))
-                # Action class ids are one-based in the file
-                action_data[0] -= 1
-                # Correct occasional order errors in the label file
-                if action_data[1] > action_data[2]:
-                    action_data[1], action_data[2] = (action_data[2],
-                                                      action_data[1])
-                actions.append(action_data)
-        actions.sort(key=lambda t: t[1])
-        return actions
+        return _parse_labelfile(filename).tolist()
+
+    def load_segment(self, index):
+        """
+        Load the keypoints of the segment with the given index (in segment
+        mode), a read-only view of the frames of the segment (first to last
+        frame, inclusive) of its sequence. The parsed sequence is cached and
+        shared by all its segments.
+
+        Parameters
+        ----------
+        index : int
+            Index of the segment.
+        """
+        keypoints = self._sequence_cache.get(
+            self._data["keypoint-filename"][index], self.load_keypointfile)
+        if keypoints is None:
+            return None
+        start, end = self._data["segment"][index]
+        return readonly(keypoints[start:end + 1])
+
+    def _validate_sample(self, index):
+        """
+        Check a single sample, loading the currently selected columns.
+        """
+        none_messages = None
+        if self._single_person:
+            none_messages = {
+                "keypoints3D":
+                "More than one person in at least one frame (single_person)"
+            }
+        return check_sample(self, index, none_messages)
 
     def __getitem__(self, index):
         """
@@ -290,9 +420,35 @@ class PKUMMD(DatasetLoader):
         # that hasn't been loaded previously
         if len(self._selected_cols - data.keys()) > 0:
             if "keypoints3D" in self._selected_cols:
-                data["keypoints3D"] = self.load_keypointfile(
-                    self._data["keypoint-filename"][index])
-            if "actions" in self._selected_cols:
-                data["actions"] = self.load_actionfile(
-                    self._data["action-filename"][index])
+                if self._segments:
+                    data["keypoints3D"] = self.load_segment(index)
+                else:
+                    data["keypoints3D"] = self.load_keypointfile(
+                        self._data["keypoint-filename"][index])
         return data
+
+
+class _SequenceCache:
+    """
+    Thread safe cache of the most recently used parsed sequences. Each
+    sequence is parsed only once, concurrent requests for a sequence being
+    parsed wait for the result.
+    """
+    def __init__(self, size):
+        self._size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, filename, load):
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is None:
+                entry = self._entries[filename] = [threading.Lock(), None]
+                while len(self._entries) > self._size:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(filename)
+        with entry[0]:
+            if entry[1] is None:
+                entry[1] = (load(filename), )
+        return entry[1][0]
@@ -0,0 +1,297 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Amount of data of each file the OS is asked to read ahead
+READAHEAD_BYTES = 16 * 1024 * 1024
+# Used to warm the page cache where posix_fadvise is not available
+_readahead_executor = None
+_readahead_lock = threading.Lock()
+
+
+def prefetch_map(func,
+                 items,
+                 num_workers=0,
+                 window=None,
+                 executor=None,
+                 files=None):
+    """
+    Apply func to all items using worker threads, yielding results in order.
+
+    Parameters
+    ----------
+    func : callable
+        Function to be applied to every item.
+    items : iterable
+        Items to be processed.
+    num_workers : int, optional (default is 0)
+        Number of worker threads. If 0 and no executor is given everything is
+        processed in the calling thread.
+    window : int, optional (default is None)
+        Maximum number of items in flight at any time. Defaults to twice the
+        number of workers.
+    executor : concurrent.futures.Executor, optional (default is None)
+        If given use this executor instead of creating a new thread pool.
+    files : callable, optional (default is None)
+        Function returning the list of files read when processing an item.
+        If given items are processed in windows: the OS is asked to read
+        ahead the files of the next window while the current one is being
+        consumed and the items of each window are processed in the order of
+        their files on disk (see locality_order). Results are still yielded
+        in the order of the items.
+    """
+    if files is not None:
+        yield from _locality_map(func, items, num_workers, window, executor,
+                                 files)
+        return
+    if executor is None and num_workers == 0:
+        for item in items:
+            yield func(item)
+        return
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(num_workers)
+    if window is None:
+        window = 2 * max(num_workers, 1)
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while len(pending) > 0:
+            yield pending.popleft().result()
+    finally:
+        # Only reached with pending items if the consumer stopped early
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=True)
+
+
+def _locality_map(func, items, num_workers, window, executor, files):
+    """
+    prefetch_map with read-ahead hints and locality ordering, processing the
+    items in windows.
+    """
+    if window is None:
+        window = 2 * max(num_workers, 4)
+    windows = chunks(items, window)
+    if executor is None and num_workers == 0:
+        # hint the next window while processing the current one
+        current = _hint_window(next(windows, None), files)
+        while current is not None:
+            upcoming = _hint_window(next(windows, None), files)
+            results = [None] * len(current[0])
+            for i in current[1]:
+                results[i] = func(current[0][i])
+            yield from results
+            current = upcoming
+        return
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(num_workers)
+    pending = deque()
+    try:
+        for window_items in windows:
+            window_items, order = _hint_window(window_items, files)
+            futures = [None] * len(window_items)
+            for i in order:
+                futures[i] = executor.submit(func, window_items[i])
+            pending.extend(futures)
+            # the next window is only submitted (and hinted) once the current
+            # one is being consumed
+            while len(pending) > window:
+                yield pending.popleft().result()
+        while len(pending) > 0:
+            yield pending.popleft().result()
+    finally:
+        # Only reached with pending items if the consumer stopped early
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=True)
+
+
+def _hint_window(window_items, files):
+    """
+    Issue read-ahead hints for the files of a window of items and determine
+    the order to process them in.
+    """
+    if window_items is None:
+        return None
+    file_lists = [files(item) for item in window_items]
+    keys = readahead(
+        [filename for filenames in file_lists for filename in filenames])
+    return window_items, locality_order(file_lists, keys)
+
+
+def readahead(filenames):
+    """
+    Hint the OS that the given files will be read soon.
+
+    Uses posix_fadvise(WILLNEED) where available, otherwise the beginning of
+    the files is read in a background thread to warm the page cache.
+
+    Parameters
+    ----------
+    filenames : list of strings
+        Files which are going to be read.
+
+    Returns
+    -------
+    dict
+        The locality key of each file, see locality_order.
+    """
+    keys = {}
+    for filename in filenames:
+        if filename in keys:
+            continue
+        try:
+            fd = os.open(filename, os.O_RDONLY)
+        except OSError:
+            keys[filename] = _locality_key(filename, None)
+            continue
+        try:
+            keys[filename] = _locality_key(filename, os.fstat(fd))
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, 0, READAHEAD_BYTES,
+                                 os.POSIX_FADV_WILLNEED)
+            else:
+                _background_read(filename)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+    return keys
+
+
+def locality_order(file_lists, keys=None):
+    """
+    Order of items sorting them by the location of their files on disk.
+
+    Files are sorted by directory and then by device and inode number, which
+    on most file systems approximates the order of the data on disk much
+    better than the order of os.listdir. Items are sorted by their first
+    file, items without files come first in their original order.
+
+    Parameters
+    ----------
+    file_lists : list of lists of strings
+        The files of each item.
+    keys : dict, optional (default is None)
+        Locality keys of the files as returned by readahead. Computed for
+        files missing in it.
+    """
+    if keys is None:
+        keys = {}
+
+    def key(i):
+        if len(file_lists[i]) == 0:
+            return ()
+        filename = file_lists[i][0]
+        if filename not in keys:
+            try:
+                keys[filename] = _locality_key(filename, os.stat(filename))
+            except OSError:
+                keys[filename] = _locality_key(filename, None)
+        return keys[filename]
+
+    return sorted(range(len(file_lists)), key=key)
+
+
+def _locality_key(filename, stat):
+    directory, name = os.path.split(filename)
+    if stat is None:
+        return (directory, -1, -1, name)
+    return (directory, stat.st_dev, stat.st_ino, name)
+
+
+def _background_read(filename):
+    """
+    Read the beginning of a file in a background thread.
+    """
+    global _readahead_executor
+    with _readahead_lock:
+        if _readahead_executor is None:
+            _readahead_executor = ThreadPoolExecutor(1)
+    _readahead_executor.submit(_read_file, filename)
+
+
+def _read_file(filename):
+    try:
+        with open(filename, "rb") as f:
+            f.read(READAHEAD_BYTES)
+    except OSError:
+        pass
+
+
+def collate(samples, cols, return_tuple=False):
+    """
+    Combine a list of samples into a batch.
+
+    Columns for which all samples have the same shape and a numeric type are
+    stacked along a new first axis. Any other column is returned as a 1D
+    object array with one entry per sample.
+
+    Parameters
+    ----------
+    samples : list of dicts
+        Samples as returned by subscripting a DatasetLoader object.
+    cols : list of strings
+        Columns to be collated, in order.
+    return_tuple : bool, optional (default is False)
+        If True return a tuple ordered as cols instead of a dict.
+    """
+    batch = {}
+    for col in cols:
+        values = [sample[col] for sample in samples]
+        batch[col] = _stack(values)
+    if return_tuple:
+        return tuple(batch[col] for col in cols)
+    return batch
+
+
+def _stack(values):
+    """
+    Stack values if they are all numeric of the same shape, otherwise wrap
+    them in an object array.
+    """
+    if len(values) > 0 and all(
+            isinstance(val, (np.ndarray, int, float, np.number))
+            for val in values):
+        arrays = [np.asarray(val) for val in values]
+        if (arrays[0].dtype != object
+                and all(arr.shape == arrays[0].shape and arr.dtype != object
+                        for arr in arrays)):
+            return np.stack(arrays)
+    stacked = np.empty(len(values), dtype=object)
+    for i, val in enumerate(values):
+        stacked[i] = val
+    return stacked
+
+
+def chunks(items, size, drop_last=False):
+    """
+    Split an iterable into lists of the given size.
+
+    Parameters
+    ----------
+    items : iterable
+        Items to be split up.
+    size : int
+        Number of items per chunk.
+    drop_last : bool, optional (default is False)
+        If True drop the last chunk if it is smaller than size.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0 and not drop_last:
+        yield chunk
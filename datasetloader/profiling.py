@@ -0,0 +1,94 @@
+"""
+Measurement of the memory traffic of loading samples.
+
+Loading a sample ideally allocates its data once, copying it from the file
+into the returned arrays. Intermediate copies (lists of per frame arrays
+stacked at the end, arrays grown by appending, rewrapping of arrays) show up
+as memory allocated in addition to the returned data.
+"""
+import tracemalloc
+
+import numpy as np
+
+
+def _nbytes(value):
+    """
+    Number of bytes of the array data in a value of a sample.
+    """
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return sum(_nbytes(part) for part in value.flat)
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(part) for part in value)
+    return 0
+
+
+def memory_profile(dataset_loader, indices, cols=None):
+    """
+    Load the given samples one at a time while tracing memory allocations.
+
+    Parameters
+    ----------
+    dataset_loader : DatasetLoader
+        Dataset to load the samples from.
+    indices : iterable of ints
+        Samples to be loaded.
+    cols : list of strings, optional (default is None)
+        Columns to be loaded, defaults to the currently selected columns.
+
+    Returns
+    -------
+    dict
+        Averages per sample of 'output_bytes' (the data of the returned
+        arrays), 'peak_bytes' (the maximum of memory allocated at once while
+        loading), 'transient_bytes' (peak_bytes beyond the returned data,
+        i.e. intermediate copies) and 'copy_factor' (peak_bytes relative to
+        output_bytes, about 1 if the data is copied from the file only once,
+        close to 0 for views into data held by the dataset), plus the maximum
+        'max_copy_factor' over the samples.
+    """
+    if cols is not None:
+        dataset_loader = dataset_loader._with_cols(cols)
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    output_bytes = []
+    peak_bytes = []
+    try:
+        for index in indices:
+            tracemalloc.clear_traces()
+            sample = dataset_loader[index]
+            _, peak = tracemalloc.get_traced_memory()
+            output_bytes.append(_nbytes(list(sample.values())))
+            peak_bytes.append(peak)
+            del sample
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    output_bytes = np.array(output_bytes, dtype=np.float64)
+    peak_bytes = np.array(peak_bytes, dtype=np.float64)
+    if len(output_bytes) == 0:
+        return {
+            "samples": 0,
+            "output_bytes": 0.0,
+            "peak_bytes": 0.0,
+            "transient_bytes": 0.0,
+            "copy_factor": None,
+            "max_copy_factor": None
+        }
+    has_output = output_bytes > 0
+    copy_factor = max_copy_factor = None
+    if np.any(has_output):
+        copy_factors = peak_bytes[has_output] / output_bytes[has_output]
+        copy_factor = float(copy_factors.mean())
+        max_copy_factor = float(copy_factors.max())
+    transient_bytes = np.maximum(peak_bytes - output_bytes, 0)
+    return {
+        "samples": len(output_bytes),
+        "output_bytes": float(output_bytes.mean()),
+        "peak_bytes": float(peak_bytes.mean()),
+        "transient_bytes": float(transient_bytes.mean()),
+        "copy_factor": copy_factor,
+        "max_copy_factor": max_copy_factor
+    }
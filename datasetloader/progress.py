@@ -0,0 +1,201 @@
+"""
+Progress and timing reports of dataset loaders.
+
+Long running operations (mainly the construction of a dataset) are split
+into named phases. A callback given as the 'progress' argument of a dataset
+loader receives a dict for every report with the entries
+    'event': 'start', 'update' or 'end' of a phase, or 'message'
+    'phase': name of the phase
+    'count': number of items processed in the phase so far
+    'total': number of items of the phase, None if unknown
+    'elapsed': seconds since the start of the phase
+    'bytes_read': number of bytes read from disk in the phase so far
+    'message': text of 'message' events only (e.g. malformed files)
+Without a callback phases are not reported and messages are sent to the
+'datasetloader' logger.
+
+Ready made callbacks are log_progress, TqdmProgress (progress bars for
+interactive use) and PhaseTimings (collects a breakdown of the time spent in
+each phase).
+"""
+import logging
+import time
+
+logger = logging.getLogger("datasetloader")
+
+
+class Progress:
+    """
+    Reports the phases of an operation to a callback.
+
+    Parameters
+    ----------
+    callback : callable, optional
+        Function receiving the report dicts.
+    source : string, optional
+        Name prefixed to the phase names (e.g. the dataset class name).
+    """
+    def __init__(self, callback=None, source=None):
+        self.callback = callback
+        self.source = source
+
+    def phase(self, name, total=None):
+        """
+        Start a new phase, to be used as a context manager.
+
+        Parameters
+        ----------
+        name : string
+            Name of the phase.
+        total : int, optional
+            Number of items of the phase if known.
+        """
+        if self.source is not None:
+            name = self.source + "." + name
+        return Phase(self.callback, name, total)
+
+    def message(self, message, phase=None):
+        """
+        Report a problem encountered which doesn't stop the operation.
+        """
+        if self.callback is None:
+            logger.warning(message)
+            return
+        if phase is None:
+            phase = self.source
+        self.callback({
+            "event": "message",
+            "phase": phase,
+            "count": 0,
+            "total": None,
+            "elapsed": 0.0,
+            "bytes_read": 0,
+            "message": message
+        })
+
+
+class Phase:
+    """
+    One phase of an operation, counting processed items and bytes read.
+    """
+    def __init__(self, callback, name, total=None):
+        self.callback = callback
+        self.name = name
+        self.total = total
+        self.count = 0
+        self.bytes_read = 0
+        self._start = None
+
+    @property
+    def elapsed(self):
+        if self._start is None:
+            return 0.0
+        return time.perf_counter() - self._start
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._report("start")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._report("end")
+        return False
+
+    def update(self, count=1, bytes_read=0):
+        """
+        Add the given number of processed items and bytes read.
+        """
+        self.count += count
+        self.bytes_read += bytes_read
+        self._report("update")
+
+    def iterate(self, iterable):
+        """
+        Iterate over the items of the phase, counting each one on completion.
+        """
+        for item in iterable:
+            yield item
+            self.update()
+
+    def _report(self, event):
+        if self.callback is not None:
+            self.callback({
+                "event": event,
+                "phase": self.name,
+                "count": self.count,
+                "total": self.total,
+                "elapsed": self.elapsed,
+                "bytes_read": self.bytes_read
+            })
+
+
+def log_progress(report):
+    """
+    Callback logging the end of each phase and all messages to the
+    'datasetloader' logger.
+    """
+    if report["event"] == "message":
+        logger.warning(report["message"])
+    elif report["event"] == "end":
+        logger.info("%s: %d items, %d bytes read in %.3fs", report["phase"],
+                    report["count"], report["bytes_read"], report["elapsed"])
+
+
+class TqdmProgress:
+    """
+    Callback showing a tqdm progress bar for each phase.
+    """
+    def __init__(self, **tqdm_kwargs):
+        self._tqdm_kwargs = tqdm_kwargs
+        self._bars = {}
+
+    def __call__(self, report):
+        from tqdm import tqdm
+        phase = report["phase"]
+        if report["event"] == "start":
+            self._bars[phase] = tqdm(desc=phase,
+                                     total=report["total"],
+                                     **self._tqdm_kwargs)
+        elif report["event"] == "update":
+            bar = self._bars[phase]
+            bar.update(report["count"] - bar.n)
+        elif report["event"] == "end":
+            self._bars.pop(phase).close()
+        else:
+            tqdm.write(report["message"])
+
+
+class PhaseTimings:
+    """
+    Callback collecting item count, bytes read and elapsed time of every
+    completed phase as well as all messages.
+    """
+    def __init__(self):
+        self.phases = []
+        self.messages = []
+
+    def __call__(self, report):
+        if report["event"] == "end":
+            self.phases.append({
+                "phase": report["phase"],
+                "count": report["count"],
+                "bytes_read": report["bytes_read"],
+                "elapsed": report["elapsed"]
+            })
+        elif report["event"] == "message":
+            self.messages.append(report["message"])
+
+    def summary(self):
+        """
+        Total count, bytes read and elapsed time per phase name.
+        """
+        summary = {}
+        for phase in self.phases:
+            total = summary.setdefault(phase["phase"], {
+                "count": 0,
+                "bytes_read": 0,
+                "elapsed": 0.0
+            })
+            for key in total:
+                total[key] += phase[key]
+        return summary
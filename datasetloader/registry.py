@@ -0,0 +1,110 @@
+"""
+Process-wide registry sharing the scan results of dataset loaders.
+
+Constructing a dataset loader with the same class, data_path and options as
+an existing instance reuses the state of that instance (sample metadata,
+splits, length, validity) instead of scanning the dataset again. Only the
+per instance state (column selection, current split, cache folder,
+keep_invalid, progress callback) is set up for the new object. The shared
+state must be treated as read-only; refresh detaches the refreshed loader
+first.
+
+Entries only live as long as any loader using them. Loaders which aren't lazy
+(whose data grows on loading, whether constructed with no_lazy_loading or
+loading everything by design) and classes with _shareable set to False (e.g.
+those holding open file handles) are never shared.
+"""
+import threading
+import weakref
+from abc import ABCMeta
+
+from .cache import cache_key
+
+# Attributes which belong to each loader object and are never shared
+_PER_INSTANCE = ("_init_args", "_selected_cols", "_cur_split", "_cache_dir",
+                 "_keep_invalid", "_shared", "_progress")
+
+_registry = weakref.WeakValueDictionary()
+_lock = threading.Lock()
+
+
+class _SharedState:
+    """
+    Holder of the shared state of one dataset configuration, referenced by
+    every loader using it.
+    """
+    def __init__(self, state):
+        self.state = state
+
+
+class RegistryMeta(ABCMeta):
+    """
+    Metaclass of DatasetLoader looking up the registry on construction.
+    """
+    def __call__(cls, *args, **kwargs):
+        obj = cls.__new__(cls, *args, **kwargs)
+        if not cls._shareable or kwargs.get("no_lazy_loading", False):
+            obj.__init__(*args, **kwargs)
+            return obj
+        key = (cls, cache_key(obj))
+        with _lock:
+            shared = _registry.get(key)
+        if shared is None:
+            obj.__init__(*args, **kwargs)
+            # some loaders switch lazy loading off themselves
+            if obj._lazy:
+                register(obj, key)
+        else:
+            obj.__dict__.update(shared.state)
+            obj._shared = shared
+            obj._init_instance(split=kwargs.get("split"),
+                               cache_dir=kwargs.get("cache_dir"),
+                               keep_invalid=kwargs.get("keep_invalid", False))
+        return obj
+
+
+def register(dataset_loader, key=None):
+    """
+    Make the state of the given loader the shared state of its
+    configuration, used by loaders constructed from now on.
+    """
+    if key is None:
+        key = (type(dataset_loader), cache_key(dataset_loader))
+    shared = _SharedState({
+        attr: val
+        for attr, val in dataset_loader.__dict__.items()
+        if attr not in _PER_INSTANCE
+    })
+    dataset_loader._shared = shared
+    with _lock:
+        _registry[key] = shared
+
+
+def detach(dataset_loader):
+    """
+    Give the loader private copies of the shared containers it is about to
+    modify (sample metadata, splits and validity).
+    """
+    dataset_loader._data = {
+        col: list(val)
+        for col, val in dataset_loader._data.items()
+    }
+    if dataset_loader._splits is not None:
+        dataset_loader._splits = {
+            split_name: {
+                subset: list(indices)
+                for subset, indices in subsets.items()
+            }
+            for split_name, subsets in dataset_loader._splits.items()
+        }
+    dataset_loader._validity = dict(dataset_loader._validity)
+    dataset_loader._shared = None
+
+
+def clear():
+    """
+    Forget all shared state, loaders constructed afterwards scan their
+    dataset again.
+    """
+    with _lock:
+        _registry.clear()
@@ -5,8 +5,40 @@ import re
 import numpy as np
 
 from .datasetloader import DatasetLoader
+from .prefetch import prefetch_map
 from .subsetmixin import SubsetMixin
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_youtube_regex = re.compile(r"(.*)_(\d{6})_(\d{6}).json")
+
+BINARY_FORMAT_NAME = "skeletics152-binary"
+BINARY_FORMAT_VERSION = 1
+BINARY_META_FILENAME = "meta.json"
+BINARY_INDEX_FILENAME = "index.npz"
+# Arrays of all frames of all persons of the binary store: the key of the
+# keypoint files, dtype and shape of a frame
+BINARY_ARRAYS = {
+    "joints3d": ("joints3d", np.float32, (49, 3)),
+    "frame_ids": ("frame_ids", np.int64, ()),
+    "pred_cams": ("pred_cam", np.float32, (3, )),
+    "bboxes": ("bboxes", np.float32, (4, )),
+}
+
+
+def _load_json(filename):
+    """
+    Decode a json file, using orjson if it is installed.
+    """
+    with open(filename, "rb") as f:
+        content = f.read()
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
 
 class Skeletics152(SubsetMixin, DatasetLoader):
     """
@@ -115,17 +147,21 @@ class Skeletics152(SubsetMixin, DatasetLoader):
     ]
     splits = ["default"]
 
-    def __init__(self, data_path, **kwargs):
+    def __init__(self, data_path, binary_store=None, **kwargs):
         """
         Parameters
         ----------
         data_path : string
             folder with dataset on disk
+        binary_store : string, optional (default is None)
+            Folder of a binary store of the keypoint files written by
+            export_binary, to read the keypoints from instead of the json
+            files
         """
         self._data_cols = [
             "keypoint-filename", "keypoints3D", "keypoints2D", "action",
             "frame_ids", "youtube_id", "youtube-timerange", "pred_cams",
-            "bboxes"
+            "bboxes", "keypoints3D-timeline", "presence"
         ]
         self._data = {
             "keypoint-filename": [],
@@ -136,85 +172,112 @@ class Skeletics152(SubsetMixin, DatasetLoader):
 
         self._splits = {"default": {"train": [], "test": []}}
 
-        self._length = 0
-        youtube_regex = re.compile(r"(.*)_(\d{6})_(\d{6}).json")
+        self._data_path = data_path
+        self._binary_store = None
+        if binary_store is not None:
+            self._binary_store = _BinaryStore(binary_store)
+
+        # action id and subset of the samples in each folder
+        self._folders = {}
         for subset, split in (("training", "train"), ("validation", "test")):
             for action_id, action in enumerate(self.actions):
                 action_id = self.select_action(action_id,
                                                kwargs["select_actions"])
                 if action_id is None:
                     continue
-                folder = os.path.join(data_path, subset, action)
-                for filename in os.listdir(folder):
-                    self._data["keypoint-filename"].append(
-                        os.path.join(folder, filename))
-                    self._data["action"].append(action_id)
+                self._folders[os.path.join(data_path, subset,
+                                           action)] = (action_id, split)
+        self._scan_samples()
 
-                    m = youtube_regex.match(filename)
-                    self._data["youtube_id"].append(m.group(1))
-                    self._data["youtube-timerange"].append(
-                        (int(m.group(2)), int(m.group(3))))
+        super().__init__(**kwargs)
 
-                    self._splits["default"][split].append(self._length)
-                    self._length += 1
+    def _sample_dirs(self):
+        return list(self._folders.keys())
 
-        super().__init__(**kwargs)
+    def _sample_entry(self, directory, filename):
+        """
+        Describe the sample stored in the given keypoint file.
+        """
+        m = _youtube_regex.match(filename)
+        if m is None:
+            return None
+        action_id, split = self._folders[directory]
+        data = {
+            "keypoint-filename": os.path.join(directory, filename),
+            "action": action_id,
+            "youtube_id": m.group(1),
+            "youtube-timerange": (int(m.group(2)), int(m.group(3)))
+        }
+        return data, {"default": split}
+
+    def _read_keypointfile(self, filename):
+        """
+        Read all persons of the given keypoint file into one float32 buffer
+        per array, from the binary store if there is one.
+
+        Returns the offsets of the persons in the buffers (number of persons
+        + 1) followed by the joints3d, frame_ids, pred_cams and bboxes
+        buffers holding the frames of all persons, or None if the file can't
+        be decoded.
+        """
+        if self._binary_store is not None:
+            return self._binary_store.load(
+                os.path.relpath(filename, self._data_path))
+        try:
+            data = _load_json(filename)
+        except json.decoder.JSONDecodeError:
+            self._progress.message("Json decoder error in " + filename)
+            return None
+        persons = list(data.values())
+        offsets = np.zeros(len(persons) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(
+            [len(person["frame_ids"]) for person in persons])
+        buffers = []
+        for key, dtype, frame_shape in BINARY_ARRAYS.values():
+            buffer = np.empty((offsets[-1], ) + frame_shape, dtype=dtype)
+            for start, stop, person in zip(offsets[:-1], offsets[1:], persons):
+                if stop > start:
+                    buffer[start:stop] = person[key]
+            buffers.append(buffer)
+        return (offsets, *buffers)
 
     def load_keypointfile(self, filename):
         """
         Load the keypoints sequence from the given file.
 
+        Returns the keypoints, frame_ids, pred_cams and bboxes of all
+        persons. If all persons have the same number of frames these are
+        arrays with a first axis of persons, otherwise object arrays of the
+        array of each person. The arrays of all persons are views into a
+        single buffer (float32 for all but the frame ids). All are None if
+        the file contains no person.
+
         Parameters
         ----------
         filename : string
             Filename of the file containing a skeleton sequence
         """
-        try:
-            with open(filename, "r") as f:
-                data = json.load(f)
-        except json.decoder.JSONDecodeError:
-            print("Json decoder error:", filename)
-            return None, None, None, None
-        if len(data) == 0:
+        buffers = self._read_keypointfile(filename)
+        if buffers is None or len(buffers[0]) == 1:
             # print("No person?", filename)
             return None, None, None, None
-        keypoints = []
-        frame_ids = []
-        pred_cams = []
-        bboxes = []
-        for key, val in data.items():
-            keypoints.append(np.array(val["joints3d"]))
-            frame_ids.append(np.array(val["frame_ids"]))
-            pred_cams.append(np.array(val["pred_cam"]))
-            bboxes.append(np.array(val["bboxes"]))
-        args = {}
-        if len(keypoints) > 1:
-            prev_len = len(keypoints[0])
-            for i in range(1, len(keypoints)):
-                if len(keypoints[i]) != prev_len:
-                    args["dtype"] = object
-                    break
-        keypoints = np.array(keypoints, **args)
-        frame_ids = np.array(frame_ids, **args)
-        pred_cams = np.array(pred_cams, **args)
-        bboxes = np.array(bboxes, **args)
-        return keypoints, frame_ids, pred_cams, bboxes
-
-    def _project_keypoints(self, keypoints3D, pred_cams):
-        keypoints2D = []
-        for person_id in range(keypoints3D.shape[0]):
-            keypoints2D.append(
-                Skeletics152._projection(keypoints3D[person_id],
-                                         pred_cams[person_id]))
-        args = {}
-        if len(keypoints2D) > 1:
-            prev_len = len(keypoints2D[0])
-            for i in range(1, len(keypoints2D)):
-                if len(keypoints2D[i]) != prev_len:
-                    args["dtype"] = object
-                    break
-        keypoints2D = np.array(keypoints2D, **args)
-        return keypoints2D
+        offsets = buffers[0]
+        return tuple(_person_arrays(buffer, offsets) for buffer in buffers[1:])
+
+    def _validate_sample(self, index):
+        """
+        Check that the keypoint file of the sample can be decoded and
+        contains at least one person.
+        """
+        try:
+            data = _load_json(self._data["keypoint-filename"][index])
+        except json.decoder.JSONDecodeError as e:
+            return "Json decoder error: " + str(e)
+        except OSError as e:
+            return type(e).__name__ + ": " + str(e)
+        if len(data) == 0:
+            return "No person in the keypoint file"
+        return None
 
     def __getitem__(self, index):
         """
@@ -229,9 +292,24 @@ class Skeletics152(SubsetMixin, DatasetLoader):
         if len(self._selected_cols - data.keys()) > 0:
             if any(item in self._selected_cols
                    for item in ("keypoints3D", "keypoints2D", "frame_ids",
-                                "pred_cams", "bboxes")):
-                keypoints, frame_ids, pred_cams, bboxes = self.load_keypointfile(
+                                "pred_cams", "bboxes", "keypoints3D-timeline",
+                                "presence")):
+                buffers = self._read_keypointfile(
                     self._data["keypoint-filename"][index])
+                if buffers is None or len(buffers[0]) == 1:
+                    # no person in the file
+                    persons = (None, None, None, None)
+                    timeline = presence = None
+                else:
+                    offsets = buffers[0]
+                    persons = tuple(
+                        _person_arrays(buffer, offsets)
+                        for buffer in buffers[1:])
+                    if any(item in self._selected_cols
+                           for item in ("keypoints3D-timeline", "presence")):
+                        timeline, presence = _frame_timeline(
+                            offsets, buffers[2], buffers[1])
+                keypoints, frame_ids, pred_cams, bboxes = persons
                 if "keypoints3D" in self._selected_cols:
                     data["keypoints3D"] = keypoints
                 if "frame_ids" in self._selected_cols:
@@ -241,66 +319,221 @@ class Skeletics152(SubsetMixin, DatasetLoader):
                 if "bboxes" in self._selected_cols:
                     data["bboxes"] = bboxes
                 if "keypoints2D" in self._selected_cols:
-                    data["keypoints2D"] = self._project_keypoints(
+                    data["keypoints2D"] = Skeletics152.project_keypoints(
                         keypoints, pred_cams)
+                if "keypoints3D-timeline" in self._selected_cols:
+                    data["keypoints3D-timeline"] = timeline
+                if "presence" in self._selected_cols:
+                    data["presence"] = presence
         return data
 
     ###########################################################################
     # Projection of 3d keypoints onto 2d image plane (with respect to the bbox)
     # using the weak perspective camera approximation.
-    # This implementation is a direct copy, simply replacing every PyTorch
-    # function by the equivalent numpy function of the original PyTorch
+    # This implementation computes the same as the original PyTorch
     # implementation in the VIBE repository, here:
     # https://github.com/mkocabas/VIBE/blob/945fd109eaace037b38c56e22ec235a9d3c5100a/lib/models/spin.py#L426-L439
+    # With its identity rotation and camera centre of 0 the perspective
+    # projection reduces to a scaled division by the depth, which is computed
+    # directly instead of building the rotation and intrinsics matrices.
 
     @staticmethod
-    def _projection(pred_joints, pred_camera):
-        pred_cam_t = np.stack([
-            pred_camera[:, 1], pred_camera[:, 2], 2 * 5000. /
-            (224. * pred_camera[:, 0] + 1e-9)
-        ],
-                              axis=-1)
-
-        batch_size = pred_joints.shape[0]
-        camera_center = np.zeros((batch_size, 2))
-        pred_keypoints_2d = Skeletics152._perspective_projection(
-            pred_joints,
-            rotation=np.repeat(np.expand_dims(np.eye(3), 0), batch_size, 0),
-            translation=pred_cam_t,
-            focal_length=5000.,
-            camera_center=camera_center)
-        # Normalize keypoints to [-1,1]
-        pred_keypoints_2d = pred_keypoints_2d / (224. / 2.)
-
-        return pred_keypoints_2d
-
-    @staticmethod
-    def _perspective_projection(points, rotation, translation, focal_length,
-                                camera_center):
+    def project_keypoints(keypoints3D, pred_cams):
         """
-        This function computes the perspective projection of a set of points.
-        Input:
-            points (bs, N, 3): 3D points
-            rotation (bs, 3, 3): Camera rotation
-            translation (bs, 3): Camera translation
-            focal_length (bs,) or scalar: Focal length
-            camera_center (bs, 2): Camera center
+        Project 3d keypoints onto the 2d image plane (with respect to the
+        bbox) using the weak perspective camera approximation, normalised to
+        [-1,1].
+
+        All persons and frames (and samples of a batch) are projected at once.
+
+        Parameters
+        ----------
+        keypoints3D : numpy array
+            3d keypoints of shape (..., num_frames, num_joints, 3), leading
+            dimensions are e.g. persons or samples of a batch. Object arrays
+            of persons of differing lengths are projected person by person.
+        pred_cams : numpy array
+            Weak perspective cameras (scale, x and y translation) of shape
+            (..., num_frames, 3)
+
+        Returns
+        -------
+        numpy array
+            2d keypoints of shape (..., num_frames, num_joints, 2)
         """
-        batch_size = points.shape[0]
-        K = np.zeros([batch_size, 3, 3])
-        K[:, 0, 0] = focal_length
-        K[:, 1, 1] = focal_length
-        K[:, 2, 2] = 1.
-        K[:, :-1, -1] = camera_center
+        if keypoints3D.dtype == object:
+            keypoints2D = np.empty(len(keypoints3D), dtype=object)
+            for person_id in range(len(keypoints3D)):
+                keypoints2D[person_id] = Skeletics152.project_keypoints(
+                    keypoints3D[person_id], pred_cams[person_id])
+            return keypoints2D
+        focal_length = 5000.
+        img_res = 224.
+        depth = (keypoints3D[..., 2] +
+                 (2 * focal_length /
+                  (img_res * pred_cams[..., 0] + 1e-9))[..., None])
+        keypoints2D = np.empty(keypoints3D.shape[:-1] + (2, ),
+                               dtype=np.result_type(keypoints3D, pred_cams))
+        for axis in range(2):
+            keypoints2D[..., axis] = (focal_length * (
+                (keypoints3D[..., axis] + pred_cams[..., axis + 1, None]) /
+                depth) / (img_res / 2.))
+        return keypoints2D
 
-        # Transform points
-        points = np.einsum('bij,bkj->bki', rotation, points)
-        points = points + np.expand_dims(translation, 1)
 
-        # Apply perspective distortion
-        projected_points = points / np.expand_dims(points[:, :, -1], -1)
+def _person_arrays(buffer, offsets):
+    """
+    Split a buffer of the frames of all persons into the persons given by
+    their offsets, an array with a first axis of persons if all have the
+    same number of frames, otherwise an object array of arrays.
+    """
+    lengths = np.diff(offsets)
+    if np.all(lengths == lengths[0]):
+        return buffer.reshape((len(lengths), lengths[0]) + buffer.shape[1:])
+    persons = np.empty(len(lengths), dtype=object)
+    for person_id in range(len(lengths)):
+        persons[person_id] = buffer[offsets[person_id]:offsets[person_id + 1]]
+    return persons
+
+
+def _frame_timeline(offsets, frame_ids, buffer):
+    """
+    Scatter the frames of all persons onto the frame axis of the clip given
+    by their frame ids.
+
+    Returns an array of shape (persons, frames of the clip) + frame shape,
+    zero where a person is not tracked, and the boolean presence mask of
+    shape (persons, frames of the clip). The clip is taken to start at frame
+    id 0 and end at the largest frame id of any person.
+    """
+    num_persons = len(offsets) - 1
+    num_frames = int(frame_ids.max()) + 1 if len(frame_ids) > 0 else 0
+    # person index of each frame in the buffer
+    person_ids = np.repeat(np.arange(num_persons), np.diff(offsets))
+    timeline = np.zeros((num_persons, num_frames) + buffer.shape[1:],
+                        dtype=buffer.dtype)
+    timeline[person_ids, frame_ids] = buffer
+    presence = np.zeros((num_persons, num_frames), dtype=bool)
+    presence[person_ids, frame_ids] = True
+    return timeline, presence
 
-        # Apply camera intrinsics
-        projected_points = np.einsum('bij,bkj->bki', K, projected_points)
 
-        return projected_points[:, :, :-1]
+def export_binary(dataset_loader, path, num_workers=0):
+    """
+    Convert all keypoint files of a Skeletics152 dataset into a binary store.
+
+    The frames of all persons of all files are stored back to back in one
+    raw file per array (joints3d, frame_ids, pred_cams, bboxes), read as
+    memory maps by datasets created with binary_store=path. Files which can't
+    be decoded are stored without persons.
+
+    Parameters
+    ----------
+    dataset_loader : Skeletics152
+        The dataset to be converted.
+    path : string
+        Folder to write the store to (created if necessary, existing store
+        files are overwritten).
+    num_workers : int, optional (default is 0)
+        Number of worker threads decoding files ahead of time.
+    """
+    os.makedirs(path, exist_ok=True)
+    filenames = list(dataset_loader._data["keypoint-filename"])
+    sample_persons = np.zeros(len(filenames) + 1, dtype=np.int64)
+    person_frames = [0]
+    files = {
+        name: open(os.path.join(path, name + ".bin"), "wb")
+        for name in BINARY_ARRAYS
+    }
+    try:
+        with dataset_loader._progress.phase("export binary",
+                                            len(filenames)) as phase:
+            for i, buffers in enumerate(
+                    prefetch_map(dataset_loader._read_keypointfile, filenames,
+                                 num_workers)):
+                phase.update(bytes_read=os.path.getsize(filenames[i]))
+                if buffers is None:
+                    sample_persons[i + 1] = sample_persons[i]
+                    continue
+                offsets = buffers[0]
+                sample_persons[i + 1] = sample_persons[i] + len(offsets) - 1
+                person_frames.extend(
+                    (person_frames[-1] + offsets[1:]).tolist())
+                for name, buffer in zip(BINARY_ARRAYS, buffers[1:]):
+                    files[name].write(buffer.tobytes())
+    finally:
+        for f in files.values():
+            f.close()
+
+    # files are identified by their path relative to the dataset folder
+    relative_filenames = [
+        os.path.relpath(filename, dataset_loader._data_path)
+        for filename in filenames
+    ]
+    np.savez(os.path.join(path, BINARY_INDEX_FILENAME),
+             filenames=np.array(relative_filenames, dtype=str),
+             sample_persons=sample_persons,
+             person_frames=np.array(person_frames, dtype=np.int64))
+    # the meta data is written last, marking the store as complete
+    meta = {
+        "format": BINARY_FORMAT_NAME,
+        "version": BINARY_FORMAT_VERSION,
+        "num_frames": person_frames[-1]
+    }
+    tmp_filename = os.path.join(path, BINARY_META_FILENAME + ".tmp")
+    with open(tmp_filename, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_filename, os.path.join(path, BINARY_META_FILENAME))
+
+
+class _BinaryStore:
+    """
+    Read access to a binary store written by export_binary.
+    """
+    def __init__(self, path):
+        meta_filename = os.path.join(path, BINARY_META_FILENAME)
+        if not os.path.exists(meta_filename):
+            raise Exception("'" + path + "' is not a complete binary store "
+                            "written by export_binary!")
+        with open(meta_filename, "r") as f:
+            meta = json.load(f)
+        if meta.get("format") != BINARY_FORMAT_NAME:
+            raise Exception("'" + path + "' is not a binary store written "
+                            "by export_binary!")
+        with np.load(os.path.join(path, BINARY_INDEX_FILENAME)) as index:
+            self._samples = {
+                filename: i
+                for i, filename in enumerate(index["filenames"].tolist())
+            }
+            self._sample_persons = index["sample_persons"]
+            self._person_frames = index["person_frames"]
+        num_frames = meta["num_frames"]
+        self._arrays = {}
+        for name, (_, dtype, frame_shape) in BINARY_ARRAYS.items():
+            if num_frames == 0:
+                # empty files can't be memory mapped
+                self._arrays[name] = np.zeros((0, ) + frame_shape, dtype=dtype)
+            else:
+                self._arrays[name] = np.memmap(
+                    os.path.join(path, name + ".bin"),
+                    dtype=dtype,
+                    mode="r",
+                    shape=(num_frames, ) + frame_shape)
+
+    def load(self, filename):
+        """
+        Offsets of the persons of the given keypoint file (relative to the
+        dataset folder) and views of its frames in the stored arrays, in the
+        format of Skeletics152._read_keypointfile.
+        """
+        if filename not in self._samples:
+            raise KeyError("The binary store has no keypoint file '" +
+                           filename + "'!")
+        sample = self._samples[filename]
+        first_person = self._sample_persons[sample]
+        last_person = self._sample_persons[sample + 1]
+        person_frames = self._person_frames[first_person:last_person + 1]
+        start = person_frames[0]
+        stop = person_frames[-1]
+        arrays = [array[start:stop] for array in self._arrays.values()]
+        return (person_frames - start, *arrays)
@@ -0,0 +1,302 @@
+import os
+
+import numpy as np
+
+from .cache import cache_path, hash_args
+from .prefetch import prefetch_map, chunks
+
+# Number of chunks between checkpoints of an unfinished computation
+_CHECKPOINT_CHUNKS = 16
+
+
+class RunningStats:
+    """
+    Streaming mean, standard deviation, minimum and maximum per element.
+
+    Uses Welford's algorithm in its batched form (Chan et al.), so partial
+    results computed on separate parts of the data can be merged exactly.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+        self.min = None
+        self.max = None
+
+    def update(self, values):
+        """
+        Add a batch of observations.
+
+        Parameters
+        ----------
+        values : numpy array
+            Observations along the first axis.
+        """
+        if values.shape[0] == 0:
+            return
+        other = RunningStats()
+        other.count = values.shape[0]
+        other.mean = values.mean(axis=0)
+        other.m2 = np.square(values - other.mean).sum(axis=0)
+        other.min = values.min(axis=0)
+        other.max = values.max(axis=0)
+        self.merge(other)
+
+    def merge(self, other):
+        """
+        Merge the statistics of another RunningStats object into this one.
+
+        Parameters
+        ----------
+        other : RunningStats
+            Statistics of a disjoint set of observations.
+        """
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count = other.count
+            self.mean = other.mean.copy()
+            self.m2 = other.m2.copy()
+            self.min = other.min.copy()
+            self.max = other.max.copy()
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / count)
+        self.m2 = (self.m2 + other.m2 + np.square(delta) *
+                   (self.count * other.count / count))
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        self.count = count
+
+    @property
+    def std(self):
+        if self.count == 0:
+            return None
+        return np.sqrt(self.m2 / self.count)
+
+
+def _points(value):
+    """
+    Reshape a keypoint array into (points, joints, channels).
+
+    Ragged object arrays (e.g. persons with differing numbers of frames) are
+    flattened element by element.
+    """
+    value = np.asarray(value)
+    if value.dtype == object:
+        parts = [_points(part) for part in value if part is not None]
+        if len(parts) == 0:
+            return None
+        return np.concatenate(parts)
+    value = value.astype(np.float64, copy=False)
+    if value.ndim < 2:
+        return value.reshape(-1, 1, 1)
+    return value.reshape((-1, ) + value.shape[-2:])
+
+
+def _chunk_stats(dataset_loader, indices, cols):
+    """
+    Statistics of a chunk of samples (run in worker threads).
+    """
+    stats = {col: RunningStats() for col in cols}
+    extents = {col: [] for col in cols}
+    for index in indices:
+        sample = dataset_loader[index]
+        for col in cols:
+            points = None
+            if sample[col] is not None:
+                points = _points(sample[col])
+            if points is None or points.shape[0] == 0:
+                extents[col].append(None)
+                continue
+            stats[col].update(points)
+            extents[col].append(
+                (points.min(axis=(0, 1)), points.max(axis=(0, 1))))
+    return stats, extents
+
+
+def compute_stats(dataset_loader,
+                  cols,
+                  split_name=None,
+                  split=None,
+                  num_workers=0,
+                  chunk_size=64,
+                  recompute=False):
+    """
+    Compute normalisation statistics of keypoint columns in one pass.
+
+    See DatasetLoader.compute_stats for a description of the parameters and
+    the return value.
+    """
+    if isinstance(cols, str):
+        cols = [cols]
+    cols = list(cols)
+    for col in cols:
+        if not dataset_loader.has_col(col):
+            raise KeyError("This dataset does not have '" + col +
+                           "'information.")
+    filename = cache_path(
+        dataset_loader, "stats_" + hash_args(cols, split_name, split) + ".npz")
+    if filename is not None and os.path.exists(filename) and not recompute:
+        return _load_stats(filename, cols)
+
+    index_list = dataset_loader._index_list(split_name, split)
+    partial_filename = None
+    if filename is not None:
+        partial_filename = filename[:-len(".npz")] + ".partial.npz"
+    stats = extents = None
+    if (partial_filename is not None and os.path.exists(partial_filename)
+            and not recompute):
+        stats, extents = _load_partial(partial_filename, cols, len(index_list))
+    if stats is None:
+        stats = {col: RunningStats() for col in cols}
+        extents = {col: [] for col in cols}
+    checked = len(extents[cols[0]])
+    loader = dataset_loader._with_cols(cols)
+    completed = False
+    try:
+        for i, (chunk_stats, chunk_extents) in enumerate(
+                prefetch_map(
+                    lambda indices: _chunk_stats(loader, indices, cols),
+                    chunks(index_list[checked:], chunk_size), num_workers)):
+            for col in cols:
+                stats[col].merge(chunk_stats[col])
+                extents[col].extend(chunk_extents[col])
+            if (partial_filename is not None
+                    and (i + 1) % _CHECKPOINT_CHUNKS == 0):
+                _save_partial(partial_filename, stats, extents,
+                              len(index_list))
+        completed = True
+    finally:
+        if partial_filename is not None and not completed:
+            # keep what has been computed so far to continue from there
+            _save_partial(partial_filename, stats, extents, len(index_list))
+
+    results = {}
+    for col in cols:
+        col_stats = stats[col]
+        if col_stats.count == 0:
+            raise Exception("Column '" + col + "' has no data in the "
+                            "selected samples!")
+        # Per channel statistics follow from merging the per joint ones
+        channel_stats = RunningStats()
+        for joint in range(col_stats.mean.shape[0]):
+            joint_stats = RunningStats()
+            joint_stats.count = col_stats.count
+            joint_stats.mean = col_stats.mean[joint]
+            joint_stats.m2 = col_stats.m2[joint]
+            joint_stats.min = col_stats.min[joint]
+            joint_stats.max = col_stats.max[joint]
+            channel_stats.merge(joint_stats)
+
+        sample_min, sample_max = _extent_arrays(extents[col],
+                                                col_stats.mean.shape[-1])
+        results[col] = {
+            "count": col_stats.count,
+            "mean": col_stats.mean,
+            "std": col_stats.std,
+            "min": col_stats.min,
+            "max": col_stats.max,
+            "channel_mean": channel_stats.mean,
+            "channel_std": channel_stats.std,
+            "channel_min": channel_stats.min,
+            "channel_max": channel_stats.max,
+            "indices": np.asarray(index_list, dtype=np.int64),
+            "sample_min": sample_min,
+            "sample_max": sample_max,
+        }
+
+    if filename is not None:
+        _save_stats(filename, results)
+        if os.path.exists(partial_filename):
+            os.remove(partial_filename)
+    return results
+
+
+def _extent_arrays(extents, num_channels):
+    """
+    Per sample minimum and maximum arrays (NaN for samples without data)
+    from a list of (min, max) tuples or None.
+    """
+    sample_min = np.full((len(extents), num_channels), np.nan)
+    sample_max = np.full((len(extents), num_channels), np.nan)
+    for i, extent in enumerate(extents):
+        if extent is not None:
+            sample_min[i], sample_max[i] = extent
+    return sample_min, sample_max
+
+
+def _save_partial(filename, stats, extents, total):
+    """
+    Atomically write the state of an unfinished computation.
+    """
+    arrays = {"total": total}
+    for col, col_stats in stats.items():
+        arrays[col + "/count"] = col_stats.count
+        if col_stats.count > 0:
+            for name in ("mean", "m2", "min", "max"):
+                arrays[col + "/" + name] = getattr(col_stats, name)
+            num_channels = col_stats.mean.shape[-1]
+        else:
+            num_channels = 1
+        (arrays[col + "/sample_min"],
+         arrays[col + "/sample_max"]) = _extent_arrays(extents[col],
+                                                       num_channels)
+    tmp_filename = filename + ".tmp" + str(os.getpid())
+    with open(tmp_filename, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_filename, filename)
+
+
+def _load_partial(filename, cols, total):
+    """
+    Read the state written by _save_partial. Returns (None, None) if it
+    belongs to a different number of samples.
+    """
+    with np.load(filename) as arrays:
+        if arrays["total"].item() != total:
+            return None, None
+        stats = {}
+        extents = {}
+        for col in cols:
+            col_stats = RunningStats()
+            col_stats.count = arrays[col + "/count"].item()
+            if col_stats.count > 0:
+                for name in ("mean", "m2", "min", "max"):
+                    setattr(col_stats, name, arrays[col + "/" + name])
+            stats[col] = col_stats
+            extents[col] = [
+                None if np.all(np.isnan(sample_min)) else
+                (sample_min, sample_max) for sample_min, sample_max in zip(
+                    arrays[col + "/sample_min"], arrays[col + "/sample_max"])
+            ]
+    return stats, extents
+
+
+def _save_stats(filename, results):
+    """
+    Atomically write the statistics to an npz file.
+    """
+    arrays = {
+        col + "/" + key: val
+        for col, col_results in results.items()
+        for key, val in col_results.items()
+    }
+    tmp_filename = filename + ".tmp" + str(os.getpid())
+    with open(tmp_filename, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_filename, filename)
+
+
+def _load_stats(filename, cols):
+    """
+    Read statistics written by _save_stats.
+    """
+    results = {col: {} for col in cols}
+    with np.load(filename) as arrays:
+        for key in arrays.files:
+            col, name = key.rsplit("/", 1)
+            val = arrays[key]
+            results[col][name] = val.item() if val.ndim == 0 else val
+    return results
@@ -0,0 +1,406 @@
+"""
+Transforms operating on whole batches of keypoint data.
+
+A batch is a dict of columns as returned by get_batch, with the samples along
+the first axis. Keypoint columns are expected to have joints and channels as
+their last two axes, with an arbitrary number of axes (e.g. persons, frames)
+in between. Columns of differently shaped samples (object arrays) are
+transformed sample by sample.
+
+Random parameters are drawn once per batch and shared by all transformed
+columns, so e.g. keypoints2D and keypoints3D of a sample are flipped
+together.
+"""
+import re
+import threading
+
+import numpy as np
+
+
+def flip_permutation(landmarks):
+    """
+    Permutation of the landmarks swapping left and right.
+
+    Landmarks are matched by name, swapping 'left'/'right' as well as the
+    'l'/'r' prefix of abbreviated names (e.g. 'lknee'). Where a name occurs
+    several times the closest occurence is used. Landmarks without a
+    counterpart are left in place.
+
+    Parameters
+    ----------
+    landmarks : list of strings
+        Landmark names of the dataset in order.
+    """
+    positions = {}
+    for i, name in enumerate(landmarks):
+        positions.setdefault(name, []).append(i)
+    permutation = np.arange(len(landmarks))
+    for i, name in enumerate(landmarks):
+        if "left" in name:
+            mirrored = name.replace("left", "right")
+        elif "right" in name:
+            mirrored = name.replace("right", "left")
+        elif re.match(r"^[lr][a-z]", name):
+            mirrored = {"l": "r", "r": "l"}[name[0]] + name[1:]
+        else:
+            continue
+        if mirrored in positions:
+            permutation[i] = min(positions[mirrored], key=lambda j: abs(j - i))
+    return permutation
+
+
+def apply_to_sample(transform, sample):
+    """
+    Apply a batch transform to a single sample.
+
+    Parameters
+    ----------
+    transform : callable
+        Transform to be applied.
+    sample : dict
+        A sample as returned by subscripting a DatasetLoader.
+    """
+    batch = {}
+    for col, val in sample.items():
+        wrapped = np.empty(1, dtype=object)
+        wrapped[0] = val
+        if isinstance(val, np.ndarray) and val.dtype != object:
+            wrapped = val[None]
+        batch[col] = wrapped
+    batch = transform(batch)
+    return {col: val[0] for col, val in batch.items()}
+
+
+class Transform:
+    """
+    Base class of batch transforms.
+
+    Subclasses implement _params to draw the (random) parameters of a batch
+    and _apply to transform a single column given these parameters.
+    """
+    def __init__(self, cols=None, channels=None):
+        """
+        Parameters
+        ----------
+        cols : list of strings, optional (default is None)
+            Columns to be transformed. If None all columns of the batch whose
+            name starts with 'keypoints' are transformed.
+        channels : int, optional (default is None)
+            Only transform the first n channels (e.g. 2 for MPII whose third
+            channel is the visibility flag). If None use all channels.
+        """
+        self._cols = cols
+        self._channels = channels
+
+    def __call__(self, batch):
+        cols = self._cols
+        if cols is None:
+            cols = [col for col in batch if col.startswith("keypoints")]
+        if len(cols) == 0:
+            return batch
+        batch_size = len(batch[cols[0]])
+        params = self._params(batch, batch_size, _num_joints(batch[cols[0]]))
+        for col in cols:
+            data = batch[col]
+            if data.dtype != object:
+                batch[col] = self._apply_channels(data, params)
+                continue
+            transformed = np.empty(batch_size, dtype=object)
+            for i in range(batch_size):
+                if data[i] is None:
+                    continue
+                sample_params = {
+                    key: _sample_param(val, i)
+                    for key, val in params.items()
+                }
+                transformed[i] = self._apply_channels(
+                    np.asarray(data[i])[None], sample_params)[0]
+            batch[col] = transformed
+        return batch
+
+    def _apply_channels(self, data, params):
+        if self._channels is None or self._channels == data.shape[-1]:
+            return self._apply(data, params)
+        data = data.copy()
+        data[..., :self._channels] = self._apply(data[..., :self._channels],
+                                                 params)
+        return data
+
+    def _params(self, batch, batch_size, num_joints):
+        return {}
+
+    def _apply(self, data, params):
+        raise NotImplementedError
+
+
+def _num_joints(data):
+    """
+    Number of joints (second last axis) of the samples of a column.
+    """
+    if data.dtype != object:
+        return data.shape[-2]
+    for sample in data:
+        if sample is not None:
+            return np.asarray(sample).shape[-2]
+    return 0
+
+
+def _sample_param(val, i):
+    """
+    Parameters of the i-th sample, keeping a batch axis of size one.
+    """
+    if val.dtype == object:
+        return np.asarray(val[i], dtype=np.float64)[None]
+    return val[i:i + 1]
+
+
+def _expand(values, ndim):
+    """
+    Append axes to per sample values so they broadcast against an array
+    with ndim dimensions.
+    """
+    return values.reshape(values.shape + (1, ) * (ndim - values.ndim))
+
+
+class Compose:
+    """
+    Apply several transforms one after the other.
+    """
+    def __init__(self, transforms):
+        self._transforms = list(transforms)
+
+    def __call__(self, batch):
+        for transform in self._transforms:
+            batch = transform(batch)
+        return batch
+
+
+class RootCentre(Transform):
+    """
+    Move the root joint to the origin.
+    """
+    def __init__(self, root=0, per_frame=True, frame_axis=-3, **kwargs):
+        """
+        Parameters
+        ----------
+        root : int, optional (default is 0)
+            Index of the root joint.
+        per_frame : bool, optional (default is True)
+            If True subtract the root position of every frame, otherwise
+            subtract the root position of the first frame from all frames
+            (preserving global motion).
+        frame_axis : int or None, optional (default is -3)
+            Axis of the frames counted from the end of the keypoint arrays,
+            only used if per_frame is False. None for data without frames
+            (e.g. the persons of an image). Samples with fewer axes than that
+            (e.g. single images with joints and channels only) are centred on
+            their root either way.
+        """
+        super().__init__(**kwargs)
+        self._root = root
+        self._per_frame = per_frame
+        self._frame_axis = frame_axis
+
+    def _apply(self, data, params):
+        root = data[..., self._root:self._root + 1, :]
+        # the first axis of data is the batch, never the frames
+        if (not self._per_frame and self._frame_axis is not None
+                and data.ndim + self._frame_axis >= 1):
+            root = np.take(root, [0], axis=self._frame_axis)
+        return data - root
+
+
+class ScaleNormalise(Transform):
+    """
+    Normalise the position and scale of the keypoints.
+
+    If a scale column is given (e.g. MPII 'scale' or JHMDB 'scales') the
+    keypoints are scaled by it, otherwise each sample is scaled to a maximum
+    extent of one. Scale and centre columns must match the leading axes of
+    the keypoints (e.g. one value per person or per frame).
+    """
+    def __init__(self,
+                 scale_col=None,
+                 centre_col=None,
+                 divide=False,
+                 reference_scale=1.0,
+                 **kwargs):
+        """
+        Parameters
+        ----------
+        scale_col : string, optional (default is None)
+            Column containing the scale of each person/frame.
+        centre_col : string, optional (default is None)
+            Column containing the centre of each person/frame. If None the
+            keypoints are not translated.
+        divide : bool, optional (default is False)
+            If True divide by the scale, otherwise multiply. MPII stores the
+            inverse person scale (multiply), JHMDB the scale itself (divide).
+        reference_scale : float, optional (default is 1.0)
+            Scales are divided by this value (e.g. MPII.reference_scale).
+        """
+        super().__init__(**kwargs)
+        self._scale_col = scale_col
+        self._centre_col = centre_col
+        self._divide = divide
+        self._reference_scale = reference_scale
+
+    def _params(self, batch, batch_size, num_joints):
+        params = {}
+        for key, col in (("scale", self._scale_col), ("centre",
+                                                      self._centre_col)):
+            if col is not None:
+                if col not in batch:
+                    raise KeyError("ScaleNormalise requires the '" + col +
+                                   "' column to be selected.")
+                params[key] = batch[col]
+        return params
+
+    def _apply(self, data, params):
+        if "centre" in params:
+            centre = np.asarray(params["centre"], dtype=np.float64)
+            centre = centre[..., :data.shape[-1]]
+            # insert the joint axis and any missing axes (e.g. frames if
+            # there is one centre per person)
+            centre = centre.reshape(centre.shape[:-1] + (1, ) *
+                                    (data.ndim - centre.ndim) +
+                                    centre.shape[-1:])
+            data = data - centre
+        if "scale" in params:
+            scale = np.asarray(params["scale"], dtype=np.float64)
+            scale = _expand(scale / self._reference_scale, data.ndim)
+            if self._divide:
+                return data / scale
+            return data * scale
+        axes = tuple(range(1, data.ndim))
+        extent = data.max(axis=axes) - data.min(axis=axes)
+        extent[extent == 0] = 1
+        return data / _expand(extent, data.ndim)
+
+
+class RandomRotation(Transform):
+    """
+    Rotate each sample by a random angle.
+
+    2D keypoints are rotated in the image plane, 3D keypoints around the given
+    (vertical) axis.
+    """
+    def __init__(self, max_angle=np.pi, axis=1, seed=None, **kwargs):
+        """
+        Parameters
+        ----------
+        max_angle : float, optional (default is pi)
+            Angles are drawn uniformly from [-max_angle, max_angle].
+        axis : int, optional (default is 1)
+            Rotation axis for 3D keypoints (0=x, 1=y, 2=z).
+        seed : int, optional (default is None)
+            Seed of the random number generator.
+        """
+        super().__init__(**kwargs)
+        self._max_angle = max_angle
+        self._axis = axis
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def _params(self, batch, batch_size, num_joints):
+        with self._lock:
+            angles = self._rng.uniform(-self._max_angle, self._max_angle,
+                                       batch_size)
+        return {"angles": angles}
+
+    def _apply(self, data, params):
+        cos = np.cos(params["angles"])
+        sin = np.sin(params["angles"])
+        num_channels = data.shape[-1]
+        rotation = np.zeros((len(cos), num_channels, num_channels))
+        if num_channels == 2:
+            plane = (0, 1)
+        else:
+            rotation[:, self._axis, self._axis] = 1
+            plane = [i for i in range(3) if i != self._axis]
+        rotation[:, plane[0], plane[0]] = cos
+        rotation[:, plane[0], plane[1]] = -sin
+        rotation[:, plane[1], plane[0]] = sin
+        rotation[:, plane[1], plane[1]] = cos
+        rotation = rotation.reshape((len(cos), ) + (1, ) * (data.ndim - 3) +
+                                    (num_channels, num_channels))
+        return np.einsum("...ij,...kj->...ki", rotation, data)
+
+
+class RandomFlip(Transform):
+    """
+    Mirror samples left to right with the given probability.
+
+    Mirrors the first channel at the given centre and swaps the left and
+    right landmarks.
+    """
+    def __init__(self, landmarks, p=0.5, centre=0.0, seed=None, **kwargs):
+        """
+        Parameters
+        ----------
+        landmarks : list of strings
+            Landmarks of the dataset (e.g. NTURGBD.landmarks). The left/right
+            permutation is computed from these once.
+        p : float, optional (default is 0.5)
+            Probability of flipping a sample.
+        centre : float, optional (default is 0.0)
+            Coordinate of the mirror axis (e.g. half the image width for image
+            coordinates).
+        seed : int, optional (default is None)
+            Seed of the random number generator.
+        """
+        super().__init__(**kwargs)
+        self._permutation = flip_permutation(landmarks)
+        self._p = p
+        self._centre = centre
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def _params(self, batch, batch_size, num_joints):
+        with self._lock:
+            flip = self._rng.random(batch_size) < self._p
+        return {"flip": flip}
+
+    def _apply(self, data, params):
+        flip = params["flip"]
+        if not np.any(flip):
+            return data
+        data = data.copy()
+        flipped = data[flip][..., self._permutation, :]
+        flipped[..., 0] = 2 * self._centre - flipped[..., 0]
+        data[flip] = flipped
+        return data
+
+
+class JointDropout(Transform):
+    """
+    Set randomly chosen joints of each sample to a fill value.
+    """
+    def __init__(self, p=0.1, fill_value=0.0, seed=None, **kwargs):
+        """
+        Parameters
+        ----------
+        p : float, optional (default is 0.1)
+            Probability of dropping each joint. A dropped joint is dropped in
+            all frames and for all persons of the sample.
+        fill_value : float, optional (default is 0.0)
+            Value assigned to dropped joints.
+        seed : int, optional (default is None)
+            Seed of the random number generator.
+        """
+        super().__init__(**kwargs)
+        self._p = p
+        self._fill_value = fill_value
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def _params(self, batch, batch_size, num_joints):
+        with self._lock:
+            drop = self._rng.random((batch_size, num_joints)) < self._p
+        return {"drop": drop}
+
+    def _apply(self, data, params):
+        drop = params["drop"]
+        drop = drop.reshape((drop.shape[0], ) + (1, ) * (data.ndim - 3) +
+                            (drop.shape[1], 1))
+        return np.where(drop, self._fill_value, data)
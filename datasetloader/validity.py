@@ -0,0 +1,175 @@
+import os
+import json
+
+import numpy as np
+
+from .cache import cache_path
+from .prefetch import prefetch_map, chunks
+
+VALIDITY_FILENAME = "validity.json"
+# State of an unfinished validation, used to continue after an interruption
+VALIDITY_PARTIAL_FILENAME = "validity.partial.json"
+# Number of chunks between checkpoints of an unfinished validation
+_CHECKPOINT_CHUNKS = 16
+
+
+def check_sample(dataset_loader, index, none_messages=None):
+    """
+    Default validity check of a single sample.
+
+    Loads the sample with the currently selected columns and reports loading
+    errors as well as missing (None) or empty data.
+
+    Parameters
+    ----------
+    dataset_loader : DatasetLoader
+        Dataset the sample belongs to.
+    index : int
+        Index of the sample to be checked.
+    none_messages : dict, optional (default is None)
+        Dataset specific descriptions of why a column can be None, by column.
+
+    Returns None if the sample is valid, otherwise a string describing the
+    problem.
+    """
+    try:
+        sample = dataset_loader[index]
+    except Exception as e:
+        return type(e).__name__ + ": " + str(e)
+    for col, val in sample.items():
+        if val is None:
+            if none_messages is not None and col in none_messages:
+                return none_messages[col]
+            return "No data in column '" + col + "'"
+        if isinstance(val, np.ndarray) and val.size == 0:
+            return "Empty data in column '" + col + "'"
+    return None
+
+
+def validate(dataset_loader, num_workers=0, cols=None, chunk_size=64):
+    """
+    Check all samples of a dataset and persist the resulting validity index.
+
+    See DatasetLoader.validate for a description of the parameters and the
+    return value.
+    """
+    if cols is None:
+        cols = [
+            col for col in dataset_loader._data_cols
+            if col not in dataset_loader._data
+        ]
+    partial_filename = cache_path(dataset_loader, VALIDITY_PARTIAL_FILENAME)
+    checked, invalid = _load_partial(dataset_loader, partial_filename, cols)
+    loader = dataset_loader._with_cols(cols)
+    completed = False
+    try:
+        for i, chunk_results in enumerate(
+                prefetch_map(
+                    lambda indices: [(index, loader._validate_sample(index))
+                                     for index in indices],
+                    chunks(range(checked, len(dataset_loader)), chunk_size),
+                    num_workers)):
+            for index, problem in chunk_results:
+                if problem is not None:
+                    invalid[index] = problem
+            checked += len(chunk_results)
+            if (partial_filename is not None
+                    and (i + 1) % _CHECKPOINT_CHUNKS == 0):
+                _save_partial(dataset_loader, partial_filename, cols, checked,
+                              invalid)
+        completed = True
+    finally:
+        if partial_filename is not None and not completed:
+            # keep the samples checked so far to continue from there
+            _save_partial(dataset_loader, partial_filename, cols, checked,
+                          invalid)
+    save_validity(dataset_loader, invalid)
+    if partial_filename is not None and os.path.exists(partial_filename):
+        os.remove(partial_filename)
+    return invalid
+
+
+def _save_partial(dataset_loader, filename, cols, checked, invalid):
+    """
+    Atomically write the state of an unfinished validation.
+    """
+    tmp_filename = filename + ".tmp" + str(os.getpid())
+    with open(tmp_filename, "w") as f:
+        json.dump(
+            {
+                "length": len(dataset_loader),
+                "cols": list(cols),
+                "checked": checked,
+                "invalid": {
+                    str(i): problem
+                    for i, problem in invalid.items()
+                }
+            }, f)
+    os.replace(tmp_filename, filename)
+
+
+def _load_partial(dataset_loader, filename, cols):
+    """
+    Number of samples checked and problems found by an unfinished
+    validation of the same columns, (0, {}) if there is none.
+    """
+    if filename is None or not os.path.exists(filename):
+        return 0, {}
+    with open(filename, "r") as f:
+        partial = json.load(f)
+    if (partial["length"] != len(dataset_loader)
+            or partial["cols"] != list(cols)):
+        return 0, {}
+    return partial["checked"], {
+        int(i): problem
+        for i, problem in partial["invalid"].items()
+    }
+
+
+def save_validity(dataset_loader, invalid):
+    """
+    Atomically write the validity index to the cache folder of the dataset
+    (if it has one).
+    """
+    filename = cache_path(dataset_loader, VALIDITY_FILENAME)
+    if filename is None:
+        return
+    tmp_filename = filename + ".tmp" + str(os.getpid())
+    with open(tmp_filename, "w") as f:
+        json.dump(
+            {
+                "length": len(dataset_loader),
+                "invalid": {
+                    str(i): problem
+                    for i, problem in invalid.items()
+                }
+            }, f)
+    os.replace(tmp_filename, filename)
+
+
+def load_validity(dataset_loader, length=None):
+    """
+    Read the validity index of the dataset.
+
+    Returns a dict mapping indices of invalid samples to a description of
+    the problem, or None if there is no index or it doesn't match the
+    dataset (e.g. because the data on disk changed).
+
+    Parameters
+    ----------
+    dataset_loader : DatasetLoader
+        The dataset the index belongs to.
+    length : int, optional (default is None)
+        Number of samples the index has to be for, defaults to the length of
+        the dataset.
+    """
+    filename = cache_path(dataset_loader, VALIDITY_FILENAME)
+    if filename is None or not os.path.exists(filename):
+        return None
+    with open(filename, "r") as f:
+        validity = json.load(f)
+    if length is None:
+        length = len(dataset_loader)
+    if validity["length"] != length:
+        return None
+    return {int(i): problem for i, problem in validity["invalid"].items()}
@@ -0,0 +1,23 @@
+"""
+Read-only view contract of the data returned by dataset loaders.
+
+Arrays returned by a dataset loader may be views into data held by the
+loader (columns loaded at construction, caches, state shared between
+loaders) rather than copies made for the caller. Such arrays are returned as
+read-only views, so modifying them in place raises an error instead of
+silently changing the dataset for every later access. Copy an array before
+modifying it in place (the transforms of the transforms module never modify
+their input).
+"""
+import numpy as np
+
+
+def readonly(value):
+    """
+    Read-only view of a numpy array, other values are returned unchanged.
+    The array itself stays writeable for its owner.
+    """
+    if isinstance(value, np.ndarray) and value.flags.writeable:
+        value = value.view()
+        value.flags.writeable = False
+    return value
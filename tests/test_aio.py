@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .toydataset import ToyDataset
+
+
+class CountingToyDataset(ToyDataset):
+    """
+    ToyDataset recording the number of samples loaded concurrently.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.loaded = 0
+
+    def __getitem__(self, index):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            return super().__getitem__(index)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.loaded += 1
+
+
+class TestAio():
+    def test_aiterate(self):
+        ds = CountingToyDataset(length=12, delay=0.01)
+        ds.set_cols("keypoints3D", "action")
+
+        async def consume():
+            with ThreadPoolExecutor(8) as executor:
+                return [
+                    sample async for sample in ds.aiterate("default",
+                                                           "train",
+                                                           executor=executor,
+                                                           max_concurrency=3)
+                ]
+
+        samples = asyncio.run(consume())
+        assert [sample["action"] for sample in samples] == [0, 2, 1, 0, 2, 1]
+        assert np.array_equal(samples[2]["keypoints3D"], ds._keypoints[4])
+        assert ds.max_running <= 3
+
+        ds.set_split("default")
+
+        async def consume_subset():
+            return [sample async for sample in ds.trainingset]
+
+        samples = asyncio.run(consume_subset())
+        assert [action for _, action in samples] == [0, 2, 1, 0, 2, 1]
+
+    def test_aiterate_early_stop(self):
+        ds = CountingToyDataset(length=100, delay=0.01)
+        ds.set_cols("keypoints3D")
+
+        async def consume():
+            with ThreadPoolExecutor(1) as executor:
+                async for sample in ds.aiterate(executor=executor,
+                                                max_concurrency=4):
+                    break
+
+        asyncio.run(consume())
+        assert ds.loaded < 10
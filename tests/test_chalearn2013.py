@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+from scipy.io import savemat
+
+from datasetloader import ChaLearn2013, chalearn2013, registry
+
+
+def _write_sample(data_path, subset, sample_id, num_frames, labels, rng):
+    """
+    Write the data file of a sample with random skeletons and the given
+    labels (gesture name, begin frame, end frame), returning the skeletons.
+    """
+    sample = "Sample" + str(sample_id).zfill(5)
+    sample_dir = os.path.join(data_path, subset + "data", sample)
+    os.makedirs(sample_dir)
+    frames = np.empty((1, num_frames), dtype=[("Skeleton", "O")])
+    keypoints3D = rng.normal(size=(num_frames, 20, 3))
+    keypoints2D = rng.integers(0, 640, size=(num_frames, 20, 2)).astype(float)
+    for frame in range(num_frames):
+        frames[0, frame]["Skeleton"] = {
+            "WorldPosition": keypoints3D[frame],
+            "WorldRotation": np.zeros((20, 4)),
+            "JointType": np.array(["HipCenter"] * 20, dtype=object),
+            "PixelPosition": keypoints2D[frame]
+        }
+    gestures = np.empty((1, len(labels)),
+                        dtype=[("Name", "O"), ("Begin", "O"), ("End", "O")])
+    for i, label in enumerate(labels):
+        gestures[0, i] = label
+    savemat(
+        os.path.join(sample_dir, sample + "_data.mat"), {
+            "Video": {
+                "NumFrames": num_frames,
+                "FrameRate": 20,
+                "Frames": frames,
+                "Labels": gestures
+            }
+        })
+    return keypoints2D, keypoints3D
+
+
+class TestChaLearn2013():
+    def test_load_datafile(self, tmp_path, monkeypatch):
+        registry.clear()
+        rng = np.random.default_rng(0)
+        data_path = str(tmp_path / "chalearn")
+        keypoints2D, keypoints3D = _write_sample(data_path, "training", 1, 6,
+                                                 [("ok", 1, 3),
+                                                  ("vattene", 4, 6)], rng)
+        _write_sample(data_path, "training", 223, 2, [], rng)
+        _write_sample(data_path, "validation", 471, 3, [("basta", 1, 2)], rng)
+        cache_dir = str(tmp_path / "cache")
+
+        for ds in (ChaLearn2013(data_path),
+                   ChaLearn2013(data_path, cache_dir=cache_dir)):
+            assert len(ds) == 2
+            assert ds.get_split("default", "train") == [0]
+            assert ds.get_split("default", "valid") == [1]
+            for col in ("keypoints2D", "keypoints3D", "actions"):
+                ds.select_col(col)
+            # the second pass reads the cached sample
+            for _ in range(2):
+                sample = ds[0]
+                assert np.array_equal(sample["keypoints2D"], keypoints2D)
+                assert np.array_equal(sample["keypoints3D"], keypoints3D)
+                assert np.array_equal(sample["actions"],
+                                      [[10, 1, 3], [0, 4, 6]])
+            assert np.array_equal(ds[1]["actions"], [[12, 1, 2]])
+            ds.deselect_col("keypoints2D")
+            assert "keypoints2D" not in ds[0]
+        cache_folder = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+        assert sorted(os.listdir(cache_folder)) == [
+            "sample_Sample00001.npz", "sample_Sample00471.npz"
+        ]
+
+        def fail(filename):
+            raise Exception("Data file parsed again")
+
+        monkeypatch.setattr(chalearn2013, "loadmat", fail)
+        ds = ChaLearn2013(data_path, cache_dir=cache_dir)
+        ds.select_col("keypoints3D")
+        assert np.array_equal(ds[0]["keypoints3D"], keypoints3D)
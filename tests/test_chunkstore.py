@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+
+from datasetloader.chunkstore import export_chunkstore, ChunkStoreDataset
+
+from .toydataset import ToyDataset
+
+
+class TestChunkStore():
+    def test_export_chunkstore(self, tmp_path):
+        ds = ToyDataset(length=7, num_frames=50, broken=(3, ))
+        path = str(tmp_path / "store")
+        export_chunkstore(ds,
+                          path, ["keypoints3D", "action"],
+                          chunk_frames=16,
+                          num_workers=2)
+
+        store = ChunkStoreDataset(path)
+        assert len(store) == 7
+        assert store.landmarks == ToyDataset.landmarks
+        assert store.get_split("default", "test") == [1, 3, 5]
+        assert store.num_frames("keypoints3D")[3] == -1
+        store.set_cols("keypoints3D", "action")
+        for i, sample in enumerate(store.iterate()):
+            if i == 3:
+                assert sample["keypoints3D"] is None
+            else:
+                assert np.array_equal(sample["keypoints3D"], ds._keypoints[i])
+            assert sample["action"] == i % 3
+        for start, stop in ((0, 50), (10, 20), (15, 33), (-5, None), (40, 30)):
+            assert np.array_equal(
+                store.load_frames("keypoints3D", 2, start, stop),
+                ds._keypoints[2][start:stop])
+
+    def test_export_chunkstore_encoded(self, tmp_path):
+        ds = ToyDataset(length=3, num_frames=40)
+        path = str(tmp_path / "store")
+        report = export_chunkstore(ds,
+                                   path, ["keypoints3D"],
+                                   chunk_frames=8,
+                                   codec="lzma",
+                                   encodings={"keypoints3D": "int16"})
+        max_error = report["keypoints3D"]["max_error"]
+        assert max_error <= report["keypoints3D"]["error_bound"]
+
+        store = ChunkStoreDataset(path)
+        frames = store.load_frames("keypoints3D", 1, 5, 20)
+        assert frames.dtype == np.float64
+        assert np.abs(frames - ds._keypoints[1][5:20]).max() <= max_error
+
+    def test_export_chunkstore_level(self, tmp_path):
+        ds = ToyDataset(length=3, num_frames=50)
+        sizes = {}
+        for level in (0, None):
+            path = str(tmp_path / str(level))
+            export_chunkstore(ds, path, ["keypoints3D"], level=level)
+            sizes[level] = sum(
+                os.path.getsize(os.path.join(root, filename))
+                for root, _, filenames in os.walk(path)
+                for filename in filenames)
+            store = ChunkStoreDataset(path)
+            store.set_cols("keypoints3D")
+            assert np.array_equal(store[1]["keypoints3D"], ds._keypoints[1])
+        # level 0 stores the chunks uncompressed instead of the default level
+        assert sizes[0] > sizes[None]
+
+    def test_export_chunkstore_workers(self, tmp_path):
+        ds = ToyDataset(length=30, num_frames=20)
+        reports = [
+            export_chunkstore(ds,
+                              str(tmp_path / (encoding + str(num_workers))),
+                              ["keypoints3D"],
+                              encodings={"keypoints3D": encoding},
+                              num_workers=num_workers)["keypoints3D"]
+            for encoding in ("int16", "float16") for num_workers in (0, 4)
+        ]
+        # errors are recorded on the main thread in sample order
+        assert reports[0] == reports[1]
+        assert reports[2] == reports[3]
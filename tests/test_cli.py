@@ -0,0 +1,93 @@
+import os
+import json
+import argparse
+
+import numpy as np
+
+from datasetloader import NTURGBD, registry
+from datasetloader.cache import cache_key
+from datasetloader.cli import main, _add_dataset_args
+
+from .test_manifest import _make_ntu, _age
+from .test_nturgbd import _write_skeleton
+
+
+def _run(capsys, *argv):
+    assert main(list(argv)) == 0
+    return json.loads(capsys.readouterr().out)
+
+
+class TestCLI():
+    def test_commands(self, tmp_path, capsys):
+        registry.clear()
+        data_path = str(tmp_path / "ntu")
+        cache_dir = str(tmp_path / "cache")
+        skeleton_dir = _make_ntu(data_path, [])
+        rng = np.random.default_rng(0)
+        keypoints = rng.normal(size=(3, 1, 5, 25, 3)).round(4)
+        # the third sample belongs to the cross-subject test set
+        for i in range(3):
+            _write_skeleton(
+                os.path.join(
+                    skeleton_dir, "S00" + str(i + 1) + "C001P00" + str(i + 1) +
+                    "R001A001.skeleton"), keypoints[i])
+        # a sample without any skeleton data
+        with open(os.path.join(skeleton_dir, "S001C001P004R001A001.skeleton"),
+                  "w") as f:
+            f.write("0\n")
+        _age(skeleton_dir)
+        dataset_args = ["NTURGBD", "-p", data_path, "--cache_dir", cache_dir]
+
+        result = _run(capsys, "cache", *dataset_args, "--cols", "keypoints3D",
+                      "--stats_cols", "keypoints3D", "--num_workers", "2")
+        assert result["length"] == 4
+        assert result["num_invalid"] == 1
+        assert "NTURGBD.scan" in result["phases"]
+        cache_folder = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+        cache_files = os.listdir(cache_folder)
+        assert "manifest.json" in cache_files
+        assert "validity.json" in cache_files
+        # the invalid sample is excluded from the statistics
+        assert result["stats"]["keypoints3D"]["count"] == 15
+        assert np.allclose(result["stats"]["keypoints3D"]["mean"],
+                           keypoints.reshape(-1, 25, 3).mean(axis=0))
+
+        result = _run(capsys, "stats", *dataset_args, "--stats_cols",
+                      "keypoints3D", "--subset", "test")
+        assert result["stats"]["keypoints3D"]["count"] == 5
+
+        output = str(tmp_path / "packed")
+        result = _run(capsys, "pack", *dataset_args, "-o", output, "--cols",
+                      "keypoints3D", "action")
+        assert not result["skipped"]
+        assert not os.path.exists(output + ".partial")
+        result = _run(capsys, "pack", *dataset_args, "-o", output)
+        assert result["skipped"]
+
+        result = _run(capsys, "benchmark", "ChunkStoreDataset", "-p", output,
+                      "--num_workers", "2")
+        assert result["num_samples"] == 3
+        assert result["cols"] == ["keypoints3D", "action"]
+        assert len(result["pass_times"]) == 1
+
+    def test_cache_key(self, tmp_path):
+        registry.clear()
+        data_path = str(tmp_path / "ntu")
+        _make_ntu(data_path, ["S001C001P001R001A001.skeleton"])
+        parser = argparse.ArgumentParser()
+        dataset_args = _add_dataset_args(parser, NTURGBD)
+        parser.add_argument("--num_workers", type=int, default=0)
+        args = parser.parse_args(["-p", data_path])
+        cli_loader = NTURGBD(
+            **{arg: getattr(args, arg)
+               for arg in dataset_args})
+        plain = NTURGBD(data_path, select_actions=None)
+        assert cache_key(cli_loader) == cache_key(plain)
+        assert cli_loader._data is plain._data
+        # explicit defaults and keyword arguments the constructors don't take
+        assert cache_key(NTURGBD(**vars(args))) == cache_key(plain)
+        assert cache_key(
+            NTURGBD(data_path=data_path, select_actions=None,
+                    ntu120=False)) == cache_key(plain)
+        assert cache_key(NTURGBD(data_path, select_actions=None,
+                                 num_actors=2)) != cache_key(plain)
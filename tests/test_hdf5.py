@@ -0,0 +1,64 @@
+import os.path
+
+import numpy as np
+
+from datasetloader.encoding import encode, decode
+from datasetloader.hdf5 import export_hdf5, HDF5Dataset
+
+from .toydataset import ToyDataset
+
+
+class TestHDF5():
+    def test_export_hdf5(self, tmp_path):
+        ds = ToyDataset(length=15, broken=(4, ))
+        filename = os.path.join(tmp_path, "toy.h5")
+        export_hdf5(ds,
+                    filename, ["keypoints3D", "action"],
+                    splits=[("default", "train")],
+                    num_workers=2)
+
+        h5_ds = HDF5Dataset(filename)
+        assert len(h5_ds) == 8
+        assert h5_ds.landmarks == ToyDataset.landmarks
+        assert h5_ds.splits == ["default"]
+        assert h5_ds.get_split("default", "train") == list(range(8))
+        assert np.array_equal(h5_ds.source_indices, np.arange(0, 15, 2))
+        h5_ds.set_cols("keypoints3D", "action")
+        assert h5_ds[2]["keypoints3D"] is None
+        for i, sample in enumerate(h5_ds.iterate()):
+            if i != 2:
+                assert np.array_equal(sample["keypoints3D"],
+                                      ds._keypoints[2 * i])
+            assert sample["action"] == (2 * i) % 3
+        h5_ds.close()
+
+    def test_export_hdf5_encoded(self, tmp_path):
+        ds = ToyDataset(length=6)
+        for encoding in ("int16", "float16"):
+            filename = os.path.join(tmp_path, encoding + ".h5")
+            report = export_hdf5(ds,
+                                 filename, ["keypoints3D"],
+                                 encodings={"keypoints3D": encoding})
+            assert report["keypoints3D"]["encoding"] == encoding
+            max_error = report["keypoints3D"]["max_error"]
+            assert max_error <= report["keypoints3D"]["error_bound"]
+
+            h5_ds = HDF5Dataset(filename)
+            h5_ds.set_cols("keypoints3D")
+            for i in range(len(ds)):
+                keypoints = h5_ds[i]["keypoints3D"]
+                assert keypoints.dtype == np.float64
+                assert keypoints.shape == ds._keypoints[i].shape
+                assert np.abs(keypoints -
+                              ds._keypoints[i]).max() <= max_error
+            h5_ds.close()
+
+    def test_int16_nan(self):
+        values = np.random.default_rng(0).random((10, 4, 3))
+        values[2, 1, 0] = np.nan
+        values[:, :, 2] = np.nan
+        encoded, scale, offset = encode(values, "int16")
+        decoded = decode(encoded, "int16", scale, offset)
+        # a missing value neither spreads nor widens the range of its channel
+        assert np.array_equal(np.isnan(decoded), np.isnan(values))
+        assert np.nanmax(np.abs(decoded - values)) <= scale[:2].max() / 2
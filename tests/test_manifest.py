@@ -0,0 +1,82 @@
+import os
+import time
+
+from datasetloader import NTURGBD, registry
+
+
+def _touch(folder, filename):
+    with open(os.path.join(folder, filename), "w") as f:
+        f.write("0\n")
+
+
+def _make_ntu(data_path, filenames):
+    skeleton_dir = os.path.join(data_path, "nturgb+d_skeletons")
+    os.makedirs(skeleton_dir)
+    with open(
+            os.path.join(data_path,
+                         "NTU_RGBD_samples_with_missing_skeletons.txt"),
+            "w") as f:
+        f.write("\n\n\nS001C001P001R001A003\n")
+    for filename in filenames:
+        _touch(skeleton_dir, filename)
+    return skeleton_dir
+
+
+def _age(folder):
+    # make the directory look older than the modification time grace period
+    mtime = time.time() - 10
+    os.utime(folder, (mtime, mtime))
+
+
+class TestManifest():
+    def test_refresh(self, tmp_path):
+        data_path = str(tmp_path / "ntu")
+        cache_dir = str(tmp_path / "cache")
+        skeleton_dir = _make_ntu(data_path, [
+            "S001C001P001R001A001.skeleton", "S001C002P002R001A002.skeleton",
+            "S001C001P001R001A003.skeleton", "S018C001P001R001A001.skeleton"
+        ])
+        _age(skeleton_dir)
+        ds = NTURGBD(data_path, select_actions=None, cache_dir=cache_dir)
+        assert len(ds) == 2
+        filenames = [
+            os.path.basename(filename)
+            for filename in ds._data["keypoint-filename"]
+        ]
+        assert filenames == [
+            "S001C001P001R001A001.skeleton", "S001C002P002R001A002.skeleton"
+        ]
+
+        os.remove(os.path.join(skeleton_dir, "S001C001P001R001A001.skeleton"))
+        _touch(skeleton_dir, "S002C003P003R002A004.skeleton")
+        _touch(skeleton_dir, "S002C001P001R002A005.skeleton")
+        _age(skeleton_dir)
+        other = NTURGBD(data_path, select_actions=None, cache_dir=cache_dir)
+        changes = ds.refresh()
+        assert changes == {"added": [1, 2], "removed": [0], "modified": []}
+        assert len(ds) == 3
+        assert list(ds._data["action"]) == [1, 4, 3]
+        assert ds._splits["cross-subject"]["train"] == [0, 1, 2]
+        assert ds._splits["cross-subject"]["test"] == []
+        # objects sharing the previous state are not affected, new ones use
+        # the refreshed state
+        assert len(other) == 2
+        assert NTURGBD(data_path, select_actions=None)._data is ds._data
+
+        # a new object starts from the stored manifest, keeping the order
+        registry.clear()
+        ds = NTURGBD(data_path, select_actions=None, cache_dir=cache_dir)
+        assert list(ds._data["action"]) == [1, 4, 3]
+        assert ds.refresh() == {"added": [], "removed": [], "modified": []}
+
+    def test_refresh_modified(self, tmp_path):
+        data_path = str(tmp_path / "ntu")
+        skeleton_dir = _make_ntu(
+            data_path,
+            ["S001C001P001R001A001.skeleton", "S001C002P002R001A002.skeleton"])
+        ds = NTURGBD(data_path, select_actions=None)
+        ds.refresh(check_files=True)
+        with open(os.path.join(skeleton_dir, "S001C002P002R001A002.skeleton"),
+                  "a") as f:
+            f.write("1\n")
+        assert ds.refresh(check_files=True)["modified"] == [1]
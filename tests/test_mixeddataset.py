@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from datasetloader import MixedDataset
+
+from .toydataset import ToyDataset
+
+
+class TestMixedDataset():
+    def test_MixedDataset(self):
+        fast = ToyDataset(length=20, seed=0)
+        slow = ToyDataset(length=10, seed=1, delay=0.001)
+        for ds in (fast, slow):
+            ds.set_cols("keypoints3D", "action")
+        with MixedDataset([fast, slow], weights=[3, 1], seed=0,
+                          strict=True) as mixed:
+            assert len(mixed) == 30
+            assert np.array_equal(mixed[25]["keypoints3D"],
+                                  slow[5]["keypoints3D"])
+            sources = [
+                src for src, _ in mixed.iterate(num_samples=40,
+                                                return_source=True)
+            ]
+            # strict mode follows the weights exactly
+            assert sources.count(0) == 30
+            assert sources.count(1) == 10
+
+            batches = list(
+                mixed.iterate_batches(8, "default", "train", drop_last=True))
+            # 10 + 5 training samples
+            assert len(batches) == 1
+            assert batches[0]["keypoints3D"].shape == (8, 4, 5, 3)
+
+            batch = mixed.get_batch([0, 29], return_tuple=True)
+            assert batch[1].shape == (2, )
+
+    def test_settings(self):
+        datasets = [ToyDataset(length=5, seed=0), ToyDataset(length=5, seed=1)]
+        with pytest.raises(Exception):
+            MixedDataset(datasets, num_workers=0)
+        with pytest.raises(Exception):
+            MixedDataset(datasets, num_workers=[1, 0])
+        with pytest.raises(Exception):
+            MixedDataset(datasets, prefetch=0)
+        with MixedDataset(datasets, num_workers=1, prefetch=1) as mixed:
+            assert len(list(mixed.iterate(num_samples=7))) == 7
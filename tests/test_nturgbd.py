@@ -0,0 +1,201 @@
+import os
+
+import numpy as np
+
+from datasetloader import NTURGBD
+
+from .test_manifest import _make_ntu, _age
+
+
+def _write_skeleton(filename, keypoints):
+    """
+    Write an NTU RGB+D skeleton file of the given (bodies, frames, 25, 3)
+    keypoints. Bodies with NaN keypoints in a frame are left out of it.
+    """
+    num_bodies, num_frames = keypoints.shape[:2]
+    lines = [str(num_frames)]
+    for frame in range(num_frames):
+        bodies = [
+            body for body in range(num_bodies)
+            if not np.any(np.isnan(keypoints[body, frame]))
+        ]
+        lines.append(str(len(bodies)))
+        for body in bodies:
+            lines.append(
+                str(72057594037931101 + body) + " 0 1 1 1 1 0 0.1 -0.2 2")
+            lines.append("25")
+            for joint in keypoints[body, frame]:
+                lines.append(" ".join(str(float(val)) for val in joint) +
+                             " 270.5 190.2 1000.1 500.2 0.1 0.2 0.3 0.9 2")
+    with open(filename, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+class TestNTURGBD():
+    def test_load_keypointfile(self, tmp_path):
+        data_path = str(tmp_path / "ntu")
+        skeleton_dir = _make_ntu(data_path, [])
+        rng = np.random.default_rng(0)
+        keypoints = rng.normal(size=(2, 6, 25, 3)).round(4)
+        filename = os.path.join(skeleton_dir, "S001C002P003R001A004.skeleton")
+        _write_skeleton(filename, keypoints)
+        _age(skeleton_dir)
+        ds = NTURGBD(data_path, select_actions=None)
+        ds.select_col("keypoints3D")
+        assert np.array_equal(ds[0]["keypoints3D"], keypoints)
+
+        # a second person entering the scene later on
+        keypoints[1, :3] = np.nan
+        _write_skeleton(filename, keypoints)
+        keypoints[1, :3] = 0
+        assert np.array_equal(ds[0]["keypoints3D"], keypoints)
+
+    def test_load_all_keypoints(self, tmp_path):
+        data_path = str(tmp_path / "ntu")
+        skeleton_dir = _make_ntu(data_path, [])
+        rng = np.random.default_rng(1)
+        # full precision values parse to exactly the written floats
+        keypoints = rng.normal(size=(2, 4, 25, 3))
+        keypoints[0, 2] = np.nan
+        filename = os.path.join(skeleton_dir, "S001C002P003R001A004.skeleton")
+        _write_skeleton(filename, keypoints)
+        _age(skeleton_dir)
+        ds = NTURGBD(data_path, select_actions=None)
+        for col in ("keypoints3D", "keypoints2D", "keypoints_depth"):
+            ds.select_col(col)
+        sample = ds[0]
+        # the body of frame 2 is the first one in its frame
+        keypoints[0, 2] = keypoints[1, 2]
+        keypoints[1, 2] = 0
+        assert np.array_equal(sample["keypoints3D"], keypoints)
+        present = np.any(keypoints != 0, axis=-1)
+        assert sample["keypoints2D"].shape == (2, 4, 25, 2)
+        assert np.all(sample["keypoints2D"][present] == [1000.1, 500.2])
+        assert np.all(sample["keypoints_depth"][present] == [270.5, 190.2])
+        assert np.all(sample["keypoints2D"][~present] == 0)
+        # without cols the selected keypoints are returned as a list
+        ds.set_cols("keypoints_depth", "action", "keypoints3D")
+        keypoints3D, keypoints_depth = ds.load_keypointfile(filename)
+        assert np.array_equal(keypoints3D, keypoints)
+        assert np.array_equal(keypoints_depth, sample["keypoints_depth"])
+        assert list(ds.load_keypointfile(filename,
+                                         ["presence"])) == ["presence"]
+
+    def test_joint_and_body_cols(self, tmp_path):
+        data_path = str(tmp_path / "ntu")
+        skeleton_dir = _make_ntu(data_path, [])
+        keypoints = np.ones((2, 3, 25, 3))
+        keypoints[1, 0] = np.nan
+        filename = os.path.join(skeleton_dir, "S001C002P003R001A004.skeleton")
+        _write_skeleton(filename, keypoints)
+        _age(skeleton_dir)
+        ds = NTURGBD(data_path, select_actions=None)
+        for col in ("joint_orientation", "joint_tracking_state", "body_id",
+                    "hand_left_state", "lean", "body_tracking_state"):
+            ds.select_col(col)
+        sample = ds[0]
+        assert "keypoints3D" not in sample
+        assert sample["joint_orientation"].shape == (2, 3, 25, 4)
+        assert np.all(sample["joint_orientation"][0] == [0.1, 0.2, 0.3, 0.9])
+        assert sample["joint_tracking_state"].dtype == np.int8
+        assert np.all(sample["joint_tracking_state"][0] == 2)
+        # the body ids are exact despite exceeding float precision
+        assert sample["body_id"].dtype == np.int64
+        assert np.array_equal(sample["body_id"],
+                              [[72057594037931101] * 3,
+                               [0, 72057594037931102, 72057594037931102]])
+        assert np.all(sample["hand_left_state"][0] == 1)
+        assert np.all(sample["lean"][0] == [0.1, -0.2])
+        assert sample["lean"].shape == (2, 3, 2)
+        assert np.array_equal(sample["body_tracking_state"],
+                              [[2, 2, 2], [0, 2, 2]])
+
+    def test_filename_cols(self, tmp_path):
+        data_path = str(tmp_path / "ntu")
+        skeleton_dir = _make_ntu(data_path, [
+            "S001C001P001R001A003.skeleton", "S002C002P003R002A010.skeleton",
+            "S017C003P040R001A060.skeleton", "S018C001P001R001A061.skeleton",
+            "S002C00xP003R002A010.skeleton", "S002C002P003R002A010.avi"
+        ])
+        _age(skeleton_dir)
+        ds = NTURGBD(data_path, select_actions=None)
+        # the first sample is listed as missing, setup 18 belongs to NTU120
+        # and the last two aren't skeleton files
+        assert len(ds) == 2
+        assert ds._data["setup"] == [2, 17]
+        assert ds._data["camera"] == [2, 3]
+        assert ds._data["performer"] == [3, 40]
+        assert ds._data["replication"] == [2, 1]
+        assert ds._data["action"] == [9, 59]
+        assert ds.get_split("cross-subject", "train") == [0, 1]
+        assert ds.get_split("cross-view", "train") == [0, 1]
+        assert ds.get_split("cross-setup", "train") == [0]
+        assert ds.sample_indices(camera=3) == [1]
+        assert ds.sample_indices(setup=range(2, 33, 2),
+                                 performer=[1, 3]) == [0]
+
+        ds = NTURGBD(data_path,
+                     ntu120=True,
+                     include_missing_skeletons=True,
+                     select_actions=None)
+        assert ds._data["action"] == [2, 9, 59, 60]
+        assert ds.get_split("cross-subject", "train") == [0, 1, 2, 3]
+        assert ds.get_split("cross-view", "test") == []
+
+    def test_num_actors(self, tmp_path):
+        data_path = str(tmp_path / "ntu")
+        skeleton_dir = _make_ntu(data_path, [])
+        rng = np.random.default_rng(2)
+        keypoints = rng.normal(size=(3, 5, 25, 3)).round(4)
+        # body 0 barely moves, body 1 leaves after frame 1 and body 2 enters
+        # in frame 2, taking over the first position within these frames
+        keypoints[0] = keypoints[0, :1] + keypoints[0] * 0.01
+        keypoints[1] *= 2
+        keypoints[1, 2:] = np.nan
+        keypoints[2, :2] = np.nan
+        filename = os.path.join(skeleton_dir, "S001C002P003R001A004.skeleton")
+        _write_skeleton(filename, keypoints)
+        _age(skeleton_dir)
+        ds = NTURGBD(data_path, select_actions=None, num_actors=2)
+        for col in ("keypoints3D", "body_id", "lean", "presence"):
+            ds.select_col(col)
+        sample = ds[0]
+        assert sample["keypoints3D"].shape == (2, 5, 25, 3)
+        assert sample["keypoints3D"].dtype == np.float32
+        assert sample["lean"].dtype == np.float32
+        # the bodies are kept apart and the least moving one is dropped
+        assert np.array_equal(sample["presence"],
+                              [[True, True, False, False, False],
+                               [False, False, True, True, True]])
+        assert np.all(sample["body_id"][0, :2] == 72057594037931102)
+        assert np.all(sample["body_id"][1, 2:] == 72057594037931103)
+        assert np.array_equal(sample["keypoints3D"][0, :2],
+                              keypoints[1, :2].astype(np.float32))
+        assert np.array_equal(sample["keypoints3D"][1, 2:],
+                              keypoints[2, 2:].astype(np.float32))
+        assert np.all(sample["keypoints3D"][~sample["presence"]] == 0)
+
+        # more actors than bodies are padded
+        ds = NTURGBD(data_path, select_actions=None, num_actors=4)
+        ds.select_col("presence")
+        presence = ds[0]["presence"]
+        assert presence.shape == (4, 5)
+        assert np.array_equal(presence.sum(axis=1), [2, 3, 5, 0])
+
+    def test_actor_motion(self, tmp_path):
+        data_path = str(tmp_path / "ntu")
+        skeleton_dir = _make_ntu(data_path, [])
+        rng = np.random.default_rng(3)
+        keypoints = np.empty((2, 6, 25, 3))
+        # a large skeleton standing completely still
+        keypoints[0] = rng.normal(size=(25, 3)).round(4) * 5
+        # a small skeleton walking
+        keypoints[1] = (rng.normal(size=(25, 3)) * 0.2 +
+                        np.arange(6)[:, None, None] * [0.1, 0, 0.05]).round(4)
+        _write_skeleton(
+            os.path.join(skeleton_dir, "S001C002P003R001A004.skeleton"),
+            keypoints)
+        _age(skeleton_dir)
+        ds = NTURGBD(data_path, select_actions=None, num_actors=1)
+        ds.select_col("keypoints3D")
+        assert np.allclose(ds[0]["keypoints3D"][0], keypoints[1])
@@ -1,10 +1,37 @@
+import os
 import os.path
 
+import numpy as np
+
 from datasetloader import PKUMMD
 
 from . import DS_PATH
 
 
+def _make_pkummd(data_path, sequences, test_sequences=()):
+    """
+    Write a PKU-MMD folder structure with the given sequences, a dict of
+    sequence names to tuples of keypoints of shape (frames, 2, 25, 3) and a
+    list of label rows (one-based action id, start frame, end frame).
+    """
+    for folder in ("Label", "Split", os.path.join("Data", "SKELETON_VIDEO")):
+        os.makedirs(os.path.join(data_path, folder), exist_ok=True)
+    for name, (keypoints, labels) in sequences.items():
+        np.savetxt(os.path.join(data_path, "Data", "SKELETON_VIDEO",
+                                name + ".txt"),
+                   keypoints.reshape(len(keypoints), -1),
+                   fmt="%.6f")
+        with open(os.path.join(data_path, "Label", name + ".txt"), "w") as f:
+            for action, start, end in labels:
+                f.write(",".join(map(str, (action, start, end, 1))) + "\n")
+    train = [name for name in sequences if name not in test_sequences]
+    for split in PKUMMD.splits:
+        with open(os.path.join(data_path, "Split", split + ".txt"), "w") as f:
+            f.write("Training videos: \n" + ", ".join(train) + ", \n")
+            f.write("Validataion videos: \n" + ", ".join(test_sequences) +
+                    ", \n")
+
+
 class TestPKUMMD():
     def test_PKUMMD(self):
         pku = PKUMMD(os.path.join(DS_PATH, "pku-mmd"), load_skeletons=False)
@@ -23,3 +50,109 @@ class TestPKUMMD():
         assert action.shape[1:] == (3, )
         keypoints = pku.load_keypointfile(skeleton_file)
         assert keypoints[0].shape[1:] == (25, 3)
+
+    def test_load_keypointfile(self, tmp_path):
+        rng = np.random.default_rng(0)
+        single = rng.normal(size=(6, 2, 25, 3)).round(4)
+        single[:, 1] = 0
+        single[2] = 0
+        pair = rng.normal(size=(5, 2, 25, 3)).round(4)
+        pair[1, 1] = 0
+        data_path = str(tmp_path / "pku-mmd")
+        _make_pkummd(data_path, {
+            "0002-L": (single, [(1, 0, 5)]),
+            "0002-M": (pair, [(12, 0, 4)])
+        })
+
+        pku = PKUMMD(data_path)
+        assert np.allclose(
+            pku.load_keypointfile(pku._data["keypoint-filename"][0]), single)
+        pku = PKUMMD(data_path, single_person=True)
+        assert np.allclose(
+            pku.load_keypointfile(
+                os.path.join(data_path, "Data", "SKELETON_VIDEO",
+                             "0002-L.txt")), single[:, 0])
+        assert pku.load_keypointfile(
+            os.path.join(data_path, "Data", "SKELETON_VIDEO",
+                         "0002-M.txt")) is None
+
+        pku = PKUMMD(data_path, exclude_missing=True)
+        keypoints = pku.load_keypointfile(pku._data["keypoint-filename"][0])
+        assert keypoints.dtype == object
+        assert [len(frame) for frame in keypoints] == [1, 1, 0, 1, 1, 1]
+        assert np.allclose(keypoints[3][0], single[3, 0])
+        keypoints = pku.load_keypointfile(pku._data["keypoint-filename"][1])
+        assert [len(frame) for frame in keypoints] == [2, 1, 2, 2, 2]
+        assert np.allclose(keypoints[1][0], pair[1, 0])
+        single[2] = single[1]
+        _make_pkummd(data_path, {"0002-L": (single, [(1, 0, 5)])})
+        keypoints = pku.load_keypointfile(pku._data["keypoint-filename"][0])
+        assert keypoints.shape == (6, 1, 25, 3)
+        assert np.allclose(keypoints[:, 0], single[:, 0])
+
+    def test_segments(self, tmp_path):
+        rng = np.random.default_rng(1)
+        first = rng.normal(size=(10, 2, 25, 3)).round(4)
+        second = rng.normal(size=(8, 2, 25, 3)).round(4)
+        data_path = str(tmp_path / "pku-mmd")
+        _make_pkummd(data_path, {
+            "0002-L": (first, [(3, 5, 9), (1, 0, 4)]),
+            "0002-M": (second, [(12, 2, 6)])
+        },
+                     test_sequences=["0002-M"])
+        pku = PKUMMD(data_path, segments=True)
+        assert len(pku) == 3
+        assert pku.get_split("cross-subject", "train") == [0, 1]
+        assert pku.get_split("cross-view", "test") == [2]
+        for col in ("keypoints3D", "action", "segment"):
+            pku.select_col(col)
+        sample = pku[0]
+        assert sample["action"] == 0
+        assert np.array_equal(sample["segment"], [0, 4])
+        assert np.allclose(sample["keypoints3D"], first[0:5])
+        assert not sample["keypoints3D"].flags.writeable
+        other = pku[1]
+        assert other["action"] == 2
+        assert np.allclose(other["keypoints3D"], first[5:10])
+        # segments are views into the same parsed sequence
+        assert sample["keypoints3D"].base is other["keypoints3D"].base
+        assert np.allclose(pku[2]["keypoints3D"], second[2:7])
+
+    def test_labels(self, tmp_path):
+        keypoints = np.zeros((4, 2, 25, 3))
+        data_path = str(tmp_path / "pku-mmd")
+        # handshaking (14) and hugging (16) are interactions
+        _make_pkummd(data_path, {
+            "0002-L": (keypoints, [(3, 9, 5), (1, 0, 4)]),
+            "0002-M": (keypoints, [(14, 0, 2), (16, 3, 4)]),
+            "0002-R": (keypoints, [(14, 0, 2), (2, 3, 4)])
+        },
+                     test_sequences=["0002-R", "0002-L"])
+        pku = PKUMMD(data_path)
+        pku.select_col("actions")
+        assert np.array_equal(pku[0]["actions"], [[0, 0, 4], [2, 5, 9]])
+        assert pku.load_actionfile(
+            pku._data["action-filename"][0]) == [[0, 0, 4], [2, 5, 9]]
+        assert pku.get_split("cross-subject", "train") == [1]
+        assert pku.get_split("cross-subject", "test") == [2, 0]
+        assert pku.sample_indices(13) == [1, 2]
+        assert pku.sample_indices([0, 15]) == [0, 1]
+
+        pku = PKUMMD(data_path, single_person=True)
+        assert len(pku) == 2
+        assert pku._data["action-filename"][1].endswith("0002-R.txt")
+        assert pku.get_split("cross-view", "train") == []
+        assert pku.get_split("cross-view", "test") == [1, 0]
+        pku = PKUMMD(data_path, segments=True)
+        assert pku.sample_indices(13) == [2, 4]
+
+        assert pku.get_single_action_id(12) == 11
+        assert pku.get_single_action_id(13) is None
+        assert pku.get_single_action_id(14) == 12
+        assert pku.get_interaction_id(13) == 1
+        assert pku.get_interaction_id(0) is None
+        assert np.array_equal(pku.get_single_action_id(np.array([13, 14])),
+                              [-1, 12])
+        single_ids = [pku.get_single_action_id(i) for i in range(51)]
+        assert sorted(i for i in single_ids
+                      if i is not None) == list(range(43))
@@ -0,0 +1,70 @@
+import os
+
+from datasetloader.prefetch import prefetch_map, readahead, locality_order
+
+from .toydataset import ToyDataset
+
+
+class TestPrefetch():
+    def _make_files(self, tmp_path, num_files):
+        filenames = []
+        for directory in ("b", "a"):
+            os.makedirs(os.path.join(tmp_path, directory))
+            for i in range(num_files):
+                filename = os.path.join(tmp_path, directory, str(i) + ".txt")
+                with open(filename, "w") as f:
+                    f.write(str(i))
+                filenames.append(filename)
+        return filenames
+
+    def test_readahead(self, tmp_path):
+        filenames = self._make_files(tmp_path, 3)
+        keys = readahead(filenames + [os.path.join(tmp_path, "missing")])
+        assert len(keys) == 7
+        order = locality_order([[filename] for filename in filenames], keys)
+        # files in directory a first
+        assert [filenames[i] for i in order[:3]] == sorted(filenames[3:])
+
+    def test_prefetch_map_locality(self, tmp_path):
+        filenames = self._make_files(tmp_path, 4)
+        items = list(reversed(filenames))
+        for num_workers in (0, 2):
+            loaded = []
+
+            def load(filename):
+                loaded.append(filename)
+                with open(filename, "r") as f:
+                    return f.read()
+
+            results = list(
+                prefetch_map(load,
+                             items,
+                             num_workers=num_workers,
+                             window=4,
+                             files=lambda filename: [filename]))
+            # results in order of the items, loads sorted within each window
+            assert results == [
+                os.path.basename(filename)[0] for filename in items
+            ]
+            assert sorted(loaded[:4]) == sorted(items[:4])
+            if num_workers == 0:
+                assert loaded[:4] == sorted(items[:4])
+
+    def test_iterate_lazy(self, monkeypatch):
+        ds = ToyDataset()
+        loaded = []
+        get_item = ToyDataset.__getitem__
+
+        def load(self, index):
+            loaded.append(index)
+            return get_item(self, index)
+
+        monkeypatch.setattr(ToyDataset, "__getitem__", load)
+        # without workers samples are loaded one at a time
+        next(ds.iterate())
+        assert loaded == [0]
+        next(ds.iterate_batches(2))
+        assert loaded == [0, 0, 1]
+        loaded.clear()
+        next(ds.iterate(readahead=True))
+        assert len(loaded) > 1
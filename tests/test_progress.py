@@ -0,0 +1,64 @@
+import logging
+
+from datasetloader import NTURGBD, registry
+from datasetloader.progress import Progress, PhaseTimings
+
+from .test_manifest import _make_ntu, _age
+from .toydataset import ToyDataset
+
+
+class TestProgress():
+    def test_phases(self):
+        reports = []
+        progress = Progress(reports.append, "Test")
+        with progress.phase("read", 2) as phase:
+            for _ in phase.iterate(range(2)):
+                pass
+            phase.update(0, bytes_read=100)
+        assert [report["event"] for report in reports
+                ] == ["start", "update", "update", "update", "end"]
+        assert reports[-1]["phase"] == "Test.read"
+        assert reports[-1]["count"] == 2
+        assert reports[-1]["total"] == 2
+        assert reports[-1]["bytes_read"] == 100
+        assert reports[-1]["elapsed"] >= 0
+
+    def test_messages(self, caplog):
+        timings = PhaseTimings()
+        Progress(timings).message("broken file")
+        assert timings.messages == ["broken file"]
+        with caplog.at_level(logging.WARNING, logger="datasetloader"):
+            Progress().message("broken file")
+        assert "broken file" in caplog.text
+
+    def test_load(self):
+        timings = PhaseTimings()
+        ToyDataset(no_lazy_loading=True, progress=timings)
+        summary = timings.summary()
+        assert summary["ToyDataset.load"]["count"] == 10
+
+    def test_loader(self, tmp_path):
+        registry.clear()
+        data_path = str(tmp_path / "ntu")
+        skeleton_dir = _make_ntu(data_path, [
+            "S001C001P001R001A001.skeleton", "S001C002P002R001A002.skeleton"
+        ])
+        _age(skeleton_dir)
+        timings = PhaseTimings()
+        ds = NTURGBD(data_path, select_actions=None, progress=timings)
+        assert timings.summary()["NTURGBD.scan"]["count"] == 2
+        ds.select_col("keypoints3D")
+        ds[0]
+        assert len(timings.messages) == 1
+        assert timings.messages[0].startswith("Empty person array")
+
+        # the callback belongs to each loader, not the shared state
+        other_timings = PhaseTimings()
+        other = NTURGBD(data_path,
+                        select_actions=None,
+                        progress=other_timings)
+        assert other._shared is ds._shared
+        other.select_col("keypoints3D")
+        other[0]
+        assert len(timings.messages) == 1
+        assert len(other_timings.messages) == 1
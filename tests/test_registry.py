@@ -0,0 +1,39 @@
+import numpy as np
+from scipy.io import savemat
+
+from datasetloader import registry, LSP
+
+from .toydataset import ToyDataset
+
+
+class TestRegistry():
+    def test_shared_state(self):
+        registry.clear()
+        ds = ToyDataset(length=6, seed=3, broken=(1, ))
+        ds.set_cols("keypoints3D")
+        other = ToyDataset(length=6, seed=3, broken=(1, ), split="default")
+        assert other._data is ds._data
+        assert other._splits is ds._splits
+        assert other._selected_cols == []
+
+        other.set_cols("action")
+        assert ds._selected_cols == ["keypoints3D"]
+        ds.validate()
+        assert other.invalid_samples == {1: "No data in column 'keypoints3D'"}
+        assert other.trainingset._samples == [0, 2, 4]
+
+        assert ToyDataset(length=6, seed=4)._data is not ds._data
+        assert ToyDataset(length=6, seed=3, broken=(1, ),
+                          no_lazy_loading=True)._data is not ds._data
+        registry.clear()
+        assert ToyDataset(length=6, seed=3, broken=(1, ))._data is not ds._data
+
+    def test_not_lazy(self, tmp_path):
+        # LSP switches lazy loading off inside its constructor
+        registry.clear()
+        savemat(str(tmp_path / "joints.mat"),
+                {"joints": np.zeros((3, 14, 2000))})
+        lsp = LSP(str(tmp_path))
+        other = LSP(str(tmp_path))
+        assert other._data is not lsp._data
+        assert len(other) == 2000
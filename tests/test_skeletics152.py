@@ -0,0 +1,187 @@
+import os
+import json
+
+import numpy as np
+
+from datasetloader import Skeletics152, skeletics152
+
+
+def _write_sample(data_path, subset, action, filename, persons):
+    """
+    Write a keypoint file of the given persons, each a tuple of
+    (joints3d, frame_ids, pred_cam, bboxes).
+    """
+    folder = os.path.join(data_path, subset, action)
+    os.makedirs(folder, exist_ok=True)
+    data = {
+        str(person_id): {
+            "joints3d": joints3d.tolist(),
+            "frame_ids": frame_ids.tolist(),
+            "pred_cam": pred_cam.tolist(),
+            "bboxes": bboxes.tolist()
+        }
+        for person_id, (joints3d, frame_ids, pred_cam,
+                        bboxes) in enumerate(persons)
+    }
+    with open(os.path.join(folder, filename), "w") as f:
+        json.dump(data, f)
+
+
+def _random_person(rng, frame_ids):
+    num_frames = len(frame_ids)
+    return (rng.normal(size=(num_frames, 49, 3)), np.array(frame_ids),
+            np.abs(rng.normal(size=(num_frames, 3))) + 0.5,
+            rng.uniform(0, 100, size=(num_frames, 4)))
+
+
+def _reference_projection(joints3d, pred_cam):
+    # perspective projection with the rotation and camera intrinsics
+    # matrices, as in the VIBE implementation
+    translation = np.stack([
+        pred_cam[:, 1], pred_cam[:, 2], 2 * 5000. /
+        (224. * pred_cam[:, 0] + 1e-9)
+    ],
+                           axis=-1)
+    rotation = np.repeat(np.eye(3)[None], len(joints3d), 0)
+    intrinsics = np.zeros((len(joints3d), 3, 3))
+    intrinsics[:, 0, 0] = 5000.
+    intrinsics[:, 1, 1] = 5000.
+    intrinsics[:, 2, 2] = 1.
+    points = np.einsum('bij,bkj->bki', rotation, joints3d)
+    points = points + translation[:, None]
+    points = points / points[:, :, -1:]
+    points = np.einsum('bij,bkj->bki', intrinsics, points)
+    return points[:, :, :-1] / (224. / 2.)
+
+
+class TestSkeletics152():
+    def test_project_keypoints(self, tmp_path):
+        rng = np.random.default_rng(0)
+        persons = [_random_person(rng, range(5)) for _ in range(2)]
+        keypoints3D = np.array([person[0] for person in persons])
+        pred_cams = np.array([person[2] for person in persons])
+        reference = np.array([
+            _reference_projection(joints3d, pred_cam)
+            for joints3d, _, pred_cam, _ in persons
+        ])
+        assert np.array_equal(
+            Skeletics152.project_keypoints(keypoints3D, pred_cams), reference)
+        # a batch of samples
+        assert np.array_equal(
+            Skeletics152.project_keypoints(keypoints3D[None].repeat(3, 0),
+                                           pred_cams[None].repeat(3, 0)),
+            reference[None].repeat(3, 0))
+
+        data_path = str(tmp_path / "skeletics")
+        _write_sample(
+            data_path, "training", "tai chi", "abc_000000_000010.json",
+            [persons[0], _random_person(rng, range(2, 5))])
+        ds = Skeletics152(data_path, select_actions=None)
+        ds.select_col("keypoints2D")
+        keypoints2D = ds[0]["keypoints2D"]
+        assert np.allclose(keypoints2D[0], reference[0])
+        assert keypoints2D[1].shape == (3, 49, 2)
+
+    def test_load_keypointfile(self, tmp_path, monkeypatch):
+        rng = np.random.default_rng(1)
+        data_path = str(tmp_path / "skeletics")
+        persons = [_random_person(rng, range(5)) for _ in range(2)]
+        _write_sample(data_path, "training", "tai chi",
+                      "abc_000000_000010.json", persons)
+        ragged = [persons[0], _random_person(rng, range(1, 4))]
+        _write_sample(data_path, "validation", "tai chi",
+                      "def_000000_000010.json", ragged)
+        _write_sample(data_path, "validation", "tai chi",
+                      "ghi_000000_000010.json", [])
+        folder = os.path.join(data_path, "validation", "squat")
+        os.makedirs(folder)
+        with open(os.path.join(folder, "jkl_000000_000010.json"), "w") as f:
+            f.write("{")
+        ds = Skeletics152(data_path, select_actions=None)
+        for col in ("keypoints3D", "frame_ids", "pred_cams", "bboxes"):
+            ds.select_col(col)
+
+        for json_backend in (skeletics152.orjson, None):
+            monkeypatch.setattr(skeletics152, "orjson", json_backend)
+            sample = ds[0]
+            assert sample["keypoints3D"].dtype == np.float32
+            assert sample["keypoints3D"].shape == (2, 5, 49, 3)
+            assert np.allclose(sample["keypoints3D"],
+                               [person[0] for person in persons])
+            assert np.array_equal(sample["frame_ids"], [range(5), range(5)])
+            assert np.allclose(sample["bboxes"],
+                               [person[3] for person in persons])
+        # persons of differing lengths are views into a single buffer
+        sample = ds[1]
+        assert sample["keypoints3D"].dtype == object
+        assert np.array_equal(sample["frame_ids"][1], [1, 2, 3])
+        assert np.allclose(sample["pred_cams"][1], ragged[1][2])
+        assert (sample["keypoints3D"][0].base is
+                sample["keypoints3D"][1].base)
+        assert ds[2]["keypoints3D"] is None
+        assert ds[3]["keypoints3D"] is None
+
+        store = str(tmp_path / "store")
+        skeletics152.export_binary(ds, store)
+        binary = Skeletics152(data_path,
+                              binary_store=store,
+                              select_actions=None)
+        for col in ("keypoints3D", "frame_ids", "pred_cams", "bboxes"):
+            binary.select_col(col)
+        for index in range(4):
+            expected = ds[index]
+            sample = binary[index]
+            for col in expected:
+                if expected[col] is None:
+                    assert sample[col] is None
+                elif expected[col].dtype == object:
+                    for person, expected_person in zip(
+                            sample[col], expected[col]):
+                        assert np.array_equal(person, expected_person)
+                else:
+                    assert isinstance(sample[col], np.memmap)
+                    assert np.array_equal(sample[col], expected[col])
+
+    def test_timeline(self, tmp_path):
+        rng = np.random.default_rng(2)
+        data_path = str(tmp_path / "skeletics")
+        persons = [
+            _random_person(rng, range(1, 4)),
+            _random_person(rng, [0, 2, 5])
+        ]
+        _write_sample(data_path, "training", "tai chi",
+                      "abc_000000_000010.json", persons)
+        _write_sample(data_path, "training", "tai chi",
+                      "def_000000_000010.json", [])
+        ds = Skeletics152(data_path, select_actions=None)
+        ds.select_col("keypoints3D-timeline")
+        ds.select_col("presence")
+        sample = ds[0]
+        assert sample["keypoints3D-timeline"].shape == (2, 6, 49, 3)
+        assert np.array_equal(sample["presence"],
+                              [[False, True, True, True, False, False],
+                               [True, False, True, False, False, True]])
+        for person_id, (joints3d, frame_ids, _, _) in enumerate(persons):
+            assert np.allclose(
+                sample["keypoints3D-timeline"][person_id, frame_ids], joints3d)
+        assert np.all(sample["keypoints3D-timeline"][~sample["presence"]] == 0)
+        assert ds[1]["keypoints3D-timeline"] is None
+        assert ds[1]["presence"] is None
+
+    def test_validate(self, tmp_path):
+        rng = np.random.default_rng(3)
+        data_path = str(tmp_path / "skeletics")
+        for filename in ("abc_000000_000010.json", "def_000000_000010.json",
+                         "ghi_000000_000010.json"):
+            _write_sample(data_path, "training", "tai chi", filename,
+                          [_random_person(rng, range(3))])
+        ds = Skeletics152(data_path, select_actions=None)
+        folder = os.path.join(data_path, "training", "tai chi")
+        with open(os.path.join(folder, "def_000000_000010.json"), "w") as f:
+            f.write("{")
+        # a file removed after the scan doesn't stop the validation
+        os.remove(os.path.join(folder, "abc_000000_000010.json"))
+        invalid = ds.validate()
+        assert sorted(invalid) == [0, 1]
+        assert invalid[0].startswith("FileNotFoundError")
+        assert invalid[1].startswith("Json decoder error")
@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pytest
+
+from datasetloader.statistics import compute_stats
+
+from .toydataset import ToyDataset
+
+
+class TestStatistics():
+    def test_compute_stats(self, tmp_path):
+        ds = ToyDataset(length=37, cache_dir=str(tmp_path))
+        stats = ds.compute_stats("keypoints3D", "default", "train",
+                                 num_workers=3)["keypoints3D"]
+        points = ds._keypoints[ds.get_split("default", "train")]
+        points = points.reshape(-1, 5, 3)
+        assert stats["count"] == points.shape[0]
+        assert np.allclose(stats["mean"], points.mean(axis=0))
+        assert np.allclose(stats["std"], points.std(axis=0))
+        assert np.array_equal(stats["min"], points.min(axis=0))
+        assert np.allclose(stats["channel_std"],
+                           points.reshape(-1, 3).std(axis=0))
+        assert stats["sample_max"].shape == (19, 3)
+        assert np.array_equal(stats["sample_max"][1],
+                              ds._keypoints[2].max(axis=(0, 1)))
+        # the selection of the dataset is left untouched
+        assert ds._selected_cols == []
+
+        # second call is served from the cache
+        cache_files = os.listdir(os.path.join(tmp_path,
+                                              os.listdir(tmp_path)[0]))
+        assert len(cache_files) == 1
+        ds._keypoints[:] = 0
+        cached = ds.compute_stats("keypoints3D", "default",
+                                  "train")["keypoints3D"]
+        assert cached["count"] == stats["count"]
+        assert np.array_equal(cached["mean"], stats["mean"])
+
+    def test_selection_unchanged(self, monkeypatch):
+        ds = ToyDataset(length=6)
+        ds.set_cols("action")
+        seen = []
+        getitem = ToyDataset.__getitem__
+
+        def load(self, index):
+            # what a concurrent reader of ds gets meanwhile
+            seen.append(list(ds._selected_cols))
+            return getitem(self, index)
+
+        monkeypatch.setattr(ToyDataset, "__getitem__", load)
+        compute_stats(ds, "keypoints3D", num_workers=2)
+        ds.validate(cols=["keypoints3D"])
+        assert seen == [["action"]] * 12
+
+    def test_resume(self, tmp_path):
+        ds = ToyDataset(length=20, cache_dir=str(tmp_path))
+        ds._interrupt_at = 9
+        with pytest.raises(KeyboardInterrupt):
+            compute_stats(ds, "keypoints3D", chunk_size=2)
+        # continues after the last completed chunk, loading sample 3 again
+        # would raise
+        ds._interrupt_at = 3
+        stats = compute_stats(ds, "keypoints3D", chunk_size=2)["keypoints3D"]
+        points = ds._keypoints.reshape(-1, 5, 3)
+        assert stats["count"] == points.shape[0]
+        assert np.allclose(stats["mean"], points.mean(axis=0))
+        assert np.allclose(stats["std"], points.std(axis=0))
+        assert np.array_equal(stats["sample_max"][12],
+                              ds._keypoints[12].max(axis=(0, 1)))
+        cache_folder = os.path.join(tmp_path, os.listdir(tmp_path)[0])
+        assert len(os.listdir(cache_folder)) == 1
@@ -0,0 +1,92 @@
+import numpy as np
+
+from datasetloader import NTURGBD, Skeletics152
+from datasetloader.transforms import (flip_permutation, Compose, RootCentre,
+                                      ScaleNormalise, RandomRotation,
+                                      RandomFlip, JointDropout)
+
+from .toydataset import ToyDataset
+
+
+class TestTransforms():
+    def test_flip_permutation(self):
+        perm = flip_permutation(NTURGBD.landmarks)
+        assert NTURGBD.landmarks[perm[4]] == "right shoulder"
+        assert perm[0] == 0
+        assert np.array_equal(perm[perm], np.arange(len(perm)))
+        perm = flip_permutation(Skeletics152.landmarks)
+        assert Skeletics152.landmarks[perm[25]] == "lankle"
+        assert Skeletics152.landmarks[perm[45]] == "reye"
+        assert perm[37] == 37
+        assert np.array_equal(perm[perm], np.arange(len(perm)))
+
+    def test_batch_transforms(self):
+        ds = ToyDataset(length=8)
+        ds.set_cols("keypoints3D", "action")
+        transform = Compose([
+            RootCentre(),
+            RandomRotation(seed=0),
+            RandomFlip(ToyDataset.landmarks, p=1.0),
+        ])
+        batch = ds.get_batch(range(8), transform=transform)
+        keypoints = ds._keypoints - ds._keypoints[:, :, 0:1]
+        assert np.allclose(batch["keypoints3D"][:, :, 0], 0)
+        # rotation around the y axis and mirroring keep lengths and heights
+        assert np.allclose(np.linalg.norm(batch["keypoints3D"], axis=-1),
+                           np.linalg.norm(keypoints[:, :, [0, 3, 4, 1, 2]],
+                                          axis=-1))
+        assert np.allclose(batch["keypoints3D"][..., 1],
+                           keypoints[:, :, [0, 3, 4, 1, 2], 1])
+
+        batches = list(
+            ds.iterate_batches(3,
+                               num_workers=2,
+                               transform=JointDropout(p=1.0, seed=0)))
+        assert np.all(batches[0]["keypoints3D"] == 0)
+        sample = next(ds.iterate(transform=JointDropout(p=1.0)))
+        assert sample["keypoints3D"].shape == (4, 5, 3)
+        assert np.all(sample["keypoints3D"] == 0)
+
+    def test_root_centre(self):
+        sequences = np.arange(2 * 4 * 5 * 3,
+                              dtype=np.float64).reshape(2, 4, 5, 3)
+        centred = RootCentre(per_frame=False)({"keypoints3D": sequences})
+        assert np.array_equal(centred["keypoints3D"],
+                              sequences - sequences[:, :1, :1])
+        # batch of images without a frame axis, each centred on its own root
+        images = sequences[:, 0]
+        centred = RootCentre(per_frame=False)({"keypoints2D": images})
+        assert np.array_equal(centred["keypoints2D"], images - images[:, :1])
+        # persons of an image are no frames
+        persons = np.empty(2, dtype=object)
+        persons[0] = sequences[0, :2]
+        persons[1] = sequences[1, :3]
+        transform = RootCentre(per_frame=False, frame_axis=None)
+        centred = transform({"keypoints2D": persons})
+        for sample, centred_sample in zip(persons, centred["keypoints2D"]):
+            assert np.array_equal(centred_sample, sample - sample[:, :1])
+
+    def test_scale_normalise(self):
+        # MPII style: varying number of persons per image, one scale and
+        # centre per person, visibility as third channel
+        keypoints = np.empty(2, dtype=object)
+        keypoints[0] = np.ones((1, 16, 3))
+        keypoints[1] = np.full((2, 16, 3), 3.0)
+        scales = np.empty(2, dtype=object)
+        scales[0] = np.array([2.0])
+        scales[1] = np.array([1.0, 4.0])
+        centres = np.empty(2, dtype=object)
+        centres[0] = np.array([[1.0, 0.0]])
+        centres[1] = np.array([[1.0, 1.0], [2.0, 2.0]])
+        batch = {
+            "keypoints2D": keypoints,
+            "scale": scales,
+            "centre": centres
+        }
+        batch = ScaleNormalise("scale",
+                               "centre",
+                               reference_scale=2,
+                               channels=2)(batch)
+        assert np.allclose(batch["keypoints2D"][0][0, 0], [0, 1, 1])
+        assert np.allclose(batch["keypoints2D"][1][:, 0],
+                           [[1, 1, 3], [2, 2, 3]])
@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+from datasetloader.validity import validate, load_validity
+
+from .toydataset import ToyDataset
+
+
+class TestValidity():
+    def test_validate(self, tmp_path):
+        ds = ToyDataset(length=20, broken=(3, 4), cache_dir=str(tmp_path))
+        invalid = ds.validate(num_workers=2)
+        assert sorted(invalid.keys()) == [3, 4]
+        assert 4 not in ds.get_split("default", "train")
+
+        # The validity index is picked up by new dataset objects
+        ds = ToyDataset(length=20, broken=(3, 4), cache_dir=str(tmp_path))
+        assert sorted(ds.invalid_samples.keys()) == [3, 4]
+        assert len(ds.get_split("default", "test")) == 9
+        assert len(list(ds.iterate())) == 18
+        ds = ToyDataset(length=20,
+                        broken=(3, 4),
+                        cache_dir=str(tmp_path),
+                        keep_invalid=True)
+        assert len(ds.get_split("default", "test")) == 10
+
+    def test_resume(self, tmp_path):
+        ds = ToyDataset(length=20, broken=(3, 12), cache_dir=str(tmp_path))
+        ds._interrupt_at = 9
+        with pytest.raises(KeyboardInterrupt):
+            validate(ds, chunk_size=2)
+        assert load_validity(ds) is None
+        # continues after the last completed chunk, loading sample 3 again
+        # would raise
+        ds._interrupt_at = 3
+        invalid = validate(ds, chunk_size=2)
+        assert sorted(invalid.keys()) == [3, 12]
+        assert sorted(load_validity(ds).keys()) == [3, 12]
+        cache_folder = os.path.join(tmp_path, os.listdir(tmp_path)[0])
+        assert os.listdir(cache_folder) == ["validity.json"]
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from datasetloader.profiling import memory_profile
+from datasetloader.views import readonly
+
+from .toydataset import ToyDataset
+
+
+class TestViews():
+    def test_readonly(self):
+        values = np.arange(6.0)
+        view = readonly(values)
+        assert not view.flags.writeable
+        assert np.shares_memory(view, values)
+        with pytest.raises(ValueError):
+            view[0] = 1
+        # the owner can still modify the array
+        values[0] = 1
+        assert view[0] == 1
+        assert readonly(5) == 5
+
+    def test_loaded_columns(self):
+        ds = ToyDataset()
+        # an array column held in memory by the dataset
+        ds._data_cols.append("centre")
+        ds._data["centre"] = np.zeros((len(ds), 2))
+        ds.select_col("centre")
+        centre = ds[3]["centre"]
+        assert not centre.flags.writeable
+        with pytest.raises(ValueError):
+            centre += 1
+        assert np.all(ds._data["centre"] == 0)
+
+    def test_memory_profile(self):
+        ds = ToyDataset(num_frames=100)
+        profile = memory_profile(ds, range(4), cols=["keypoints3D"])
+        assert profile["samples"] == 4
+        assert profile["output_bytes"] == ds._keypoints[0].nbytes
+        # samples are views into the keypoints held by the dataset
+        assert profile["copy_factor"] < 0.5
+        assert ds._selected_cols == []
@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+
+from datasetloader.datasetloader import DatasetLoader
+
+
+class ToyDataset(DatasetLoader):
+    """
+    Small in-memory dataset of random skeleton sequences for tests which
+    don't need any data on disk.
+    """
+    landmarks = [
+        "pelvis", "left hip", "left knee", "right hip", "right knee"
+    ]
+    splits = ["default"]
+
+    def __init__(self,
+                 length=10,
+                 num_frames=4,
+                 delay=0,
+                 seed=0,
+                 broken=(),
+                 **kwargs):
+        self._data_cols = ["keypoints3D", "action"]
+        rng = np.random.default_rng(seed)
+        self._data = {
+            "action": np.arange(length) % 3,
+        }
+        self._keypoints = rng.normal(size=(length, num_frames,
+                                           len(self.landmarks), 3))
+        self._splits = {
+            "default": {
+                "train": list(range(0, length, 2)),
+                "test": list(range(1, length, 2))
+            }
+        }
+        self._length = length
+        self._delay = delay
+        # samples whose keypoints fail to load
+        self._broken = broken
+        # loading this sample raises KeyboardInterrupt, simulating an
+        # interrupted run (set after construction, not part of the cache key)
+        self._interrupt_at = None
+        super().__init__(**kwargs)
+
+    def __getitem__(self, index):
+        data = super().__getitem__(index)
+        if "keypoints3D" in self._selected_cols:
+            time.sleep(self._delay)
+            if index == self._interrupt_at:
+                raise KeyboardInterrupt
+            if index in self._broken:
+                data["keypoints3D"] = None
+            else:
+                data["keypoints3D"] = self._keypoints[index]
+        return data